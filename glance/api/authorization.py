@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import copy
 
 from glance.common import exception
@@ -226,10 +227,42 @@ def _immutable_attr(target, attr, proxy=None):
         raise exception.Forbidden(message % {'attr': attr,
                                              'resource': resource})
 
+    if proxy is None:
+        get_attr.proxy_target = target
     return property(get_attr, forbidden, forbidden)
 
 
-class ImmutableLocations(list):
+class ImmutableLocations(collections.Sequence):
+    """
+    Read-only view of the locations of an image.
+
+    The view reads through to the underlying list instead of copying it,
+    so building one costs nothing until it is actually used.
+    """
+
+    def __init__(self, locations):
+        self._locations = locations
+
+    def __getitem__(self, i):
+        return self._locations[i]
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __iter__(self):
+        return iter(self._locations)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, collections.Sequence)):
+            return list(self) == list(other)
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
     def forbidden(self, *args, **kwargs):
         message = _("You are not permitted to modify locations "
                     "for this image.")
@@ -253,7 +286,27 @@ class ImmutableLocations(list):
     __setslice__ = forbidden
 
 
-class ImmutableProperties(dict):
+class ImmutableProperties(collections.Mapping):
+    """Read-only view of the extra properties of an image."""
+
+    def __init__(self, properties):
+        self._properties = properties
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __len__(self):
+        return len(self._properties)
+
+    def __iter__(self):
+        return iter(self._properties)
+
+    def __contains__(self, key):
+        return key in self._properties
+
+    def __repr__(self):
+        return repr(dict(self))
+
     def forbidden_key(self, key, *args, **kwargs):
         message = _("You are not permitted to modify '%s' on this image.")
         raise exception.Forbidden(message % key)
@@ -264,13 +317,36 @@ class ImmutableProperties(dict):
 
     __delitem__ = forbidden_key
     __setitem__ = forbidden_key
+    clear = forbidden
     pop = forbidden
     popitem = forbidden
     setdefault = forbidden
     update = forbidden
 
 
-class ImmutableTags(set):
+class ImmutableTags(collections.Set):
+    """Read-only view of the tags of an image."""
+
+    def __init__(self, tags):
+        self._tags = tags
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # NOTE: Results of set operations are new, plain sets.
+        return set(iterable)
+
+    def __contains__(self, tag):
+        return tag in self._tags
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __repr__(self):
+        return repr(set(self))
+
     def forbidden(self, *args, **kwargs):
         message = _("You are not permitted to modify tags on this image.")
         raise exception.Forbidden(message)
@@ -278,6 +354,7 @@ class ImmutableTags(set):
     add = forbidden
     clear = forbidden
     difference_update = forbidden
+    discard = forbidden
     intersection_update = forbidden
     pop = forbidden
     remove = forbidden
@@ -286,6 +363,9 @@ class ImmutableTags(set):
 
 
 class ImmutableImageProxy(object):
+
+    __slots__ = ('base', 'context', 'resource_name')
+
     def __init__(self, base, context):
         self.base = base
         self.context = context
@@ -389,6 +469,8 @@ class ImmutableTaskStubProxy(object):
 
 class ImageProxy(glance.domain.proxy.Image):
 
+    __slots__ = ('image', 'context')
+
     def __init__(self, image, context):
         self.image = image
         self.context = context
@@ -542,6 +624,17 @@ class MetadefNamespaceRepoProxy(glance.domain.proxy.MetadefNamespaceRepo):
         namespace_obj = self.namespace_repo.get(namespace)
         return proxy_namespace(self.context, namespace_obj)
 
+    def get_detail(self, namespace):
+        namespace_obj, objects, resource_types, properties = (
+            self.namespace_repo.get_detail(namespace))
+        return (proxy_namespace(self.context, namespace_obj),
+                [proxy_object(self.context, meta_object)
+                 for meta_object in objects],
+                [proxy_meta_resource_type(self.context, resource_type)
+                 for resource_type in resource_types],
+                [proxy_namespace_property(self.context, namespace_property)
+                 for namespace_property in properties])
+
     def list(self, *args, **kwargs):
         namespaces = self.namespace_repo.list(*args, **kwargs)
         return [proxy_namespace(self.context, namespace) for
@@ -24,6 +24,7 @@ from glance.api.v1 import controller
 from glance.common import exception
 from glance.common import wsgi
 from glance import image_cache
+from glance.image_cache import ring
 
 
 class Controller(controller.BaseController):
@@ -109,6 +110,25 @@ class Controller(controller.BaseController):
         self._enforce(req)
         return dict(num_deleted=self.cache.delete_all_queued_images())
 
+    def get_cache_ring(self, req):
+        """
+        GET /cache_ring
+
+        Returns the peers of the image cache cluster.
+        """
+        self._enforce(req)
+        return dict(cache_ring=ring.to_dict())
+
+    def get_cache_peer(self, req, image_id):
+        """
+        GET /cache_ring/<IMAGE_ID>
+
+        Returns the peer of the image cache cluster which caches an image.
+        """
+        self._enforce(req)
+        peer = ring.get_peer(image_id) or ring.get_local_peer()
+        return dict(image_id=image_id, peer=peer)
+
 
 class CachedImageDeserializer(wsgi.JSONRequestDeserializer):
     pass
@@ -18,6 +18,7 @@ import re
 from oslo.config import cfg
 
 from glance.common import exception
+from glance.common import utils
 from glance.openstack.common import excutils
 from glance.openstack.common import gettextutils
 from glance.openstack.common import log as logging
@@ -44,10 +45,12 @@ def size_checked_iter(response, image_meta, expected_size, image_iter,
         response.request.environ['eventlet.posthooks'].append(
             (notify_image_sent_hook, (), {}))
 
+    yielder = utils.CooperativeYielder()
     try:
         for chunk in image_iter:
             yield chunk
             bytes_written += len(chunk)
+            yielder.consumed(len(chunk))
     except Exception as err:
         with excutils.save_and_reraise_exception():
             msg = (_LE("An error occurred reading from backend storage for "
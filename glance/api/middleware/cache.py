@@ -22,9 +22,13 @@ When subsequent requests for the same image file are received,
 the local cached copy of the image file is returned.
 """
 
+import httplib
 import re
 
+from oslo.config import cfg
+import six.moves.urllib.parse as urlparse
 import webob
+import webob.byterange
 
 from glance.api.common import size_checked_iter
 from glance.api import policy
@@ -34,11 +38,13 @@ from glance.common import utils
 from glance.common import wsgi
 import glance.db
 from glance import image_cache
+from glance.image_cache import ring
 from glance import notifier
 from glance.openstack.common import gettextutils
 import glance.openstack.common.log as logging
 import glance.registry.client.v1.api as registry
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 _LI = gettextutils._LI
 _LE = gettextutils._LE
@@ -51,6 +57,13 @@ PATTERNS = {
     ('v2', 'DELETE'): re.compile(r'^/v2/images/([^\/]+)$')
 }
 
+# Marks a request forwarded by another peer of the image cache cluster.
+PEER_FILL_HEADER = 'X-Image-Cache-Peer-Fill'
+
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-authenticate',
+                      'proxy-authorization', 'te', 'trailers',
+                      'transfer-encoding', 'upgrade', 'host')
+
 
 class CacheFilter(wsgi.Middleware):
 
@@ -150,8 +163,10 @@ class CacheFilter(wsgi.Middleware):
 
         self._stash_request_info(request, image_id, method, version)
 
-        if request.method != 'GET' or not self.cache.is_cached(image_id):
+        if request.method != 'GET':
             return None
+        if not self.cache.is_cached(image_id):
+            return self._get_from_peer(request, image_id)
         method = getattr(self, '_get_%s_image_metadata' % version)
         image_metadata = method(request, image_id)
         try:
@@ -159,8 +174,15 @@ class CacheFilter(wsgi.Middleware):
         except exception.Forbidden:
             return None
 
+        image_range = self._get_image_range(request, version, image_id)
+        request.environ['api.cache.range'] = image_range
+
         LOG.debug("Cache hit for image '%s'", image_id)
-        image_iterator = self.get_from_cache(image_id)
+        if image_range is None:
+            image_iterator = self.get_from_cache(image_id)
+        else:
+            offset, length, image_size = image_range
+            image_iterator = self.get_from_cache(image_id, offset, length)
         method = getattr(self, '_process_%s_request' % version)
 
         try:
@@ -172,6 +194,129 @@ class CacheFilter(wsgi.Middleware):
             LOG.error(msg)
             self.cache.delete_cached_image(image_id)
 
+    def _get_image_range(self, request, version, image_id):
+        """
+        Determine which part of a cached image file the request asks for.
+
+        The Range header is honoured for both API versions. Like
+        ResponseSerializer.download in glance.api.v2.image_data, v2 download
+        requests may also carry the range in a Content-Range header.
+
+        :returns tuple of offset, length and total size of the cached image
+                 file, or None if the whole image was requested
+        """
+        range_ = request.range
+        range_str = None
+        if version == 'v2':
+            range_str = request.headers.get('Content-Range')
+        if range_ is None and range_str is None:
+            return None
+
+        image_size = self.cache.get_image_size(image_id)
+        if range_ is not None:
+            content_range = range_.content_range(image_size)
+            if content_range is None:
+                raise webob.exc.HTTPRequestRangeNotSatisfiable(
+                    request=request,
+                    headers={'Content-Range': 'bytes */%d' % image_size})
+            start, stop = content_range.start, content_range.stop
+        else:
+            content_range = webob.byterange.ContentRange.parse(range_str)
+            if content_range is None:
+                msg = _('Malformed Content-Range header: %s') % range_str
+                raise webob.exc.HTTPBadRequest(explanation=msg,
+                                               request=request)
+            if content_range.start is None:
+                return None
+            start = content_range.start
+            stop = min(content_range.stop, image_size)
+            if start >= stop:
+                raise webob.exc.HTTPRequestRangeNotSatisfiable(
+                    request=request,
+                    headers={'Content-Range': 'bytes */%d' % image_size})
+        return (start, stop - start, image_size)
+
+    @staticmethod
+    def _set_range_headers(response, image_range):
+        """Turn a cache hit response into a partial content response."""
+        offset, length, image_size = image_range
+        content_range = webob.byterange.ContentRange(offset, offset + length,
+                                                     image_size)
+        response.status_int = 206
+        response.headers['Content-Range'] = str(content_range)
+        response.headers['Content-Length'] = str(length)
+
+    def _get_from_peer(self, request, image_id):
+        """
+        Forward a request for an image which is not cached here to the peer
+        of the image cache cluster that caches it.
+
+        The peer authenticates and authorizes the forwarded request itself,
+        and fetches the image from the backend into its cache on a miss, so
+        each image is read from the backend by one node only. None is
+        returned, and the request is served locally, when clustering is
+        disabled, this node owns the image, or the peer can't be reached.
+        """
+        if PEER_FILL_HEADER in request.headers:
+            return None
+        peer = ring.get_peer(image_id)
+        if peer is None:
+            return None
+
+        try:
+            conn, peer_resp = self._open_peer_request(peer, request)
+        except Exception as e:
+            LOG.warn(_LW("Fetching image '%(image_id)s' from cache peer "
+                         "%(peer)s failed: %(err)s") %
+                     {'image_id': image_id, 'peer': peer,
+                      'err': utils.exception_to_str(e)})
+            return None
+        if peer_resp.status >= 500:
+            LOG.warn(_LW("Cache peer %(peer)s returned %(status)d for image "
+                         "'%(image_id)s'") %
+                     {'peer': peer, 'status': peer_resp.status,
+                      'image_id': image_id})
+            conn.close()
+            return None
+
+        LOG.debug("Fetching image '%(image_id)s' from cache peer %(peer)s",
+                  {'image_id': image_id, 'peer': peer})
+        headers = [(k, v) for k, v in peer_resp.getheaders()
+                   if k.lower() not in HOP_BY_HOP_HEADERS]
+        return webob.Response(request=request,
+                              status='%d %s' % (peer_resp.status,
+                                                peer_resp.reason),
+                              headerlist=headers,
+                              app_iter=self._peer_iter(conn, peer_resp))
+
+    @staticmethod
+    def _open_peer_request(peer, request):
+        pieces = urlparse.urlparse(peer)
+        if pieces.scheme == 'https':
+            conn_class = httplib.HTTPSConnection
+        else:
+            conn_class = httplib.HTTPConnection
+        conn = conn_class(pieces.netloc,
+                          timeout=CONF.image_cache_peer_timeout)
+        headers = dict((k, v) for k, v in request.headers.items()
+                       if k.lower() not in HOP_BY_HOP_HEADERS)
+        headers[PEER_FILL_HEADER] = ring.get_local_peer() or 'true'
+        try:
+            conn.request('GET', pieces.path + request.path_qs,
+                         headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    @staticmethod
+    def _peer_iter(conn, peer_resp):
+        try:
+            for chunk in utils.chunkreadable(peer_resp):
+                yield chunk
+        finally:
+            conn.close()
+
     @staticmethod
     def _stash_request_info(request, image_id, method, version):
         """
@@ -209,6 +354,9 @@ class CacheFilter(wsgi.Middleware):
             'image_iterator': image_iterator,
             'image_meta': image_meta,
         }
+        image_range = request.environ.get('api.cache.range')
+        if image_range is not None:
+            raw_response['image_range'] = image_range
         return self.serializer.show(response, raw_response)
 
     def _process_v2_request(self, request, image_id, image_iterator,
@@ -220,9 +368,13 @@ class CacheFilter(wsgi.Middleware):
         # naturally once caching is part of the domain model.
         image = request.environ['api.cache.image']
         self._verify_metadata(image_meta)
+        image_range = request.environ.get('api.cache.range')
+        expected_size = image_meta['size']
+        if image_range is not None:
+            expected_size = image_range[1]
         response = webob.Response(request=request)
         response.app_iter = size_checked_iter(response, image_meta,
-                                              image_meta['size'],
+                                              expected_size,
                                               image_iterator,
                                               notifier.Notifier())
         # NOTE (flwang): Set the content-type, content-md5 and content-length
@@ -237,6 +389,8 @@ class CacheFilter(wsgi.Middleware):
         response.headers['Content-Type'] = 'application/octet-stream'
         response.headers['Content-MD5'] = image.checksum
         response.headers['Content-Length'] = str(image.size)
+        if image_range is not None:
+            self._set_range_headers(response, image_range)
         return response
 
     def process_response(self, resp):
@@ -278,6 +432,12 @@ class CacheFilter(wsgi.Middleware):
         return resp
 
     def _process_GET_response(self, resp, image_id, version=None):
+        # NOTE: a response carrying only part of the image data can't be
+        # used to populate the cache.
+        if (self.get_status_code(resp) == 206 or
+                (version == 'v2' and 'Content-Range' in resp.request.headers)):
+            return resp
+
         image_checksum = resp.headers.get('Content-MD5')
         if not image_checksum:
             # API V1 stores the checksum in a different header:
@@ -298,8 +458,13 @@ class CacheFilter(wsgi.Middleware):
         # return 403 error to client then.
         self._enforce(resp.request, 'download_image', target=image_metadata)
 
+        # NOTE: in a cache cluster only the peer owning an image caches it.
+        if ring.get_peer(image_id) is not None:
+            return resp
+
         resp.app_iter = self.cache.get_caching_iter(image_id, image_checksum,
-                                                    resp.app_iter)
+                                                    resp.app_iter,
+                                                    resp.content_length)
         return resp
 
     def get_status_code(self, response):
@@ -311,9 +476,9 @@ class CacheFilter(wsgi.Middleware):
             return response.status_int
         return response.status
 
-    def get_from_cache(self, image_id):
+    def get_from_cache(self, image_id, offset=0, length=None):
         """Called if cache hit"""
-        with self.cache.open_for_read(image_id) as cache_file:
+        with self.cache.open_for_read(image_id, offset, length) as cache_file:
             chunks = utils.chunkiter(cache_file)
             for chunk in chunks:
                 yield chunk
@@ -68,6 +68,16 @@ class CacheManageFilter(wsgi.Middleware):
                        action="delete_queued_images",
                        conditions=dict(method=["DELETE"]))
 
+        mapper.connect("/v1/cache_ring",
+                       controller=resource,
+                       action="get_cache_ring",
+                       conditions=dict(method=["GET"]))
+
+        mapper.connect("/v1/cache_ring/{image_id}",
+                       controller=resource,
+                       action="get_cache_peer",
+                       conditions=dict(method=["GET"]))
+
         self._mapper = mapper
         self._resource = resource
 
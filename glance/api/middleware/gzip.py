@@ -18,6 +18,10 @@ Use gzip compression if the client accepts it.
 """
 
 import re
+import struct
+import zlib
+
+from oslo.config import cfg
 
 from glance.common import wsgi
 from glance.openstack.common import gettextutils
@@ -26,6 +30,54 @@ import glance.openstack.common.log as logging
 LOG = logging.getLogger(__name__)
 _LI = gettextutils._LI
 
+gzip_opts = [
+    cfg.ListOpt('gzip_image_disk_formats', default=[],
+                help=_('Disk formats of the images whose data is compressed '
+                       'when the client accepts gzip, e.g. raw or iso. The '
+                       'data of images in other formats, which is usually '
+                       'compressed already, and of images whose disk format '
+                       'is not known to the middleware is sent as is.')),
+    cfg.ListOpt('gzip_content_types', default=['application/json'],
+                help=_('Content types of the responses other than image '
+                       'data which are compressed when the client accepts '
+                       'gzip.')),
+    cfg.IntOpt('gzip_min_size', default=0,
+               help=_('Responses with a known length smaller than this '
+                      'number of bytes are not compressed.')),
+    cfg.IntOpt('gzip_compression_level', default=6,
+               help=_('The zlib compression level, from 1 (fastest) to 9 '
+                      '(smallest).')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(gzip_opts)
+
+# The header of a gzip member with no file name or modification time.
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'
+
+
+def gzip_app_iter(app_iter, level):
+    """
+    Compress an iterator of strings into a gzip stream, like
+    webob.response.gzip_app_iter but with a configurable level.
+    """
+    size = 0
+    crc = zlib.crc32(b'') & 0xffffffff
+    compress = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                zlib.DEF_MEM_LEVEL, 0)
+
+    yield _GZIP_HEADER
+    for item in app_iter:
+        size += len(item)
+        crc = zlib.crc32(item, crc) & 0xffffffff
+        result = compress.compress(item)
+        if result:
+            yield result
+    result = compress.flush()
+    if result:
+        yield result
+    yield struct.pack('<2L', crc, size & 0xffffffff)
+
 
 class GzipMiddleware(wsgi.Middleware):
 
@@ -39,7 +91,8 @@ class GzipMiddleware(wsgi.Middleware):
         request = response.request
         accept_encoding = request.headers.get('Accept-Encoding', '')
 
-        if self.re_zip.search(accept_encoding):
+        if (self.re_zip.search(accept_encoding) and
+                self._should_compress(response)):
             # NOTE(flaper87): Webob removes the content-md5 when
             # app_iter is called. We'll keep it and reset it later
             checksum = response.headers.get("Content-MD5")
@@ -51,15 +104,35 @@ class GzipMiddleware(wsgi.Middleware):
             content_type = response.headers["Content-Type"]
             lazy = content_type == "application/octet-stream"
 
-            # NOTE(flaper87): Webob takes care of the compression
-            # process, it will replace the body either with a
-            # compressed body or a generator - used for lazy com
-            # pression - depending on the lazy value.
-            #
-            # Webob itself will set the Content-Encoding header.
-            response.encode_content(lazy=lazy)
+            app_iter = gzip_app_iter(response.app_iter,
+                                     CONF.gzip_compression_level)
+            if lazy:
+                response.app_iter = app_iter
+                response.content_length = None
+            else:
+                response.app_iter = list(app_iter)
+                response.content_length = sum(map(len, response.app_iter))
+            response.content_encoding = 'gzip'
 
             if checksum:
                 response.headers['Content-MD5'] = checksum
 
         return response
+
+    def _should_compress(self, response):
+        """
+        Decide whether a response is worth compressing.
+
+        Image data is only compressed for the disk formats which are known
+        to compress well, as compressing e.g. qcow2 images burns CPU for
+        little gain and loses their Content-Length.
+        """
+        if response.content_encoding or response.status_int == 206:
+            return False
+        if (response.content_length is not None and
+                response.content_length < CONF.gzip_min_size):
+            return False
+        if response.content_type == 'application/octet-stream':
+            disk_format = response.headers.get('x-image-meta-disk_format')
+            return disk_format in CONF.gzip_image_disk_formats
+        return response.content_type in CONF.gzip_content_types
@@ -193,6 +193,8 @@ class ImageRepoProxy(glance.domain.proxy.Repo):
 
 class ImageProxy(glance.domain.proxy.Image):
 
+    __slots__ = ('image', 'context', 'policy')
+
     def __init__(self, image, context, policy):
         self.image = image
         self.context = context
@@ -474,6 +476,13 @@ class MetadefNamespaceRepoProxy(glance.domain.proxy.MetadefNamespaceRepo):
         self.policy.enforce(self.context, 'get_metadef_namespace', {})
         return super(MetadefNamespaceRepoProxy, self).get(namespace)
 
+    def get_detail(self, namespace):
+        self.policy.enforce(self.context, 'get_metadef_namespace', {})
+        self.policy.enforce(self.context, 'get_metadef_objects', {})
+        self.policy.enforce(self.context, 'list_metadef_resource_types', {})
+        self.policy.enforce(self.context, 'get_metadef_properties', {})
+        return super(MetadefNamespaceRepoProxy, self).get_detail(namespace)
+
     def list(self, *args, **kwargs):
         self.policy.enforce(self.context, 'get_metadef_namespaces', {})
         return super(MetadefNamespaceRepoProxy, self).list(*args, **kwargs)
@@ -66,6 +66,8 @@ class ProtectedImageRepoProxy(glance.domain.proxy.Repo):
 
 class ProtectedImageProxy(glance.domain.proxy.Image):
 
+    __slots__ = ('image', 'context', 'property_rules')
+
     def __init__(self, image, context, property_rules):
         self.image = image
         self.context = context
@@ -24,6 +24,7 @@ import glance_store as store
 import glance_store.location
 from oslo.config import cfg
 import six.moves.urllib.parse as urlparse
+from webob.byterange import ContentRange
 from webob.exc import HTTPBadRequest
 from webob.exc import HTTPConflict
 from webob.exc import HTTPForbidden
@@ -490,9 +491,10 @@ class Controller(controller.BaseController):
         if image_meta.get('size') == 0:
             image_iterator = iter([])
         else:
+            # NOTE: the serializer wraps this in size_checked_iter, which
+            # yields to other greenthreads as the image is sent.
             image_iterator, size = self._get_from_store(req.context,
                                                         image_meta['location'])
-            image_iterator = utils.cooperative_iter(image_iterator)
             image_meta['size'] = size or image_meta['size']
         image_meta = redact_loc(image_meta)
         return {
@@ -1197,10 +1199,19 @@ class ImageSerializer(wsgi.JSONResponseSerializer):
         image_iter = result['image_iterator']
         # image_meta['size'] should be an int, but could possibly be a str
         expected_size = int(image_meta['size'])
+        # NOTE: the image cache middleware serves partial content and
+        # passes the (offset, length, image size) of the range it read.
+        image_range = result.get('image_range')
+        if image_range is not None:
+            offset, expected_size, image_size = image_range
+            content_range = ContentRange(offset, offset + expected_size,
+                                         image_size)
+            response.status_int = 206
+            response.headers['Content-Range'] = str(content_range)
         response.app_iter = common.size_checked_iter(
             response, image_meta, expected_size, image_iter, self.notifier)
         # Using app_iter blanks content-length, so we set it here...
-        response.headers['Content-Length'] = str(image_meta['size'])
+        response.headers['Content-Length'] = str(expected_size)
         response.headers['Content-Type'] = 'application/octet-stream'
 
         self._inject_image_meta_headers(response, image_meta)
@@ -19,6 +19,7 @@ import webob.exc
 import glance_store as store_api
 
 from glance.common import exception
+from glance.common import hashing
 from glance.common import store_utils
 from glance.common import utils
 import glance.db
@@ -96,14 +97,19 @@ def upload_data_to_store(req, image_meta, image_data, store, notifier):
         if remaining is not None:
             image_data = utils.LimitingReader(image_data, remaining)
 
-        (uri,
-         size,
-         checksum,
-         location_metadata) = store_api.store_add_to_backend(
-             image_meta['id'],
-             utils.CooperativeReader(image_data),
-             image_meta['size'],
-             store)
+        hasher = hashing.get_upload_hasher()
+        if hasher is not None:
+            image_data = hashing.HashingReader(image_data, hasher)
+
+        with utils.upload_reader(image_data) as reader:
+            (uri,
+             size,
+             checksum,
+             location_metadata) = store_api.store_add_to_backend(
+                 image_meta['id'],
+                 reader,
+                 image_meta['size'],
+                 store)
 
         location_data = {'url': uri,
                          'metadata': location_metadata,
@@ -151,6 +157,9 @@ def upload_data_to_store(req, image_meta, image_data, store, notifier):
                                   'size': size})
         update_data = {'checksum': checksum,
                        'size': size}
+        hash_properties = hashing.get_hash_properties(hasher)
+        if hash_properties:
+            update_data['properties'] = hash_properties
         try:
             image_meta = registry.update_image_metadata(req.context,
                                                         image_id,
@@ -193,19 +193,16 @@ class NamespaceController(object):
 
     def show(self, req, namespace, filters=None):
         try:
-            # Get namespace
+            # Get namespace with its objects, resource type associations
+            # and properties
             ns_repo = self.gateway.get_metadef_namespace_repo(req.context)
-            namespace_obj = ns_repo.get(namespace)
+            (namespace_obj, db_metaobject_list, db_resource_type_list,
+             db_properties) = ns_repo.get_detail(namespace)
             namespace_detail = Namespace.to_wsme_model(
                 namespace_obj,
                 get_namespace_href(namespace_obj),
                 self.ns_schema_link)
-            ns_filters = dict()
-            ns_filters['namespace'] = namespace
 
-            # Get objects
-            object_repo = self.gateway.get_metadef_object_repo(req.context)
-            db_metaobject_list = object_repo.list(filters=ns_filters)
             object_list = [MetadefObject.to_wsme_model(
                 db_metaobject,
                 get_object_href(namespace, db_metaobject),
@@ -213,18 +210,12 @@ class NamespaceController(object):
             if object_list:
                 namespace_detail.objects = object_list
 
-            # Get resource type associations
-            rs_repo = self.gateway.get_metadef_resource_type_repo(req.context)
-            db_resource_type_list = rs_repo.list(filters=ns_filters)
             resource_type_list = [ResourceTypeAssociation.to_wsme_model(
                 resource_type) for resource_type in db_resource_type_list]
             if resource_type_list:
                 namespace_detail.resource_type_associations = (
                     resource_type_list)
 
-            # Get properties
-            prop_repo = self.gateway.get_metadef_property_repo(req.context)
-            db_properties = prop_repo.list(filters=ns_filters)
             property_list = Namespace.to_model_properties(db_properties)
             if property_list:
                 namespace_detail.properties = property_list
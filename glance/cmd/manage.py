@@ -40,10 +40,12 @@ if os.path.exists(os.path.join(possible_topdir, 'glance', '__init__.py')):
 
 from oslo.config import cfg
 from oslo.db.sqlalchemy import migration
+import six
 
 from glance.common import config
 from glance.common import exception
 from glance.common import utils
+from glance import context
 from glance.db import migration as db_migration
 from glance.db.sqlalchemy import api as db_api
 from glance.db.sqlalchemy import metadata
@@ -141,10 +143,13 @@ class DbCommands(object):
 
     @args('--path', metavar='<path>', help='Path to the directory where '
                                            'json metadata files are stored')
-    def load_metadefs(self, path=None):
+    @args('--merge', action='store_true',
+          help='Update namespaces which already exist in the database, '
+               'writing only the rows which are new or have changed')
+    def load_metadefs(self, path=None, merge=False):
         """Load metadefinition json files to database"""
         metadata.db_load_metadefs(db_api.get_engine(),
-                                  path)
+                                  path, merge)
 
     def unload_metadefs(self):
         """Unload metadefinitions from database"""
@@ -158,6 +163,51 @@ class DbCommands(object):
         metadata.db_export_metadefs(db_api.get_engine(),
                                     path)
 
+    @staticmethod
+    def _parse_purge_arg(name, value, parse, minimum):
+        try:
+            parsed = parse(value)
+        except (TypeError, ValueError):
+            parsed = None
+        if parsed is None or parsed < minimum:
+            raise exception.InvalidParameterValue(
+                value=value, param=name,
+                extra_msg=_('Must be a number not lower than %s.') % minimum)
+        return parsed
+
+    @args('--age_in_days', metavar='<age_in_days>',
+          help='Purge rows deleted, and tasks expired, more than this many '
+               'days ago (default: 30)')
+    @args('--max_rows', metavar='<max_rows>',
+          help='Maximum number of rows to purge from each table '
+               '(default: no limit)')
+    @args('--batch_size', metavar='<batch_size>',
+          help='Number of rows deleted per transaction (default: 100)')
+    @args('--sleep', metavar='<seconds>',
+          help='Seconds to pause between batches (default: 0)')
+    def purge(self, age_in_days=30, max_rows=None, batch_size=100, sleep=0):
+        """Purge deleted rows and expired tasks from the database"""
+        age_in_days = self._parse_purge_arg('age_in_days', age_in_days,
+                                            int, 0)
+        if max_rows is not None:
+            max_rows = self._parse_purge_arg('max_rows', max_rows, int, 1)
+        batch_size = self._parse_purge_arg('batch_size', batch_size, int, 1)
+        sleep = self._parse_purge_arg('sleep', sleep, float, 0)
+
+        admin_context = context.RequestContext(is_admin=True)
+        results = db_api.purge_deleted_rows(admin_context,
+                                            age_in_days, max_rows,
+                                            batch_size, sleep)
+        for table_name, purged in results:
+            print(_('Purged %(rows)d rows from %(table)s') %
+                  {'rows': purged, 'table': table_name})
+
+    def rebuild_image_visibility(self):
+        """Rebuild the image visibility index used by image listings"""
+        admin_context = context.RequestContext(is_admin=True)
+        rows = db_api.image_visibility_rebuild(admin_context)
+        print(_('Wrote %d image visibility rows') % rows)
+
 
 class DbLegacyCommands(object):
     """Class for managing the db using legacy commands"""
@@ -308,7 +358,9 @@ def main():
                 v = getattr(CONF.command, 'action_kwarg_' + k)
                 if v is None:
                     continue
-                func_kwargs[k] = strutils.safe_decode(v)
+                if isinstance(v, six.string_types):
+                    v = strutils.safe_decode(v)
+                func_kwargs[k] = v
 
             func_args = [strutils.safe_decode(arg)
                          for arg in CONF.command.action_args]
@@ -18,11 +18,13 @@
 
 from __future__ import print_function
 
+import hashlib
 import httplib
 import optparse
 import os
 import sys
 
+import six
 import six.moves.urllib.parse as urlparse
 
 from glance.common import utils
@@ -138,12 +140,17 @@ class ImageService(object):
             response.read()
         return response
 
-    def get_images(self):
+    def get_images(self, limit=None):
         """Return a detailed list of images.
 
+        limit: the number of images to request per page, or None to use
+               the server default
+
         Yields a series of images as dicts containing metadata.
         """
         params = {'is_public': None}
+        if limit:
+            params['limit'] = limit
 
         while True:
             url = '/v1/images/detail'
@@ -373,6 +380,69 @@ def _dict_diff(a, b):
     return False
 
 
+def _replicable_meta(image, dontreplicate):
+    """Normalize the replicable part of an image's metadata.
+
+    image: image metadata as a dictionary
+    dontreplicate: a list of keys to ignore
+
+    Returns: a dictionary of the replicable keys with values as strings
+    """
+    meta = {}
+    for key, value in image.items():
+        if key in dontreplicate:
+            continue
+        if key == 'properties':
+            meta[key] = dict((k, '' if v is None else six.text_type(v))
+                             for k, v in value.items())
+        else:
+            meta[key] = six.text_type(value)
+    return meta
+
+
+def _image_digest(image, dontreplicate):
+    """Compute a digest of the replicable metadata of an image.
+
+    image: image metadata as a dictionary
+    dontreplicate: a list of keys to ignore
+
+    Returns: a hex digest which changes if any replicable key changes
+    """
+    meta = _replicable_meta(image, dontreplicate)
+    serialized = jsonutils.dumps(meta, sort_keys=True).encode('utf-8')
+    return hashlib.md5(serialized).hexdigest()
+
+
+def _get_image_digests(client, options):
+    """Build a digest of every image visible through a paged listing.
+
+    client: the ImageService
+    options: the parsed command line options
+
+    Returns: a dictionary mapping image id to metadata digest
+    """
+    dontreplicate = options.dontreplicate.split(' ')
+    digests = {}
+    for image in client.get_images(limit=options.pagesize):
+        digests[image['id']] = _image_digest(image, dontreplicate)
+    LOG.debug('Computed metadata digests for %d images' % len(digests))
+    return digests
+
+
+def _image_unchanged(image, slave_digests, options):
+    """Check a master image against the slave digests.
+
+    image: master image metadata as a dictionary
+    slave_digests: the result of _get_image_digests for the slave
+    options: the parsed command line options
+
+    Returns: True if the slave has the image with identical replicable
+             metadata, in which case no per-image request is needed
+    """
+    digest = _image_digest(image, options.dontreplicate.split(' '))
+    return slave_digests.get(image['id']) == digest
+
+
 def replication_load(options, args):
     """%(prog)s load <server:port> <path>
 
@@ -474,15 +544,30 @@ def replication_livecopy(options, args):
 
     updated = []
 
-    for image in master_client.get_images():
+    slave_digests = None
+    page_size = None
+    if getattr(options, 'digests', False):
+        slave_digests = _get_image_digests(slave_client, options)
+        page_size = options.pagesize
+
+    for image in master_client.get_images(limit=page_size):
         LOG.debug('Considering %(id)s' % {'id': image['id']})
+        if slave_digests is not None:
+            if _image_unchanged(image, slave_digests, options):
+                LOG.debug('%(image_id)s is identical'
+                          % {'image_id': image['id']})
+                continue
+            present = image['id'] in slave_digests
+        else:
+            present = _image_present(slave_client, image['id'])
+
         for key in options.dontreplicate.split(' '):
             if key in image:
                 LOG.debug('Stripping %(header)s from master metadata',
                           {'header': key})
                 del image[key]
 
-        if _image_present(slave_client, image['id']):
+        if present:
             # NOTE(mikal): Perhaps we just need to update the metadata?
             # Note that we don't attempt to change an image file once it
             # has been uploaded.
@@ -545,8 +630,25 @@ def replication_compare(options, args):
 
     differences = {}
 
-    for image in master_client.get_images():
-        if _image_present(slave_client, image['id']):
+    slave_digests = None
+    page_size = None
+    if getattr(options, 'digests', False):
+        slave_digests = _get_image_digests(slave_client, options)
+        page_size = options.pagesize
+
+    for image in master_client.get_images(limit=page_size):
+        if slave_digests is not None:
+            # NOTE: only images whose listed metadata differs need a
+            # per-image request to find out what changed.
+            if _image_unchanged(image, slave_digests, options):
+                LOG.debug('%(image_id)s is identical'
+                          % {'image_id': image['id']})
+                continue
+            present = image['id'] in slave_digests
+        else:
+            present = _image_present(slave_client, image['id'])
+
+        if present:
             headers = slave_client.get_image_meta(image['id'])
             for key in options.dontreplicate.split(' '):
                 if key in image:
@@ -701,6 +803,9 @@ def main():
                        help="Amount of data to transfer per HTTP write.")
     oparser.add_option('-d', '--debug', action="store_true", default=False,
                        help="Print debugging information.")
+    oparser.add_option('-g', '--digests', action="store_true", default=False,
+                       help=("Compare metadata using digests of paged image "
+                             "listings instead of one request per image."))
     oparser.add_option('-D', '--dontreplicate', action="store",
                        default=('created_at date deleted_at location '
                                 'updated_at'),
@@ -709,6 +814,10 @@ def main():
                        help="Only replicate metadata, not images.")
     oparser.add_option('-l', '--logfile', action="store", default='',
                        help="Path of file to log to.")
+    oparser.add_option('-p', '--pagesize', action="store", type="int",
+                       default=1000,
+                       help=("Number of images to request per page when "
+                             "comparing digests."))
     oparser.add_option('-s', '--syslog', action="store_true", default=False,
                        help="Log to syslog instead of a file.")
     oparser.add_option('-t', '--token', action="store", default='',
@@ -108,6 +108,22 @@ common_opts = [
     cfg.IntOpt('image_size_cap', default=1099511627776,
                help=_("Maximum size of image a user can upload in bytes. "
                       "Defaults to 1099511627776 bytes (1 TB).")),
+    cfg.IntOpt('upload_readahead_buffers', default=0,
+               help=_("Number of buffers of image data to read from the "
+                      "client ahead of the backend store during uploads, "
+                      "so that client reads and store writes overlap. "
+                      "0 disables read-ahead.")),
+    cfg.IntOpt('upload_readahead_buffer_size', default=65536,
+               help=_("Size in bytes of each upload read-ahead buffer.")),
+    cfg.IntOpt('cooperative_yield_interval', default=10,
+               help=_("Maximum time in milliseconds an image data stream "
+                      "runs before yielding to other requests. Streams "
+                      "yield earlier when other requests are waiting.")),
+    cfg.IntOpt('cooperative_yield_bytes', default=8388608,
+               help=_("Maximum number of bytes an image data stream "
+                      "transfers before yielding to other requests. "
+                      "Setting this and cooperative_yield_interval to 0 "
+                      "yields after every chunk.")),
     cfg.StrOpt('user_storage_quota', default='0',
                help=_("Set a system wide quota for every user. This value is "
                       "the total capacity that a user can use across "
@@ -0,0 +1,129 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Single pass computation of several digests over image data.
+"""
+
+import hashlib
+
+from eventlet import tpool
+from oslo.config import cfg
+
+from glance.openstack.common import units
+
+hashing_opts = [
+    cfg.ListOpt('image_hash_algorithms', default=[],
+                help=_('Additional hash algorithms, such as sha256 or '
+                       'sha512, to compute while image data is uploaded. '
+                       'The resulting digests are stored as image '
+                       'properties named checksum_<algorithm>.')),
+    cfg.IntOpt('hash_offload_threshold', default=64 * units.Ki,
+               help=_('Chunks of image data at least this many bytes long '
+                      'are hashed in a native thread so that hashing does '
+                      'not block other requests. 0 disables offloading.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(hashing_opts)
+
+PROPERTY_PREFIX = 'checksum_'
+
+
+class MultiHasher(object):
+    """
+    Compute several digests of a stream of data in a single pass.
+
+    Chunks larger than the configured threshold are hashed in a native
+    thread through eventlet.tpool. hashlib releases the GIL while hashing
+    large buffers, so this keeps the eventlet hub free to serve other
+    requests while a big image is being checksummed.
+    """
+
+    def __init__(self, algorithms=('md5',)):
+        """
+        :param algorithms: names of the hashlib algorithms to compute
+        :raises ValueError if an algorithm is not supported by hashlib
+        """
+        self.hashers = dict((name, hashlib.new(name))
+                            for name in algorithms)
+        self.threshold = CONF.hash_offload_threshold
+
+    def _update(self, chunk):
+        for hasher in self.hashers.values():
+            hasher.update(chunk)
+
+    def update(self, chunk):
+        if self.threshold and len(chunk) >= self.threshold:
+            tpool.execute(self._update, chunk)
+        else:
+            self._update(chunk)
+
+    def hexdigest(self, algorithm='md5'):
+        return self.hashers[algorithm].hexdigest()
+
+    def hexdigests(self):
+        """Return a dict mapping each algorithm to its hex digest."""
+        return dict((name, hasher.hexdigest())
+                    for name, hasher in self.hashers.items())
+
+
+class HashingReader(object):
+    """
+    Reader which feeds the image data passing through it to a MultiHasher.
+    """
+    def __init__(self, data, hasher):
+        """
+        :param data: Underlying image data object
+        :param hasher: MultiHasher to update with every chunk read
+        """
+        self.data = data
+        self.hasher = hasher
+
+    def __iter__(self):
+        for chunk in self.data:
+            self.hasher.update(chunk)
+            yield chunk
+
+    def read(self, i):
+        result = self.data.read(i)
+        self.hasher.update(result)
+        return result
+
+
+def get_upload_hasher():
+    """
+    Return a MultiHasher for the additional upload digests, or None if no
+    additional hash algorithms are configured.
+
+    The md5 checksum is computed by the store itself, so it is not
+    included here.
+    """
+    algorithms = [a for a in CONF.image_hash_algorithms if a != 'md5']
+    if not algorithms:
+        return None
+    return MultiHasher(algorithms)
+
+
+def get_hash_properties(hasher):
+    """
+    Return the image properties recording the digests of a MultiHasher.
+
+    :param hasher: MultiHasher returned by get_upload_hasher, or None
+    """
+    if hasher is None:
+        return {}
+    return dict((PROPERTY_PREFIX + name, digest)
+                for name, digest in hasher.hexdigests().items())
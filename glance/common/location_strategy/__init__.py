@@ -13,19 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import copy
+import time
 
 from oslo.config import cfg
 import stevedore
 
+from glance.openstack.common import excutils
 import glance.openstack.common.log as logging
 
 location_strategy_opts = [
     cfg.StrOpt('location_strategy', default='location_order',
                help=_("This value sets what strategy will be used to "
                       "determine the image location order. Currently "
-                      "two strategies are packaged with Glance "
-                      "'location_order' and 'store_type'."))
+                      "three strategies are packaged with Glance "
+                      "'location_order', 'store_type' and 'latency'."))
 ]
 
 CONF = cfg.CONF
@@ -91,8 +92,9 @@ def get_ordered_locations(locations, **kwargs):
     if not locations:
         return []
     strategy_module = _available_strategies[CONF.location_strategy]
-    return strategy_module.get_ordered_locations(copy.deepcopy(locations),
-                                                 **kwargs)
+    # NOTE: Strategies only reorder the list, so a shallow copy is enough
+    # to keep the caller's list intact; the location dicts are shared.
+    return strategy_module.get_ordered_locations(list(locations), **kwargs)
 
 
 def choose_best_location(locations, **kwargs):
@@ -108,3 +110,58 @@ def choose_best_location(locations, **kwargs):
         return locations[0]
     else:
         return None
+
+
+def _get_strategy_hook(name):
+    strategy_module = _available_strategies.get(CONF.location_strategy)
+    return getattr(strategy_module, name, None)
+
+
+def report_failure(uri):
+    """
+    Tell the configured strategy that reading from a location failed.
+
+    :param uri: The location URI which failed.
+    """
+    record_failure = _get_strategy_hook('record_failure')
+    if record_failure is not None:
+        record_failure(uri)
+
+
+def measure_transfer(uri, data, started):
+    """
+    Wrap image data read from a location so that the time to first byte and
+    the throughput of the transfer are reported to the configured strategy,
+    if it ranks locations by measured performance.
+
+    :param uri: The location URI the data is read from.
+    :param data: Iterator over the image data.
+    :param started: Time at which the location was opened.
+    :return: An iterator over the image data.
+    """
+    record_transfer = _get_strategy_hook('record_transfer')
+    if record_transfer is None:
+        return data
+    return _measured_iter(uri, data, started, record_transfer)
+
+
+def _measured_iter(uri, data, started, record_transfer):
+    # NOTE: the time to first byte is reported as soon as it is known, so
+    # that partial and abandoned reads are measured too. The throughput is
+    # only reported for reads which run to completion, since the rate at
+    # which an abandoned read was consumed says more about the client than
+    # about the backend.
+    first_byte = None
+    size = 0
+    try:
+        for chunk in data:
+            if first_byte is None:
+                first_byte = time.time()
+                record_transfer(uri, first_byte - started, 0, 0)
+            size += len(chunk)
+            yield chunk
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            report_failure(uri)
+    if first_byte is not None:
+        record_transfer(uri, None, size, time.time() - first_byte)
@@ -0,0 +1,174 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measured backend performance based location strategy module"""
+
+import time
+
+from oslo.config import cfg
+import six.moves.urllib.parse as urlparse
+
+from glance.openstack.common import units
+
+latency_opts = [
+    cfg.FloatOpt('ewma_weight', default=0.3,
+                 help=_('Weight given to the latest measurement when '
+                        'updating the moving averages of the time to first '
+                        'byte and the throughput of a backend host.')),
+    cfg.IntOpt('reference_size', default=64 * units.Mi,
+               help=_('Amount of image data, in bytes, used to rank '
+                      'backend hosts. Hosts are ordered by the time they '
+                      'are expected to take to send this much data.')),
+    cfg.IntOpt('failure_threshold', default=3,
+               help=_('Number of consecutive failures after which the '
+                      'locations of a backend host are moved to the end '
+                      'of the location list.')),
+    cfg.FloatOpt('failure_backoff', default=10.0,
+                 help=_('Number of seconds the locations of a failing '
+                        'backend host stay demoted. The backoff doubles with '
+                        'every further failure.')),
+    cfg.FloatOpt('max_failure_backoff', default=300.0,
+                 help=_('Maximum number of seconds the locations of a '
+                        'failing backend host stay demoted.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(latency_opts, group='latency_location_strategy')
+
+_BACKEND_STATS = {}
+
+
+class BackendStats(object):
+    """Performance and health measurements of one backend host."""
+
+    def __init__(self):
+        self.ttfb = None
+        self.throughput = None
+        self.failures = 0
+        self.retry_at = 0
+
+    @staticmethod
+    def _average(current, value):
+        if current is None:
+            return value
+        weight = CONF.latency_location_strategy.ewma_weight
+        return weight * value + (1 - weight) * current
+
+    def record_transfer(self, ttfb, size, duration):
+        if ttfb is not None:
+            self.ttfb = self._average(self.ttfb, ttfb)
+        if size and duration > 0:
+            self.throughput = self._average(self.throughput,
+                                            size / duration)
+        if size:
+            # NOTE: only a completed read shows that the host is healthy
+            # again, a host may well send the first bytes and then fail.
+            self.failures = 0
+            self.retry_at = 0
+
+    def record_failure(self, now):
+        conf = CONF.latency_location_strategy
+        self.failures += 1
+        if self.failures >= conf.failure_threshold:
+            backoff = conf.failure_backoff * 2 ** (self.failures -
+                                                   conf.failure_threshold)
+            self.retry_at = now + min(backoff, conf.max_failure_backoff)
+
+    def is_available(self, now):
+        return now >= self.retry_at
+
+    def estimated_time(self):
+        """Return the expected time to send the reference amount of data."""
+        estimate = self.ttfb or 0
+        if self.throughput:
+            estimate += (CONF.latency_location_strategy.reference_size /
+                         self.throughput)
+        return estimate
+
+
+def _get_backend(uri):
+    """Return the backend host a location URI points to."""
+    pieces = urlparse.urlparse(uri.strip())
+    return '%s://%s' % (pieces.scheme, pieces.netloc)
+
+
+def _get_stats(uri):
+    backend = _get_backend(uri)
+    stats = _BACKEND_STATS.get(backend)
+    if stats is None:
+        stats = _BACKEND_STATS[backend] = BackendStats()
+    return stats
+
+
+def get_strategy_name():
+    """Return strategy module name."""
+    return 'latency'
+
+
+def init():
+    """Initialize strategy module."""
+    _BACKEND_STATS.clear()
+
+
+def record_transfer(uri, ttfb, size, duration):
+    """
+    Record a successful read of image data from a location.
+
+    The time to first byte of a read may be recorded on its own, before
+    the read completes, with a size of 0. Only the record of a completed
+    read clears the failures of the location's host.
+
+    :param uri: The location URI the data was read from.
+    :param ttfb: Seconds from opening the location to the first byte, or
+                 None if only the throughput is reported.
+    :param size: Number of bytes read, or 0 if only the time to first byte
+                 is reported.
+    :param duration: Seconds from the first byte to the end of the read.
+    """
+    _get_stats(uri).record_transfer(ttfb, float(size), duration)
+
+
+def record_failure(uri):
+    """
+    Record a failure to read image data from a location.
+
+    :param uri: The location URI which failed.
+    """
+    _get_stats(uri).record_failure(time.time())
+
+
+def get_ordered_locations(locations, uri_key='url', **kwargs):
+    """
+    Order image location list.
+
+    Locations on healthy backend hosts come first, fastest first. Hosts
+    which have not been measured yet are ranked as the fastest so that
+    every host gets measured. Locations on hosts which have failed
+    repeatedly come last until their backoff expires.
+
+    :param locations: The original image location list.
+    :param uri_key: The key name for location URI in image location dictionary.
+    :return: The image location list ordered by measured performance.
+    """
+    now = time.time()
+
+    def _rank(location):
+        uri = location.get(uri_key)
+        stats = _BACKEND_STATS.get(_get_backend(uri)) if uri else None
+        if stats is None:
+            return (False, 0)
+        return (not stats.is_available(now), stats.estimated_time())
+
+    return sorted(locations, key=_rank)
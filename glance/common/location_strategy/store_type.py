@@ -17,7 +17,6 @@
 
 from oslo.config import cfg
 import six
-import six.moves.urllib.parse as urlparse
 
 store_type_opts = [
     cfg.ListOpt("store_type_preference",
@@ -34,6 +33,7 @@ CONF = cfg.CONF
 CONF.register_opts(store_type_opts, group='store_type_location_strategy')
 
 _STORE_TO_SCHEME_MAP = {}
+_SCHEME_TO_STORE_MAP = {}
 
 
 def get_strategy_name():
@@ -62,6 +62,10 @@ def init():
                'vmware_datastore': ['vsphere']}
     _STORE_TO_SCHEME_MAP.clear()
     _STORE_TO_SCHEME_MAP.update(mapping)
+    _SCHEME_TO_STORE_MAP.clear()
+    for store, schemes in six.iteritems(mapping):
+        for scheme in schemes:
+            _SCHEME_TO_STORE_MAP[scheme] = store
 
 
 def get_ordered_locations(locations, uri_key='url', **kwargs):
@@ -92,13 +96,9 @@ def get_ordered_locations(locations, uri_key='url', **kwargs):
         uri = location.get(uri_key)
         if not uri:
             continue
-        pieces = urlparse.urlparse(uri.strip())
-
-        store_name = None
-        for store, schemes in six.iteritems(_STORE_TO_SCHEME_MAP):
-            if pieces.scheme.strip() in schemes:
-                store_name = store
-                break
+        # NOTE: only the scheme is needed, so avoid parsing the whole URI.
+        scheme = uri.strip().partition(':')[0].strip().lower()
+        store_name = _SCHEME_TO_STORE_MAP.get(scheme)
 
         if store_name in preferences:
             preferences[store_name].append(location)
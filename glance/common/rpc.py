@@ -17,11 +17,17 @@
 RPC Controller
 """
 import datetime
+import struct
 import traceback
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 from oslo.config import cfg
 import six
 from webob import exc
+from webob import multidict
 
 from glance.common import client
 from glance.common import exception
@@ -44,11 +50,24 @@ rpc_opts = [
                          ],
                 help='Modules of exceptions that are permitted to be recreated'
                      'upon receiving exception data from an rpc call.'),
+    cfg.StrOpt('rpc_serialization_format', default='json',
+               choices=['json', 'msgpack'],
+               help=_('Encoding requested by RPC clients, such as the API '
+                      'server talking to the v2 registry. With msgpack, '
+                      'servers that do not support it, or lack the msgpack '
+                      'library, keep answering in JSON.')),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(rpc_opts)
 
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+# NOTE: datetimes are sent as msgpack extension values holding the
+# number of microseconds since the epoch as a big-endian int64.
+_DATETIME_EXT_CODE = 1
+_EPOCH = datetime.datetime(1970, 1, 1)
+
 
 class RPCJSONSerializer(wsgi.JSONResponseSerializer):
 
@@ -75,6 +94,90 @@ class RPCJSONDeserializer(wsgi.JSONRequestDeserializer):
             return obj
 
 
+class RPCMsgpackSerializer(object):
+
+    def _sanitizer(self, obj):
+        if isinstance(obj, datetime.datetime):
+            delta = obj.replace(tzinfo=None) - _EPOCH
+            micros = ((delta.days * 86400 + delta.seconds) * 1000000 +
+                      delta.microseconds)
+            return msgpack.ExtType(_DATETIME_EXT_CODE,
+                                   struct.pack('>q', micros))
+        if hasattr(obj, "to_dict"):
+            return obj.to_dict()
+        if isinstance(obj, multidict.MultiDict):
+            return obj.mixed()
+        if isinstance(obj, set):
+            return list(obj)
+        raise TypeError(_("Cannot serialize %s") % type(obj))
+
+    def to_msgpack(self, data):
+        return msgpack.packb(data, default=self._sanitizer)
+
+    def default(self, response, result):
+        response.content_type = MSGPACK_CONTENT_TYPE
+        response.body = self.to_msgpack(result)
+
+
+class RPCMsgpackDeserializer(wsgi.JSONRequestDeserializer):
+
+    def _ext_hook(self, code, data):
+        if code == _DATETIME_EXT_CODE:
+            micros = struct.unpack('>q', data)[0]
+            return _EPOCH + datetime.timedelta(microseconds=micros)
+        return msgpack.ExtType(code, data)
+
+    def from_msgpack(self, datastring):
+        try:
+            return msgpack.unpackb(datastring, encoding='utf-8',
+                                   ext_hook=self._ext_hook)
+        except Exception:
+            msg = _('Malformed msgpack in request body.')
+            raise exc.HTTPBadRequest(explanation=msg)
+
+    def default(self, request):
+        if self.has_body(request):
+            return {'body': self.from_msgpack(request.body)}
+        else:
+            return {}
+
+
+class RPCSerializer(RPCJSONSerializer):
+    """
+    Serializer answering in msgpack to the clients which accept it, and
+    in JSON to everyone else.
+    """
+
+    def __init__(self):
+        self._msgpack = RPCMsgpackSerializer()
+
+    def default(self, response, result):
+        accept = response.request.accept
+        if (msgpack is not None and accept and
+                accept.best_match(['application/json',
+                                   MSGPACK_CONTENT_TYPE]) ==
+                MSGPACK_CONTENT_TYPE):
+            self._msgpack.default(response, result)
+        else:
+            super(RPCSerializer, self).default(response, result)
+
+
+class RPCDeserializer(RPCJSONDeserializer):
+    """
+    Deserializer reading msgpack or JSON request bodies according to
+    their Content-Type.
+    """
+
+    def __init__(self):
+        self._msgpack = RPCMsgpackDeserializer()
+
+    def default(self, request):
+        if (msgpack is not None and
+                request.content_type == MSGPACK_CONTENT_TYPE):
+            return self._msgpack.default(request)
+        return super(RPCDeserializer, self).default(request)
+
+
 class Controller(object):
     """
     Base RPCController.
@@ -88,7 +191,9 @@ class Controller(object):
         }]
 
     The controller is capable of processing more than one command
-    per request and will always return a list of results.
+    per request and will always return a list of results. A command
+    with 'requires_previous' set is skipped, and the error of the
+    command before it returned instead, if that command failed.
 
     :params raise_exc: Boolean that specifies whether to raise
     exceptions instead of "serializing" them.
@@ -146,9 +251,11 @@ class Controller(object):
                 raise exc.HTTPBadRequest(explanation=msg)
 
             command, kwargs = cmd.get("command"), cmd.get("kwargs")
+            requires_previous = cmd.get("requires_previous", False)
 
             if (not command or not isinstance(command, six.string_types) or
-                    (kwargs and not isinstance(kwargs, dict))):
+                    (kwargs and not isinstance(kwargs, dict)) or
+                    not isinstance(requires_previous, bool)):
                 msg = _("Wrong command structure: %s") % (str(cmd))
                 raise exc.HTTPBadRequest(explanation=msg)
 
@@ -170,6 +277,11 @@ class Controller(object):
 
         results = []
         for cmd in commands:
+            if (cmd.get("requires_previous") and results and
+                    isinstance(results[-1], dict) and '_error' in results[-1]):
+                results.append(results[-1])
+                continue
+
             # kwargs is not required
             command, kwargs = cmd["command"], cmd.get("kwargs", {})
             method = self._registered[command]
@@ -202,6 +314,10 @@ class RPCClient(client.BaseClient):
     def __init__(self, *args, **kwargs):
         self._serializer = RPCJSONSerializer()
         self._deserializer = RPCJSONDeserializer()
+        self._use_msgpack = (msgpack is not None and
+                             CONF.rpc_serialization_format == 'msgpack')
+        if self._use_msgpack:
+            self._msgpack_deserializer = RPCMsgpackDeserializer()
 
         self.raise_exc = kwargs.pop("raise_exc", True)
         self.base_path = kwargs.pop("base_path", '/rpc')
@@ -221,9 +337,25 @@ class RPCClient(client.BaseClient):
             }
         """
         body = self._serializer.to_json(commands)
+        if not self._use_msgpack:
+            response = super(RPCClient, self).do_request('POST',
+                                                         self.base_path,
+                                                         body)
+            return self._deserializer.from_json(response.read())
+
+        # NOTE: only the encoding of the response is negotiated. Requests
+        # are always sent in JSON, which every server understands, so
+        # they keep working whichever server behind the address answers.
+        headers = {'Accept': '%s, application/json;q=0.5' %
+                   MSGPACK_CONTENT_TYPE,
+                   'Content-Type': 'application/json'}
         response = super(RPCClient, self).do_request('POST',
                                                      self.base_path,
-                                                     body)
+                                                     body,
+                                                     headers=headers)
+        content_type = response.getheader('content-type') or ''
+        if content_type.split(';')[0].strip() == MSGPACK_CONTENT_TYPE:
+            return self._msgpack_deserializer.from_msgpack(response.read())
         return self._deserializer.from_json(response.read())
 
     def do_request(self, method, **kwargs):
@@ -241,8 +373,28 @@ class RPCClient(client.BaseClient):
 
         # NOTE(flaper87): Return the first result if
         # a single command was executed.
-        content = content[0]
+        return self._check_result(content[0])
 
+    def batch_request(self, commands):
+        """
+        Execute several dependent commands in a single request.
+
+        Each command is only executed by the server if the commands
+        before it succeeded, so a batch behaves like the same calls
+        made one after the other, at the cost of a single round-trip.
+
+        :params commands: List of (method, kwargs) tuples.
+        :returns: List with the result of each command.
+        """
+        body = []
+        for method, kwargs in commands:
+            body.append({'command': method,
+                         'kwargs': kwargs,
+                         'requires_previous': bool(body)})
+        return [self._check_result(content)
+                for content in self.bulk_request(body)]
+
+    def _check_result(self, content):
         # NOTE(flaper87): Check if content is an error
         # and re-raise it if raise_exc is True. Before
         # checking if content contains the '_error' key,
@@ -25,14 +25,19 @@ try:
     from eventlet import sleep
 except ImportError:
     from time import sleep
+import eventlet
 from eventlet.green import socket
+from eventlet import hubs
+from eventlet import queue
 
+import contextlib
 import functools
 import os
 import platform
 import re
 import subprocess
 import sys
+import time
 import uuid
 
 import netaddr
@@ -95,16 +100,61 @@ def chunkiter(fp, chunk_size=65536):
             break
 
 
+def _greenthreads_runnable():
+    """Return True if the eventlet hub has greenthreads due to run now."""
+    # NOTE: greenthreads which are ready to run, e.g. ones just spawned or
+    # woken up by an event, are scheduled on the hub as expired timers.
+    hub = hubs.get_hub()
+    now = hub.clock()
+    if hub.timers and hub.timers[0][0] <= now:
+        return True
+    return any(when <= now for when, timer in hub.next_timers)
+
+
+class CooperativeYielder(object):
+    """
+    Decide when a data stream should yield to other greenthreads.
+
+    Rather than switching to the eventlet hub after every chunk, a stream
+    yields once it has run for cooperative_yield_interval milliseconds or
+    passed cooperative_yield_bytes bytes since it last yielded, or as soon
+    as other greenthreads are waiting to run. Setting both limits to 0
+    yields after every chunk.
+    """
+    def __init__(self):
+        self.interval = CONF.cooperative_yield_interval / 1000.0
+        self.max_bytes = CONF.cooperative_yield_bytes
+        self._reset()
+
+    def _reset(self):
+        self.last_yield = time.time()
+        self.bytes = 0
+
+    def consumed(self, length):
+        """
+        Account for a chunk of data and yield if the budget is spent.
+
+        :param length: number of bytes just read or written
+        """
+        self.bytes += length
+        if (self.bytes >= self.max_bytes or
+                time.time() - self.last_yield >= self.interval or
+                _greenthreads_runnable()):
+            sleep(0)
+            self._reset()
+
+
 def cooperative_iter(iter):
     """
-    Return an iterator which schedules after each
-    iteration. This can prevent eventlet thread starvation.
+    Return an iterator which periodically schedules other greenthreads
+    between iterations. This can prevent eventlet thread starvation.
 
     :param iter: an iterator to wrap
     """
+    yielder = CooperativeYielder()
     try:
         for chunk in iter:
-            sleep(0)
+            yielder.consumed(len(chunk))
             yield chunk
     except Exception as err:
         with excutils.save_and_reraise_exception():
@@ -114,14 +164,17 @@ def cooperative_iter(iter):
 
 def cooperative_read(fd):
     """
-    Wrap a file descriptor's read with a partial function which schedules
-    after each read. This can prevent eventlet thread starvation.
+    Wrap a file descriptor's read with a partial function which periodically
+    schedules other greenthreads after reads. This can prevent eventlet
+    thread starvation.
 
     :param fd: a file descriptor to wrap
     """
+    yielder = CooperativeYielder()
+
     def readfn(*args):
         result = fd.read(*args)
-        sleep(0)
+        yielder.consumed(len(result))
         return result
     return readfn
 
@@ -131,10 +184,10 @@ class CooperativeReader(object):
     An eventlet thread friendly class for reading in image data.
 
     When accessing data either through the iterator or the read method
-    we perform a sleep to allow a co-operative yield. When there is more than
-    one image being uploaded/downloaded this prevents eventlet thread
-    starvation, ie allows all threads to be scheduled periodically rather than
-    having the same thread be continuously active.
+    we periodically sleep to allow a co-operative yield. When there is more
+    than one image being uploaded/downloaded this prevents eventlet thread
+    starvation, ie allows all threads to be scheduled periodically rather
+    than having the same thread be continuously active.
     """
     def __init__(self, fd):
         """
@@ -195,6 +248,121 @@ class LimitingReader(object):
         return result
 
 
+class ReadAheadReader(object):
+    """
+    Reader which reads image data ahead of its consumer into a bounded
+    ring of buffers.
+
+    A greenthread keeps up to buffer_count buffers of buffer_size bytes
+    filled from the underlying data while the consumer drains them, so that
+    reading from the client and writing to the backend store overlap rather
+    than strictly alternate. The time each side spent stalled waiting for
+    the other is recorded in client_stall_time (the store waited for client
+    data) and store_stall_time (the client reader waited for a free buffer).
+    """
+    def __init__(self, data, buffer_count, buffer_size):
+        """
+        :param data: Underlying image data object
+        :param buffer_count: maximum number of buffers read ahead
+        :param buffer_size: number of bytes requested per buffer
+        """
+        self.data = data
+        self.buffer_size = buffer_size
+        self.queue = queue.LightQueue(buffer_count)
+        self.buffer = ''
+        self.done = False
+        self.client_stall_time = 0.0
+        self.store_stall_time = 0.0
+        self.producer = eventlet.spawn(self._fill)
+
+    def _source_chunks(self):
+        if hasattr(self.data, 'read'):
+            return chunkiter(self.data, self.buffer_size)
+        return iter(self.data)
+
+    def _fill(self):
+        try:
+            for chunk in self._source_chunks():
+                if not chunk:
+                    continue
+                start = time.time()
+                self.queue.put(chunk)
+                self.store_stall_time += time.time() - start
+            self.queue.put('')
+        except Exception as e:
+            self.queue.put(e)
+
+    def _next_chunk(self):
+        if self.done:
+            return ''
+        start = time.time()
+        item = self.queue.get()
+        self.client_stall_time += time.time() - start
+        if isinstance(item, Exception):
+            self.done = True
+            raise item
+        if not item:
+            self.done = True
+        return item
+
+    def read(self, length=None):
+        pieces = []
+        remaining = length
+        while remaining is None or remaining > 0:
+            if not self.buffer:
+                self.buffer = self._next_chunk()
+                if not self.buffer:
+                    break
+            if remaining is None:
+                piece, self.buffer = self.buffer, ''
+            else:
+                piece = self.buffer[:remaining]
+                self.buffer = self.buffer[remaining:]
+                remaining -= len(piece)
+            pieces.append(piece)
+        return ''.join(pieces)
+
+    def __iter__(self):
+        if self.buffer:
+            chunk, self.buffer = self.buffer, ''
+            yield chunk
+        while True:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        """Stop reading ahead and log how long each side stalled."""
+        self.producer.kill()
+        LOG.debug("Read-ahead upload stalled %(client).3fs waiting on the "
+                  "client and %(store).3fs waiting on the store",
+                  {'client': self.client_stall_time,
+                   'store': self.store_stall_time})
+
+
+@contextlib.contextmanager
+def upload_reader(data):
+    """
+    Yield the reader an upload should hand to the backend store.
+
+    With upload_readahead_buffers set the data is read ahead of the store
+    by a ReadAheadReader, otherwise it is wrapped in a CooperativeReader.
+
+    :param data: Underlying image data object
+    """
+    if CONF.upload_readahead_buffers <= 0:
+        yield CooperativeReader(data)
+        return
+
+    reader = ReadAheadReader(data, CONF.upload_readahead_buffers,
+                             CONF.upload_readahead_buffer_size)
+    try:
+        yield reader
+    finally:
+        reader.close()
+
+
 def image_meta_to_http_headers(image_meta):
     """
     Returns a set of image metadata into a dict
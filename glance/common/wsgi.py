@@ -33,6 +33,7 @@ import eventlet
 from eventlet.green import socket
 from eventlet.green import ssl
 import eventlet.greenio
+import eventlet.hubs
 import eventlet.wsgi
 from oslo.config import cfg
 import routes
@@ -48,6 +49,7 @@ from glance import i18n
 from glance.openstack.common import jsonutils
 import glance.openstack.common.log as logging
 from glance.openstack.common import processutils
+from glance.openstack.common import units
 
 
 bind_opts = [
@@ -72,6 +74,13 @@ socket_opts = [
                                    'server securely.')),
     cfg.StrOpt('key_file', help=_('Private key file to use when starting API '
                                   'server securely.')),
+    cfg.BoolOpt('reuse_port', default=False,
+                help=_('If True, every worker binds its own listening socket '
+                       'with SO_REUSEPORT so that the kernel balances new '
+                       'connections across the workers, and SIGUSR1 makes '
+                       'the server reload its configuration files and '
+                       'replace its workers one at a time. Requires Linux '
+                       '3.9 or later.')),
 ]
 
 eventlet_opts = [
@@ -89,6 +98,25 @@ eventlet_opts = [
                       'max_header_line may need to be increased when using '
                       'large tokens (typically those generated by the '
                       'Keystone v3 API with big service catalogs')),
+    cfg.BoolOpt('http_keepalive', default=True,
+                help=_('If False, the server closes the client connection '
+                       'after every request instead of keeping it open for '
+                       'further HTTP/1.1 requests.')),
+    cfg.IntOpt('client_socket_timeout', default=900,
+               help=_('Timeout in seconds for socket operations on client '
+                      'connections. 0 means wait forever.')),
+    cfg.IntOpt('http_keepalive_idle_timeout', default=60,
+               help=_('Number of seconds a persistent client connection '
+                      'may stay idle between two requests before it is '
+                      'closed. 0 means wait forever.')),
+    cfg.IntOpt('http_keepalive_max_requests', default=1000,
+               help=_('Maximum number of requests served over one client '
+                      'connection before it is closed. 0 means no limit.')),
+    cfg.IntOpt('http_keepalive_max_drain_size', default=units.Mi,
+               help=_('Maximum number of bytes of a request body left '
+                      'unread by the application which are read and '
+                      'discarded to keep the connection open. The '
+                      'connection is closed instead when more is left.')),
 ]
 
 profiler_opts = [
@@ -168,9 +196,12 @@ def get_socket(default_port):
         sock = wrap_ssl(sock)
     while not sock and time.time() < retry_until:
         try:
-            sock = eventlet.listen(bind_addr,
-                                   backlog=CONF.backlog,
-                                   family=address_family)
+            if CONF.reuse_port:
+                sock = listen_reuse_port(bind_addr, address_family)
+            else:
+                sock = eventlet.listen(bind_addr,
+                                       backlog=CONF.backlog,
+                                       family=address_family)
             if use_ssl:
                 sock = wrap_ssl(sock)
 
@@ -195,6 +226,35 @@ def get_socket(default_port):
     return sock
 
 
+def listen_reuse_port(bind_addr, family):
+    """
+    Return a listening socket bound with SO_REUSEPORT, so that several
+    processes can each listen on the same address with their own socket.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError(_("SO_REUSEPORT is not supported on this "
+                             "platform, reuse_port cannot be enabled"))
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(bind_addr)
+        sock.listen(CONF.backlog)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def _read_ignoring_eintr(fd, size):
+    while True:
+        try:
+            return os.read(fd, size)
+        except OSError as err:
+            if err.errno != errno.EINTR:
+                raise
+
+
 def set_eventlet_hub():
     try:
         eventlet.hubs.use_hub(cfg.CONF.eventlet_hub)
@@ -204,6 +264,94 @@ def set_eventlet_hub():
             reason=msg % cfg.CONF.eventlet_hub)
 
 
+class HttpProtocol(eventlet.wsgi.HttpProtocol):
+    """
+    HTTP protocol handler bounding the life of persistent connections.
+
+    A connection is closed when it stays idle between two requests for
+    longer than http_keepalive_idle_timeout, after it has served
+    http_keepalive_max_requests requests, and when the application leaves
+    more of a request body unread than is worth draining.
+    """
+
+    requests_handled = 0
+
+    def handle_one_request(self):
+        if self.requests_handled and not self._wait_for_request():
+            self.close_connection = 1
+            return
+        self.requests_handled += 1
+        eventlet.wsgi.HttpProtocol.handle_one_request(self)
+
+    def parse_request(self):
+        if not eventlet.wsgi.HttpProtocol.parse_request(self):
+            return False
+        max_requests = CONF.http_keepalive_max_requests
+        if max_requests and self.requests_handled >= max_requests:
+            # Answer with 'Connection: close' so that the client does not
+            # send another request over this connection.
+            self.close_connection = 1
+        return True
+
+    def handle_one_response(self):
+        application = self.application
+
+        def limit_drain(environ, start_response):
+            try:
+                return application(environ, start_response)
+            finally:
+                self._limit_drain(environ['eventlet.input'])
+
+        self.application = limit_drain
+        eventlet.wsgi.HttpProtocol.handle_one_response(self)
+
+    def _wait_for_request(self):
+        """
+        Wait for the next request on a persistent connection and return
+        False if none arrives within the idle timeout.
+        """
+        timeout = CONF.http_keepalive_idle_timeout
+        if not timeout:
+            return True
+        # A pipelined request may already be buffered.
+        rbuf = getattr(self.rfile, '_rbuf', None)
+        if rbuf is not None and rbuf.tell():
+            return True
+        pending = getattr(self.connection, 'pending', None)
+        if pending is not None and pending():
+            return True
+        try:
+            eventlet.hubs.trampoline(self.connection, read=True,
+                                     timeout=timeout,
+                                     timeout_exc=socket.timeout)
+        except socket.timeout:
+            return False
+        return True
+
+    def _limit_drain(self, request_input):
+        """
+        Close the connection instead of letting eventlet read and discard
+        a large unread request body once the application is done with it.
+
+        NOTE: glance reads request bodies before returning a response, so
+        the body is no longer needed once the application has returned.
+        """
+        if request_input.chunked_input:
+            # The size of the rest of a chunked body is unknown.
+            unread = request_input.chunk_length != 0
+            too_large = unread
+        else:
+            unread = ((request_input.content_length or 0) -
+                      request_input.position)
+            too_large = unread > CONF.http_keepalive_max_drain_size
+        # The client may never send a body it was not asked to continue.
+        waiting = request_input.wfile is not None
+        if unread and (too_large or waiting):
+            self.close_connection = 1
+            request_input.chunked_input = False
+            request_input.content_length = request_input.position
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
@@ -212,6 +360,11 @@ class Server(object):
         self.threads = threads
         self.children = []
         self.running = True
+        # Workers being replaced by a rolling reload, in the order in which
+        # they are retired, and the one currently draining.
+        self.stale_children = []
+        self.retiring_child = None
+        self.reload_requested = False
 
     def start(self, application, default_port):
         """
@@ -250,9 +403,26 @@ class Server(object):
             """
             signal.signal(signal.SIGHUP, signal.SIG_IGN)
             self.running = False
+            if self.sock is None:
+                # Workers have their own sockets, which only they can
+                # stop listening on.
+                for pid in self.children:
+                    os.kill(pid, signal.SIGHUP)
+
+        def reload_workers(*args):
+            """
+            Replaces the workers one at a time with the configuration
+            files reloaded
+            """
+            self.reload_requested = True
 
         self.application = application
-        self.sock = get_socket(default_port)
+        self.default_port = default_port
+        if CONF.reuse_port and CONF.workers != 0:
+            # Each worker binds its own socket in run_child.
+            self.sock = None
+        else:
+            self.sock = get_socket(default_port)
 
         os.umask(0o27)  # ensure files are created with the correct privileges
         self.logger = logging.getLogger('glance.wsgi.server')
@@ -267,6 +437,8 @@ class Server(object):
             signal.signal(signal.SIGTERM, kill_children)
             signal.signal(signal.SIGINT, kill_children)
             signal.signal(signal.SIGHUP, hup)
+            if self.sock is None:
+                signal.signal(signal.SIGUSR1, reload_workers)
             while len(self.children) < CONF.workers:
                 self.run_child()
 
@@ -276,11 +448,19 @@ class Server(object):
     def wait_on_children(self):
         while self.running:
             try:
-                pid, status = os.wait()
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.start_rolling_reload()
+                pid, status = self.wait_child()
                 if os.WIFEXITED(status) or os.WIFSIGNALED(status):
                     self.logger.info(_('Removing dead child %s') % pid)
                     self.children.remove(pid)
-                    if os.WIFEXITED(status) and os.WEXITSTATUS(status) != 0:
+                    if pid in self.stale_children:
+                        self.stale_children.remove(pid)
+                    if pid == self.retiring_child:
+                        # Its replacement is already running.
+                        self.retire_next_child()
+                    elif os.WIFEXITED(status) and os.WEXITSTATUS(status) != 0:
                         self.logger.error(_('Not respawning child %d, cannot '
                                             'recover from termination') % pid)
                         if not self.children:
@@ -295,10 +475,62 @@ class Server(object):
             except KeyboardInterrupt:
                 self.logger.info(_('Caught keyboard interrupt. Exiting.'))
                 break
-        eventlet.greenio.shutdown_safe(self.sock)
-        self.sock.close()
+        if self.sock is not None:
+            eventlet.greenio.shutdown_safe(self.sock)
+            self.sock.close()
         self.logger.debug('Exited')
 
+    def wait_child(self):
+        """
+        Wait for a child to exit and return its pid and status.
+        """
+        if self.sock is not None:
+            return os.wait()
+        # Poll, so that a reload requested by a signal is not held up
+        # until a worker exits.
+        while self.running and not self.reload_requested:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                return pid, status
+            time.sleep(0.5)
+        raise OSError(errno.EINTR, os.strerror(errno.EINTR))
+
+    def start_rolling_reload(self):
+        """
+        Reload the configuration files and start replacing the workers,
+        one at a time, by workers forked with the new configuration.
+        """
+        self.logger.info(_('Reloading configuration and replacing workers'))
+        CONF.reload_config_files()
+        self.stale_children = list(self.children)
+        if self.retiring_child is None:
+            self.retire_next_child()
+
+    def retire_next_child(self):
+        """
+        Start a replacement for the next stale worker, then ask the stale
+        worker to stop accepting connections and exit once its running
+        requests are complete.
+        """
+        self.retiring_child = None
+        while self.stale_children:
+            pid = self.stale_children.pop(0)
+            if pid in self.children:
+                if not self.run_child():
+                    # Keep the stale workers rather than replacing them by
+                    # workers which cannot serve.
+                    self.logger.error(_('Aborting reload, a replacement '
+                                        'worker failed to start. Keeping '
+                                        '%d workers with the previous '
+                                        'configuration') %
+                                      (len(self.stale_children) + 1))
+                    self.stale_children = []
+                    return
+                self.logger.info(_('Retiring child %s') % pid)
+                os.kill(pid, signal.SIGHUP)
+                self.retiring_child = pid
+                return
+
     def wait(self):
         """Wait until all servers have completed running."""
         try:
@@ -310,6 +542,12 @@ class Server(object):
             pass
 
     def run_child(self):
+        """
+        Fork a worker. Returns True once it serves requests, False if it
+        failed to bind its own listening socket.
+        """
+        if self.sock is None:
+            ready_fd, listening_fd = os.pipe()
         pid = os.fork()
         if pid == 0:
             signal.signal(signal.SIGHUP, signal.SIG_DFL)
@@ -318,6 +556,18 @@ class Server(object):
             # a child worker receives the signal before the parent
             # and is respawned unnecessarily as a result
             signal.signal(signal.SIGINT, signal.SIG_IGN)
+            if self.sock is None:
+                os.close(ready_fd)
+                try:
+                    self.listen_in_child()
+                except Exception:
+                    self.logger.exception(_('Child %d failed to listen') %
+                                          os.getpid())
+                    # Exit at once, the parent learns of the failure from
+                    # the closed pipe.
+                    os._exit(1)
+                os.write(listening_fd, '1')
+                os.close(listening_fd)
             self.run_server()
             self.logger.info(_('Child %d exiting normally') % os.getpid())
             # self.pool.waitall() has been called by run_server, so
@@ -326,6 +576,32 @@ class Server(object):
         else:
             self.logger.info(_('Started child %s') % pid)
             self.children.append(pid)
+            if self.sock is None:
+                # Wait until the child listens, so that a worker being
+                # replaced is not retired before its replacement is up.
+                os.close(listening_fd)
+                try:
+                    if not _read_ignoring_eintr(ready_fd, 1):
+                        self.logger.error(_('Child %s failed to start '
+                                            'listening') % pid)
+                        return False
+                finally:
+                    os.close(ready_fd)
+        return True
+
+    def listen_in_child(self):
+        """
+        Bind the worker's own listening socket. On SIGHUP the worker stops
+        listening on it and exits once its running requests are complete.
+        """
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        self.sock = get_socket(self.default_port)
+
+        def stop_listening(*args):
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            eventlet.greenio.shutdown_safe(self.sock)
+
+        signal.signal(signal.SIGHUP, stop_listening)
 
     def run_server(self):
         """Run a WSGI server."""
@@ -333,14 +609,14 @@ class Server(object):
             utils.setup_remote_pydev_debug(cfg.CONF.pydev_worker_debug_host,
                                            cfg.CONF.pydev_worker_debug_port)
 
-        eventlet.wsgi.HttpProtocol.default_request_version = "HTTP/1.0"
         self.pool = self.create_pool()
         try:
             eventlet.wsgi.server(self.sock,
                                  self.application,
                                  log=logging.WritableLogger(self.logger),
                                  custom_pool=self.pool,
-                                 debug=False)
+                                 debug=False,
+                                 **self.get_server_kwargs())
         except socket.error as err:
             if err[0] != errno.EINVAL:
                 raise
@@ -351,7 +627,16 @@ class Server(object):
         self.logger.info(_("Starting single process server"))
         eventlet.wsgi.server(sock, application, custom_pool=self.pool,
                              log=logging.WritableLogger(self.logger),
-                             debug=False)
+                             debug=False, **self.get_server_kwargs())
+
+    def get_server_kwargs(self):
+        """
+        Return the keyword arguments of eventlet.wsgi.server which control
+        client connections.
+        """
+        return {'protocol': HttpProtocol,
+                'keepalive': CONF.http_keepalive,
+                'socket_timeout': CONF.client_socket_timeout or None}
 
 
 class Middleware(object):
@@ -46,6 +46,9 @@ class RequestContext(object):
         self.domain = domain
         self.user_domain = user_domain
         self.project_domain = project_domain
+        # Registry lookups made on behalf of this request, so that the
+        # layers handling it do not fetch the same image repeatedly.
+        self.registry_cache = {}
         if not self.is_admin:
             self.is_admin = \
                 self.policy_enforcer.check_is_admin(self)
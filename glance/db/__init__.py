@@ -16,6 +16,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+import time
+
 from oslo.config import cfg
 from wsme.rest.json import fromjson
 from wsme.rest.json import tojson
@@ -29,10 +32,32 @@ import glance.domain.proxy
 from glance.openstack.common import importutils
 from glance.openstack.common import jsonutils as json
 
+metadef_cache_opts = [
+    cfg.IntOpt('metadef_cache_ttl', default=0,
+               help=_('Number of seconds for which a metadata definition '
+                      'namespace read together with its objects, '
+                      'properties and resource type associations is '
+                      'reused by later requests to this API worker. '
+                      'Changes made through this worker are seen at once, '
+                      'changes made elsewhere after at most this long. '
+                      '0 disables the cache.')),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(metadef_cache_opts)
 CONF.import_opt('image_size_cap', 'glance.common.config')
 CONF.import_opt('metadata_encryption_key', 'glance.common.config')
 
+# Metadata definition namespace documents shared by the requests of a
+# worker for metadef_cache_ttl seconds:
+# {(namespace, owner, is_admin): (generation, expiry, document)}
+_METADEF_CACHE = {}
+_METADEF_CACHE_MAX_ENTRIES = 1000
+# Bumped on every metadef write made through this worker. Documents read
+# under an older generation are never served, including documents whose
+# read raced with the write.
+_METADEF_GENERATION = 0
+
 
 def get_api():
     api = importutils.import_module(CONF.data_api)
@@ -63,14 +88,24 @@ class ImageRepo(object):
         self.context = context
         self.db_api = db_api
 
+    def _get_image_with_tags(self, image_id):
+        # NOTE: Drivers such as the registry one can fetch an image and
+        # its tags in a single call; fall back to two calls otherwise.
+        if hasattr(self.db_api, 'image_get_with_tags'):
+            return self.db_api.image_get_with_tags(self.context, image_id)
+        db_api_image = self.db_api.image_get(self.context, image_id)
+        return db_api_image, None
+
     def get(self, image_id):
         try:
-            db_api_image = dict(self.db_api.image_get(self.context, image_id))
+            db_api_image, tags = self._get_image_with_tags(image_id)
+            db_api_image = dict(db_api_image)
             assert not db_api_image['deleted']
         except (exception.NotFound, exception.Forbidden, AssertionError):
             msg = _("No image found with ID %s") % image_id
             raise exception.NotFound(msg)
-        tags = self.db_api.image_tag_get_all(self.context, image_id)
+        if tags is None:
+            tags = self.db_api.image_tag_get_all(self.context, image_id)
         image = self._format_image_from_db(db_api_image, tags)
         return ImageProxy(image, self.context, self.db_api)
 
@@ -159,9 +194,13 @@ class ImageRepo(object):
         # the updated_at value is not set in the _format_image_to_db
         # function since it is specific to image create
         image_values['updated_at'] = image.updated_at
-        new_values = self.db_api.image_create(self.context, image_values)
-        self.db_api.image_tag_set_all(self.context,
-                                      image.image_id, image.tags)
+        if hasattr(self.db_api, 'image_create_with_tags'):
+            new_values = self.db_api.image_create_with_tags(
+                self.context, image_values, image.tags)
+        else:
+            new_values = self.db_api.image_create(self.context, image_values)
+            self.db_api.image_tag_set_all(self.context,
+                                          image.image_id, image.tags)
         image.created_at = new_values['created_at']
         image.updated_at = new_values['updated_at']
 
@@ -170,27 +209,42 @@ class ImageRepo(object):
         if image_values['size'] > CONF.image_size_cap:
             raise exception.ImageSizeLimitExceeded
         try:
-            new_values = self.db_api.image_update(self.context,
-                                                  image.image_id,
-                                                  image_values,
-                                                  purge_props=True)
+            if hasattr(self.db_api, 'image_update_with_tags'):
+                new_values = self.db_api.image_update_with_tags(
+                    self.context, image.image_id, image_values, image.tags,
+                    purge_props=True)
+            else:
+                new_values = self.db_api.image_update(self.context,
+                                                      image.image_id,
+                                                      image_values,
+                                                      purge_props=True)
+                self.db_api.image_tag_set_all(self.context, image.image_id,
+                                              image.tags)
         except (exception.NotFound, exception.Forbidden):
             msg = _("No image found with ID %s") % image.image_id
             raise exception.NotFound(msg)
-        self.db_api.image_tag_set_all(self.context, image.image_id,
-                                      image.tags)
         image.updated_at = new_values['updated_at']
 
     def remove(self, image):
         image_values = self._format_image_to_db(image)
-        try:
-            self.db_api.image_update(self.context, image.image_id,
-                                     image_values, purge_props=True)
-        except (exception.NotFound, exception.Forbidden):
-            msg = _("No image found with ID %s") % image.image_id
-            raise exception.NotFound(msg)
         # NOTE(markwash): don't update tags?
-        new_values = self.db_api.image_destroy(self.context, image.image_id)
+        if hasattr(self.db_api, 'image_update_and_destroy'):
+            try:
+                new_values = self.db_api.image_update_and_destroy(
+                    self.context, image.image_id, image_values,
+                    purge_props=True)
+            except (exception.NotFound, exception.Forbidden):
+                msg = _("No image found with ID %s") % image.image_id
+                raise exception.NotFound(msg)
+        else:
+            try:
+                self.db_api.image_update(self.context, image.image_id,
+                                         image_values, purge_props=True)
+            except (exception.NotFound, exception.Forbidden):
+                msg = _("No image found with ID %s") % image.image_id
+                raise exception.NotFound(msg)
+            new_values = self.db_api.image_destroy(self.context,
+                                                   image.image_id)
         image.updated_at = new_values['updated_at']
 
 
@@ -385,6 +439,21 @@ class TaskRepo(object):
         task.deleted_at = updated_values['deleted_at']
 
 
+def _invalidate_metadef_cache():
+    global _METADEF_GENERATION
+    _METADEF_GENERATION += 1
+
+
+def _invalidates_metadef_cache(func):
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _invalidate_metadef_cache()
+    return wrapped
+
+
 class MetadefNamespaceRepo(object):
 
     def __init__(self, context, db_api):
@@ -415,6 +484,7 @@ class MetadefNamespaceRepo(object):
         }
         return namespace
 
+    @_invalidates_metadef_cache
     def add(self, namespace):
         self.db_api.metadef_namespace_create(
             self.context,
@@ -430,6 +500,71 @@ class MetadefNamespaceRepo(object):
             raise exception.NotFound(msg)
         return self._format_namespace_from_db(db_api_namespace)
 
+    def _get_detail_from_db(self, namespace):
+        if hasattr(self.db_api, 'metadef_namespace_get_detail'):
+            return self.db_api.metadef_namespace_get_detail(
+                self.context, namespace)
+        return {
+            'namespace': self.db_api.metadef_namespace_get(
+                self.context, namespace),
+            'objects': self.db_api.metadef_object_get_all(
+                self.context, namespace),
+            'properties': self.db_api.metadef_property_get_all(
+                self.context, namespace),
+            'resource_type_associations': (
+                self.db_api.
+                metadef_resource_type_association_get_all_by_namespace(
+                    self.context, namespace)),
+        }
+
+    def _get_detail(self, namespace):
+        ttl = CONF.metadef_cache_ttl
+        if ttl <= 0:
+            return self._get_detail_from_db(namespace)
+
+        key = (namespace, self.context.owner, self.context.is_admin)
+        generation = _METADEF_GENERATION
+        now = time.time()
+        entry = _METADEF_CACHE.get(key)
+        if entry and entry[0] == generation and entry[1] > now:
+            return entry[2]
+
+        detail = self._get_detail_from_db(namespace)
+        if len(_METADEF_CACHE) >= _METADEF_CACHE_MAX_ENTRIES:
+            _METADEF_CACHE.clear()
+        _METADEF_CACHE[key] = (generation, now + ttl, detail)
+        return detail
+
+    def get_detail(self, namespace):
+        """
+        Get a namespace together with its contents.
+
+        :returns: a tuple of the namespace, its objects, its resource type
+                  associations and its properties
+        """
+        try:
+            detail = self._get_detail(namespace)
+        except (exception.NotFound, exception.Forbidden):
+            msg = _('Could not find namespace %s') % namespace
+            raise exception.NotFound(msg)
+
+        namespace_entity = self._format_namespace_from_db(
+            detail['namespace'])
+        object_repo = MetadefObjectRepo(self.context, self.db_api)
+        objects = [object_repo._format_metadef_object_from_db(
+            metadata_object, namespace_entity)
+            for metadata_object in detail['objects']]
+        resource_type_repo = MetadefResourceTypeRepo(self.context,
+                                                     self.db_api)
+        resource_types = [resource_type_repo._format_resource_type_from_db(
+            resource_type, namespace_entity)
+            for resource_type in detail['resource_type_associations']]
+        property_repo = MetadefPropertyRepo(self.context, self.db_api)
+        properties = [property_repo._format_metadef_property_from_db(
+            property, namespace_entity)
+            for property in detail['properties']]
+        return namespace_entity, objects, resource_types, properties
+
     def list(self, marker=None, limit=None, sort_key='created_at',
              sort_dir='desc', filters=None):
         db_namespaces = self.db_api.metadef_namespace_get_all(
@@ -443,6 +578,7 @@ class MetadefNamespaceRepo(object):
         return [self._format_namespace_from_db(namespace_obj)
                 for namespace_obj in db_namespaces]
 
+    @_invalidates_metadef_cache
     def remove(self, namespace):
         try:
             self.db_api.metadef_namespace_delete(self.context,
@@ -451,6 +587,7 @@ class MetadefNamespaceRepo(object):
             msg = _("The specified namespace %s could not be found")
             raise exception.NotFound(msg % namespace.namespace)
 
+    @_invalidates_metadef_cache
     def remove_objects(self, namespace):
         try:
             self.db_api.metadef_object_delete_namespace_content(
@@ -461,6 +598,7 @@ class MetadefNamespaceRepo(object):
             msg = _("The specified namespace %s could not be found")
             raise exception.NotFound(msg % namespace.namespace)
 
+    @_invalidates_metadef_cache
     def remove_properties(self, namespace):
         try:
             self.db_api.metadef_property_delete_namespace_content(
@@ -483,6 +621,7 @@ class MetadefNamespaceRepo(object):
             namespace_name
         )
 
+    @_invalidates_metadef_cache
     def save(self, namespace):
         try:
             self.db_api.metadef_namespace_update(
@@ -545,6 +684,7 @@ class MetadefObjectRepo(object):
         }
         return db_metadata_object
 
+    @_invalidates_metadef_cache
     def add(self, metadata_object):
         self.db_api.metadef_object_create(
             self.context,
@@ -575,6 +715,7 @@ class MetadefObjectRepo(object):
                                                     namespace_entity)
                 for metadata_object in db_metadata_objects]
 
+    @_invalidates_metadef_cache
     def remove(self, metadata_object):
         try:
             self.db_api.metadef_object_delete(
@@ -586,6 +727,7 @@ class MetadefObjectRepo(object):
             msg = _("The specified metadata object %s could not be found")
             raise exception.NotFound(msg % metadata_object.name)
 
+    @_invalidates_metadef_cache
     def save(self, metadata_object):
         try:
             self.db_api.metadef_object_update(
@@ -622,6 +764,7 @@ class MetadefResourceTypeRepo(object):
         }
         return db_resource_type
 
+    @_invalidates_metadef_cache
     def add(self, resource_type):
         self.db_api.metadef_resource_type_association_create(
             self.context, resource_type.namespace,
@@ -656,6 +799,7 @@ class MetadefResourceTypeRepo(object):
                 updated_at=resource_type['updated_at']
             ) for resource_type in db_resource_types]
 
+    @_invalidates_metadef_cache
     def remove(self, resource_type):
         try:
             self.db_api.metadef_resource_type_association_delete(
@@ -694,6 +838,7 @@ class MetadefPropertyRepo(object):
         }
         return db_metadata_object
 
+    @_invalidates_metadef_cache
     def add(self, property):
         self.db_api.metadef_property_create(
             self.context,
@@ -727,6 +872,7 @@ class MetadefPropertyRepo(object):
                 property, namespace_entity) for property in db_properties]
         )
 
+    @_invalidates_metadef_cache
     def remove(self, property):
         try:
             self.db_api.metadef_property_delete(
@@ -735,6 +881,7 @@ class MetadefPropertyRepo(object):
             msg = _("The specified property %s could not be found")
             raise exception.NotFound(msg % property.name)
 
+    @_invalidates_metadef_cache
     def save(self, property):
         try:
             self.db_api.metadef_property_update(
@@ -30,12 +30,17 @@ database back-end.
 
 import functools
 
+from oslo.config import cfg
+
 import glance.openstack.common.log as logging
 from glance.registry.client.v2 import api
 
 
 LOG = logging.getLogger(__name__)
 
+CONF = cfg.CONF
+CONF.import_opt('registry_client_batch_requests', 'glance.registry.client')
+
 
 def configure():
     api.configure_registry_client()
@@ -55,6 +60,17 @@ def _get_client(func):
     return wrapper
 
 
+def _batch(client, commands):
+    """
+    Execute dependent registry calls, in a single round-trip if
+    batching is enabled, and return the list of their results.
+    """
+    if CONF.registry_client_batch_requests:
+        return client.batch_request(commands)
+    return [client.do_request(method, **kwargs)
+            for method, kwargs in commands]
+
+
 @_get_client
 def image_create(client, values):
     """Create an image from the values dictionary."""
@@ -85,6 +101,51 @@ def image_get(client, image_id, force_show_deleted=False):
                             force_show_deleted=force_show_deleted)
 
 
+@_get_client
+def image_get_with_tags(client, image_id, force_show_deleted=False):
+    """Return an image and the list of its tags."""
+    return tuple(_batch(client, [
+        ('image_get', {'image_id': image_id,
+                       'force_show_deleted': force_show_deleted}),
+        ('image_tag_get_all', {'image_id': image_id})]))
+
+
+@_get_client
+def image_create_with_tags(client, values, tags):
+    """Create an image from the values dictionary and set its tags."""
+    return _batch(client, [
+        ('image_create', {'values': values}),
+        ('image_tag_set_all', {'image_id': values['id'], 'tags': tags})])[0]
+
+
+@_get_client
+def image_update_with_tags(client, image_id, values, tags, purge_props=False,
+                           from_state=None):
+    """
+    Update an image and replace its tags.
+
+    :raises NotFound if image does not exist.
+    """
+    return _batch(client, [
+        ('image_update', {'values': values, 'image_id': image_id,
+                          'purge_props': purge_props,
+                          'from_state': from_state}),
+        ('image_tag_set_all', {'image_id': image_id, 'tags': tags})])[0]
+
+
+@_get_client
+def image_update_and_destroy(client, image_id, values, purge_props=False):
+    """
+    Update an image and then destroy it.
+
+    :raises NotFound if image does not exist.
+    """
+    return _batch(client, [
+        ('image_update', {'values': values, 'image_id': image_id,
+                          'purge_props': purge_props}),
+        ('image_destroy', {'image_id': image_id})])[1]
+
+
 def is_image_visible(context, image, status=None):
     """Return True if the image is visible in this context."""
     # Is admin == image visible
@@ -299,6 +360,11 @@ def metadef_namespace_get(client, namespace_name, session=None):
     return client.metadef_namespace_get(namespace_name=namespace_name)
 
 
+@_get_client
+def metadef_namespace_get_detail(client, namespace_name, session=None):
+    return client.metadef_namespace_get_detail(namespace_name=namespace_name)
+
+
 @_get_client
 def metadef_namespace_create(client, values, session=None):
     return client.metadef_namespace_create(values=values)
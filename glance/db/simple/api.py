@@ -1134,6 +1134,22 @@ def metadef_namespace_get(context, namespace_name):
     return namespace
 
 
+@log_call
+def metadef_namespace_get_detail(context, namespace_name):
+    """
+    Get a namespace with its objects, properties and resource type
+    associations
+    """
+    associations = metadef_resource_type_association_get_all_by_namespace(
+        context, namespace_name)
+    return {
+        'namespace': metadef_namespace_get(context, namespace_name),
+        'objects': metadef_object_get_all(context, namespace_name),
+        'properties': metadef_property_get_all(context, namespace_name),
+        'resource_type_associations': associations,
+    }
+
+
 @log_call
 def metadef_namespace_get_all(context,
                               marker=None,
@@ -20,7 +20,9 @@
 
 """Defines interface for DB access."""
 
+import datetime
 import threading
+import time
 
 from oslo.config import cfg
 from oslo.db import exception as db_exception
@@ -57,7 +59,18 @@ _LW = i18n._LW
 STATUSES = ['active', 'saving', 'queued', 'killed', 'pending_delete',
             'deleted']
 
+visibility_opts = [
+    cfg.BoolOpt('use_image_visibility_index', default=False,
+                help=_('Serve image listings of regular users from the '
+                       'image_visibility table instead of a union of the '
+                       'public, owned and shared images. The table is kept '
+                       'up to date by every image and membership change; '
+                       'run "glance-manage db rebuild_image_visibility" '
+                       'once after upgrading before enabling this.')),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(visibility_opts)
 CONF.import_opt('debug', 'glance.openstack.common.log')
 CONF.import_group("profiler", "glance.common.wsgi")
 
@@ -152,6 +165,7 @@ def image_destroy(context, image_id):
         _image_property_delete_all(context, image_id, delete_time, session)
 
         _image_member_delete_all(context, image_id, delete_time, session)
+        _image_visibility_update(image_id, session)
 
         _image_tag_delete_all(context, image_id, delete_time, session)
 
@@ -502,6 +516,20 @@ def _select_images_query(context, image_conditions, admin_as_user,
     if visibility is not None and visibility == 'shared':
         return query_member
 
+    if (regular_user and context.owner is not None and
+            CONF.use_image_visibility_index):
+        tenants = [models.PUBLIC_TENANT, context.owner]
+        query = session.query(models.Image)\
+            .join(models.ImageVisibility,
+                  models.ImageVisibility.image_id == models.Image.id)\
+            .filter(models.ImageVisibility.tenant.in_(tenants))\
+            .filter(img_conditional_clause)
+        if member_status != 'all':
+            query = query.filter(sa_sql.or_(
+                models.ImageVisibility.status == None,
+                models.ImageVisibility.status == member_status))
+        return query
+
     query_image = session.query(models.Image)\
         .filter(img_conditional_clause)
     if regular_user:
@@ -768,6 +796,9 @@ def _image_update(context, values, image_id, purge_props=False,
             _image_locations_set(context, image_ref.id, location_data,
                                  session=session)
 
+        if not image_id or 'is_public' in values or 'owner' in values:
+            _image_visibility_update(image_ref.id, session)
+
     return image_get(context, image_ref.id)
 
 
@@ -1015,8 +1046,11 @@ def _image_member_update(context, memb_ref, values, session=None):
     _drop_protected_attrs(models.ImageMember, values)
     values["deleted"] = False
     values.setdefault('can_share', False)
-    memb_ref.update(values)
-    memb_ref.save(session=session)
+    session = session or get_session()
+    with session.begin(subtransactions=True):
+        memb_ref.update(values)
+        memb_ref.save(session=session)
+        _image_visibility_update(memb_ref.image_id, session)
     return memb_ref
 
 
@@ -1028,7 +1062,9 @@ def image_member_delete(context, memb_id, session=None):
 
 
 def _image_member_delete(context, memb_ref, session):
-    memb_ref.delete(session=session)
+    with session.begin(subtransactions=True):
+        memb_ref.delete(session=session)
+        _image_visibility_update(memb_ref.image_id, session)
 
 
 def _image_member_delete_all(context, image_id, delete_time=None,
@@ -1041,6 +1077,62 @@ def _image_member_delete_all(context, image_id, delete_time=None,
     return members_updated_count
 
 
+def _image_visibility_selects(*conditions):
+    """
+    Return the (columns, select) pairs producing the image_visibility rows
+    of the images matching the given conditions.
+    """
+    images = models.Image.__table__
+    members = models.ImageMember.__table__
+    public = sa_sql.select(
+        [images.c.id, sa_sql.literal(models.PUBLIC_TENANT)]).where(
+            sa_sql.and_(images.c.is_public == True, *conditions))
+    owned = sa_sql.select([images.c.id, images.c.owner]).where(
+        sa_sql.and_(images.c.is_public == False,
+                    images.c.owner != None, *conditions))
+    shared = sa_sql.select(
+        [members.c.image_id, members.c.member, members.c.status]).where(
+            sa_sql.and_(members.c.image_id == images.c.id,
+                        members.c.deleted == False,
+                        images.c.is_public == False,
+                        sa_sql.or_(images.c.owner == None,
+                                   images.c.owner != members.c.member),
+                        *conditions))
+    return [(['image_id', 'tenant'], public),
+            (['image_id', 'tenant'], owned),
+            (['image_id', 'tenant', 'status'], shared)]
+
+
+def _image_visibility_update(image_id, session):
+    """Recompute the image_visibility rows of an image."""
+    images = models.Image.__table__
+    visibility = models.ImageVisibility.__table__
+    with session.begin(subtransactions=True):
+        session.execute(visibility.delete().where(
+            visibility.c.image_id == image_id))
+        for columns, select in _image_visibility_selects(
+                images.c.id == image_id):
+            session.execute(visibility.insert().from_select(columns, select))
+
+
+def image_visibility_rebuild(context):
+    """
+    Rebuild the image_visibility table from the images and their members.
+
+    :returns: the number of rows written
+    """
+    visibility = models.ImageVisibility.__table__
+    session = get_session()
+    rows = 0
+    with session.begin():
+        session.execute(visibility.delete())
+        for columns, select in _image_visibility_selects():
+            result = session.execute(
+                visibility.insert().from_select(columns, select))
+            rows += result.rowcount
+    return rows
+
+
 def _image_member_get(context, memb_id, session):
     """Fetch an ImageMember entity by id."""
     query = session.query(models.ImageMember)
@@ -1435,6 +1527,109 @@ def _task_format(task_ref, task_info_ref=None):
     return task_dict
 
 
+def _purge_table(session, table, id_column, condition, max_rows,
+                 batch_size, sleep, dependents=()):
+    """
+    Remove the rows of a table matching a condition in small batches.
+
+    Each batch selects at most batch_size ids and deletes them, together
+    with the rows of dependent tables referring to them, in a transaction
+    of its own, so that locks are only held briefly.
+
+    :param dependents: (table, column) pairs of rows to delete along with
+                       the rows they refer to
+    :returns: a list of (table name, number of rows removed) tuples for
+              the dependent tables followed by the table itself
+    """
+    counts = [0] * len(dependents)
+    purged = 0
+    while max_rows is None or purged < max_rows:
+        limit = batch_size
+        if max_rows is not None:
+            limit = min(limit, max_rows - purged)
+        with session.begin():
+            query = sa_sql.select([id_column]).where(condition).limit(limit)
+            ids = [row[0] for row in session.execute(query)]
+            if not ids:
+                break
+            for i, (dependent_table, dependent_column) in enumerate(
+                    dependents):
+                result = session.execute(dependent_table.delete().where(
+                    dependent_column.in_(ids)))
+                counts[i] += result.rowcount
+            session.execute(table.delete().where(id_column.in_(ids)))
+        purged += len(ids)
+        if len(ids) < limit:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    results = [(dependent_table.name, count) for (dependent_table, _column),
+               count in zip(dependents, counts)]
+    results.append((table.name, purged))
+    return results
+
+
+def purge_deleted_rows(context, age_in_days, max_rows=None, batch_size=100,
+                       sleep=0):
+    """
+    Permanently remove soft-deleted rows and expired tasks.
+
+    Rows deleted, and tasks which expired, more than age_in_days ago are
+    removed. Image rows go only once none of their properties, tags,
+    locations or members are left, and nothing is removed for images
+    waiting to be scrubbed.
+
+    :param max_rows: maximum number of rows to remove from each table,
+                     None for no limit
+    :param batch_size: number of rows removed per transaction
+    :param sleep: seconds to pause between batches
+    :returns: a list of (table name, number of rows removed) tuples
+    """
+    session = get_session()
+    cutoff = timeutils.utcnow() - datetime.timedelta(days=age_in_days)
+
+    images = models.Image.__table__
+    pending_delete = sa_sql.select([images.c.id]).where(
+        images.c.status == 'pending_delete')
+    image_children = [models.ImageTag.__table__,
+                      models.ImageProperty.__table__,
+                      models.ImageMember.__table__,
+                      models.ImageLocation.__table__]
+
+    results = []
+    for table in image_children:
+        condition = sa_sql.and_(table.c.deleted == True,
+                                table.c.deleted_at < cutoff,
+                                ~table.c.image_id.in_(pending_delete))
+        results.extend(_purge_table(session, table, table.c.id, condition,
+                                    max_rows, batch_size, sleep))
+
+    condition = sa_sql.and_(images.c.deleted == True,
+                            images.c.deleted_at < cutoff,
+                            images.c.status != 'pending_delete',
+                            *[~sa_sql.exists().where(
+                                table.c.image_id == images.c.id)
+                              for table in image_children])
+    visibility = models.ImageVisibility.__table__
+    results.extend(_purge_table(session, images, images.c.id, condition,
+                                max_rows, batch_size, sleep,
+                                dependents=[(visibility,
+                                             visibility.c.image_id)]))
+
+    tasks = models.Task.__table__
+    task_info = models.TaskInfo.__table__
+    condition = sa_sql.or_(
+        sa_sql.and_(tasks.c.deleted == True,
+                    tasks.c.deleted_at < cutoff),
+        tasks.c.expires_at < cutoff)
+    results.extend(_purge_table(session, tasks, tasks.c.id, condition,
+                                max_rows, batch_size, sleep,
+                                dependents=[(task_info, task_info.c.task_id)]))
+
+    return results
+
+
 def metadef_namespace_get_all(context, marker=None, limit=None, sort_key=None,
                               sort_dir=None, filters=None, session=None):
     """List all available namespaces."""
@@ -1451,6 +1646,16 @@ def metadef_namespace_get(context, namespace_name, session=None):
         context, namespace_name, session)
 
 
+def metadef_namespace_get_detail(context, namespace_name, session=None):
+    """
+    Get a namespace with its objects, properties and resource type
+    associations or raise if it does not exist or is not visible.
+    """
+    session = session or get_session()
+    return metadef_namespace_api.get_detail(
+        context, namespace_name, session)
+
+
 def metadef_namespace_create(context, values, session=None):
     """Create a namespace or raise if it already exists."""
     session = session or get_session()
@@ -68,42 +68,160 @@ def get_metadef_objects_table(meta):
     return sqlalchemy.Table('metadef_objects', meta, autoload=True)
 
 
-def _get_resource_type_id(meta, name):
-    resource_types_table = get_metadef_resource_types_table(meta)
-    return resource_types_table.select().\
-        where(resource_types_table.c.name == name).execute().fetchone().id
-
-
-def _get_resource_type(meta, resource_type_id):
-    resource_types_table = get_metadef_resource_types_table(meta)
-    return resource_types_table.select().\
-        where(resource_types_table.c.id == resource_type_id).\
-        execute().fetchone()
-
-
-def _get_namespace_resource_types(meta, namespace_id):
-    namespace_resource_types_table =\
-        get_metadef_namespace_resource_types_table(meta)
-    return namespace_resource_types_table.select().\
-        where(namespace_resource_types_table.c.namespace_id == namespace_id).\
-        execute().fetchall()
-
-
-def _get_properties(meta, namespace_id):
-    properties_table = get_metadef_properties_table(meta)
-    return properties_table.select().\
-        where(properties_table.c.namespace_id == namespace_id).\
-        execute().fetchall()
-
-
-def _get_objects(meta, namespace_id):
-    objects_table = get_metadef_objects_table(meta)
-    return objects_table.select().\
-        where(objects_table.c.namespace_id == namespace_id).\
-        execute().fetchall()
-
-
-def _populate_metadata(meta, metadata_path=None):
+def _get_resource_type_ids(conn, resource_types_table):
+    """Return a dict mapping the name of every resource type to its id."""
+    rows = conn.execute(sqlalchemy.select([resource_types_table.c.name,
+                                           resource_types_table.c.id]))
+    return dict((name, id) for name, id in rows)
+
+
+def _is_changed(db_row, values, columns):
+    for column in columns:
+        if column == 'schema':
+            # NOTE: Compare schemas as documents, key order in the stored
+            # JSON does not matter.
+            if json.loads(db_row[column] or 'null') != json.loads(
+                    values[column]):
+                return True
+        elif db_row[column] != values[column]:
+            return True
+    return False
+
+
+def _write_rows(conn, table, namespace_id, rows, key, columns, merge, now):
+    """
+    Write the rows belonging to a namespace.
+
+    All new rows are inserted with a single executemany statement. In
+    merge mode the rows already stored for the namespace are read once,
+    and only those whose columns differ are updated; rows missing from
+    the file are kept.
+
+    :param key: column identifying a row within the namespace
+    :param columns: columns compared to decide whether a row changed
+    :returns: a tuple of the number of rows inserted and updated
+    """
+    existing = {}
+    if merge:
+        db_rows = conn.execute(
+            table.select().where(table.c.namespace_id == namespace_id))
+        existing = dict((db_row[key], db_row) for db_row in db_rows)
+
+    new_rows = []
+    updated = 0
+    for values in rows:
+        db_row = existing.get(values[key])
+        if db_row is None:
+            new_rows.append(values)
+        elif _is_changed(db_row, values, columns):
+            changes = dict((column, values[column]) for column in columns)
+            changes['updated_at'] = now
+            conn.execute(table.update().
+                         where(table.c.namespace_id == namespace_id).
+                         where(table.c[key] == values[key]).
+                         values(changes))
+            updated += 1
+
+    if new_rows:
+        conn.execute(table.insert(), new_rows)
+    return len(new_rows), updated
+
+
+def _load_namespace(conn, tables, resource_type_ids, metadata, merge):
+    """
+    Load the namespace described by a metadata file.
+
+    :param resource_type_ids: dict mapping resource type names to ids,
+                              updated with the resource types created
+    :returns: a dict mapping table names to the number of rows inserted
+              and updated, or None if the namespace already exists and
+              merge is False
+    """
+    now = timeutils.utcnow()
+    namespaces_table = tables['metadef_namespaces']
+    values = {
+        'namespace': metadata.get('namespace', None),
+        'display_name': metadata.get('display_name', None),
+        'description': metadata.get('description', None),
+        'visibility': metadata.get('visibility', None),
+        'protected': metadata.get('protected', None),
+        'owner': metadata.get('owner', 'admin'),
+    }
+    counts = {}
+
+    db_namespace = conn.execute(namespaces_table.select().where(
+        namespaces_table.c.namespace == values['namespace'])).fetchone()
+    if db_namespace is None:
+        values['created_at'] = now
+        values['updated_at'] = now
+        result = conn.execute(namespaces_table.insert(), values)
+        namespace_id = result.inserted_primary_key[0]
+        counts['metadef_namespaces'] = (1, 0)
+    elif not merge:
+        return None
+    else:
+        namespace_id = db_namespace['id']
+        updated = 0
+        if _is_changed(db_namespace, values, values.keys()):
+            values['updated_at'] = now
+            conn.execute(namespaces_table.update().
+                         where(namespaces_table.c.id == namespace_id).
+                         values(values))
+            updated = 1
+        counts['metadef_namespaces'] = (0, updated)
+
+    associations = metadata.get('resource_type_associations', [])
+    missing = []
+    for resource_type in associations:
+        name = resource_type['name']
+        if name not in resource_type_ids and name not in missing:
+            missing.append(name)
+    if missing:
+        resource_types_table = tables['metadef_resource_types']
+        conn.execute(resource_types_table.insert(),
+                     [{'name': name, 'protected': True, 'created_at': now,
+                       'updated_at': now}
+                      for name in missing])
+        resource_type_ids.update(
+            _get_resource_type_ids(conn, resource_types_table))
+        counts['metadef_resource_types'] = (len(missing), 0)
+
+    rows = [{'resource_type_id': resource_type_ids[resource_type['name']],
+             'namespace_id': namespace_id,
+             'created_at': now,
+             'updated_at': now,
+             'properties_target': resource_type.get('properties_target'),
+             'prefix': resource_type.get('prefix', None)}
+            for resource_type in associations]
+    counts['metadef_namespace_resource_types'] = _write_rows(
+        conn, tables['metadef_namespace_resource_types'], namespace_id, rows,
+        'resource_type_id', ('properties_target', 'prefix'), merge, now)
+
+    rows = [{'name': property,
+             'namespace_id': namespace_id,
+             'schema': json.dumps(schema),
+             'created_at': now,
+             'updated_at': now}
+            for property, schema in metadata.get('properties', {}).items()]
+    counts['metadef_properties'] = _write_rows(
+        conn, tables['metadef_properties'], namespace_id, rows,
+        'name', ('schema',), merge, now)
+
+    rows = [{'name': object.get('name', None),
+             'description': object.get('description', None),
+             'namespace_id': namespace_id,
+             'schema': json.dumps(object.get('properties', None)),
+             'created_at': now,
+             'updated_at': now}
+            for object in metadata.get('objects', [])]
+    counts['metadef_objects'] = _write_rows(
+        conn, tables['metadef_objects'], namespace_id, rows,
+        'name', ('description', 'schema'), merge, now)
+
+    return counts
+
+
+def _populate_metadata(meta, metadata_path=None, merge=False):
     if not metadata_path:
         metadata_path = CONF.metadata_source_path
 
@@ -115,20 +233,25 @@ def _populate_metadata(meta, metadata_path=None):
         LOG.error(utils.exception_to_str(e))
         return
 
-    metadef_namespaces_table = get_metadef_namespaces_table(meta)
-    metadef_namespace_resource_types_tables =\
-        get_metadef_namespace_resource_types_table(meta)
-    metadef_objects_table = get_metadef_objects_table(meta)
-    metadef_properties_table = get_metadef_properties_table(meta)
-    metadef_resource_types_table = get_metadef_resource_types_table(meta)
-
     if not json_schema_files:
         LOG.error(_LE("Json schema files not found in %s. Aborting."),
                   metadata_path)
         return
 
-    for namespace_id, json_schema_file in enumerate(json_schema_files,
-                                                    start=1):
+    tables = {
+        'metadef_namespaces': get_metadef_namespaces_table(meta),
+        'metadef_namespace_resource_types':
+        get_metadef_namespace_resource_types_table(meta),
+        'metadef_objects': get_metadef_objects_table(meta),
+        'metadef_properties': get_metadef_properties_table(meta),
+        'metadef_resource_types': get_metadef_resource_types_table(meta),
+    }
+
+    with meta.bind.connect() as conn:
+        resource_type_ids = _get_resource_type_ids(
+            conn, tables['metadef_resource_types'])
+
+    for json_schema_file in sorted(json_schema_files):
         try:
             file = join(metadata_path, json_schema_file)
             json_metadata = open(file)
@@ -138,62 +261,32 @@ def _populate_metadata(meta, metadata_path=None):
             LOG.error(utils.exception_to_str(e))
             continue
 
-        values = {
-            'id': namespace_id,
-            'namespace': metadata.get('namespace', None),
-            'display_name': metadata.get('display_name', None),
-            'description': metadata.get('description', None),
-            'visibility': metadata.get('visibility', None),
-            'protected': metadata.get('protected', None),
-            'owner': metadata.get('owner', 'admin'),
-            'created_at': timeutils.utcnow()
-        }
-        _insert_data_to_db(metadef_namespaces_table, values)
-
-        for resource_type in metadata.get('resource_type_associations', []):
-            try:
-                resource_type_id = \
-                    _get_resource_type_id(meta, resource_type['name'])
-            except AttributeError:
-                values = {
-                    'name': resource_type['name'],
-                    'protected': True,
-                    'created_at': timeutils.utcnow()
-                }
-                _insert_data_to_db(metadef_resource_types_table,
-                                   values)
-                resource_type_id =\
-                    _get_resource_type_id(meta, resource_type['name'])
-
-            values = {
-                'resource_type_id': resource_type_id,
-                'namespace_id': namespace_id,
-                'created_at': timeutils.utcnow(),
-                'properties_target': resource_type.get('properties_target'),
-                'prefix': resource_type.get('prefix', None)
-            }
-            _insert_data_to_db(metadef_namespace_resource_types_tables,
-                               values)
-
-        for property, schema in metadata.get('properties', {}).iteritems():
-            values = {
-                'name': property,
-                'namespace_id': namespace_id,
-                'schema': json.dumps(schema),
-                'created_at': timeutils.utcnow()
-            }
-            _insert_data_to_db(metadef_properties_table, values)
-
-        for object in metadata.get('objects', []):
-            values = {
-                'name': object.get('name', None),
-                'description': object.get('description', None),
-                'namespace_id': namespace_id,
-                'schema': json.dumps(object.get('properties', None)),
-                'created_at': timeutils.utcnow()
-            }
-            _insert_data_to_db(metadef_objects_table, values)
+        # NOTE: Every file is loaded in a transaction of its own, so that a
+        # failing file leaves no partial namespace behind.
+        known_resource_type_ids = resource_type_ids.copy()
+        try:
+            with meta.bind.begin() as conn:
+                counts = _load_namespace(conn, tables, resource_type_ids,
+                                         metadata, merge)
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            resource_type_ids = known_resource_type_ids
+            LOG.error(_LE("File %(file)s not loaded to database: %(error)s"),
+                      {'file': file, 'error': utils.exception_to_str(e)})
+            continue
+
+        if counts is None:
+            LOG.warning(_LW("Namespace %(namespace)s from file %(file)s "
+                            "already exists, skipping it."),
+                        {'namespace': metadata.get('namespace'),
+                         'file': file})
+            continue
 
+        for table_name in sorted(counts):
+            inserted, updated = counts[table_name]
+            LOG.info(_LI("Table %(table)s: %(inserted)d rows inserted, "
+                         "%(updated)d rows updated."),
+                     {'table': table_name, 'inserted': inserted,
+                      'updated': updated})
         LOG.info(_LI("File %s loaded to database."), file)
 
     LOG.info(_LI("Metadata loading finished"))
@@ -210,12 +303,11 @@ def _clear_metadata(meta):
         LOG.info(_LI("Table %s has been cleared"), table)
 
 
-def _insert_data_to_db(table, values, log_exception=True):
-    try:
-        table.insert(values=values).execute()
-    except sqlalchemy.exc.IntegrityError:
-        if log_exception:
-            LOG.warning(_LW("Duplicate entry for values: %s"), values)
+def _group_by_namespace(rows):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row['namespace_id'], []).append(row)
+    return grouped
 
 
 def _export_data_to_file(meta, path):
@@ -223,11 +315,29 @@ def _export_data_to_file(meta, path):
         path = CONF.metadata_source_path
 
     namespace_table = get_metadef_namespaces_table(meta)
+    namespace_resource_types_table = (
+        get_metadef_namespace_resource_types_table(meta))
+    resource_types_table = get_metadef_resource_types_table(meta)
+    objects_table = get_metadef_objects_table(meta)
+    properties_table = get_metadef_properties_table(meta)
+
+    # NOTE: Each table is read once for all namespaces.
     namespaces = namespace_table.select().execute().fetchall()
+    resource_types_by_ns = _group_by_namespace(
+        sqlalchemy.select([namespace_resource_types_table.c.namespace_id,
+                           resource_types_table.c.name,
+                           resource_types_table.c.protected]).
+        select_from(namespace_resource_types_table.join(
+            resource_types_table)).
+        execute().fetchall())
+    objects_by_ns = _group_by_namespace(
+        objects_table.select().execute().fetchall())
+    properties_by_ns = _group_by_namespace(
+        properties_table.select().execute().fetchall())
 
     pattern = re.compile('[\W_]+', re.UNICODE)
 
-    for id, namespace in enumerate(namespaces, start=1):
+    for namespace in namespaces:
         namespace_id = namespace['id']
         namespace_file_name = pattern.sub('', namespace['display_name'])
 
@@ -243,16 +353,8 @@ def _export_data_to_file(meta, path):
             'objects': []
         }
 
-        namespace_resource_types = _get_namespace_resource_types(meta,
-                                                                 namespace_id)
-        db_objects = _get_objects(meta, namespace_id)
-        db_properties = _get_properties(meta, namespace_id)
-
         resource_types = []
-        for namespace_resource_type in namespace_resource_types:
-            resource_type =\
-                _get_resource_type(meta,
-                                   namespace_resource_type['resource_type_id'])
+        for resource_type in resource_types_by_ns.get(namespace_id, []):
             resource_types.append({
                 'name': resource_type['name'],
                 'protected': resource_type['protected']
@@ -262,7 +364,7 @@ def _export_data_to_file(meta, path):
         })
 
         objects = []
-        for object in db_objects:
+        for object in objects_by_ns.get(namespace_id, []):
             objects.append({
                 "name": object['name'],
                 "description": object['description'],
@@ -273,7 +375,7 @@ def _export_data_to_file(meta, path):
         })
 
         properties = {}
-        for property in db_properties:
+        for property in properties_by_ns.get(namespace_id, []):
             properties.update({
                 property['name']: json.loads(property['schema'])
             })
@@ -293,11 +395,11 @@ def _export_data_to_file(meta, path):
                  namespace_file_name, file_name)
 
 
-def db_load_metadefs(engine, metadata_path=None):
+def db_load_metadefs(engine, metadata_path=None, merge=False):
     meta = MetaData()
     meta.bind = engine
 
-    _populate_metadata(meta, metadata_path)
+    _populate_metadata(meta, metadata_path, merge)
 
 
 def db_unload_metadefs(engine):
@@ -219,6 +219,40 @@ def get(context, name, session):
     return namespace_rec.as_dict()
 
 
+def get_detail(context, name, session):
+    """
+    Get a namespace by name together with its objects, properties and
+    resource type associations, raise if not found or not visible.
+
+    The namespace is looked up once and each of the other tables is read
+    with a single query, all in the same session.
+    """
+    namespace_rec = _get_by_name(context, name, session)
+    namespace_id = namespace_rec.id
+
+    objects = (session.query(models.MetadefObject)
+               .filter_by(namespace_id=namespace_id).all())
+    properties = (session.query(models.MetadefProperty)
+                  .filter_by(namespace_id=namespace_id).all())
+    db_recs = (
+        session.query(models.MetadefResourceType)
+        .join(models.MetadefResourceType.associations)
+        .filter_by(namespace_id=namespace_id)
+        .values(models.MetadefResourceType.name,
+                models.MetadefNamespaceResourceType.properties_target,
+                models.MetadefNamespaceResourceType.prefix,
+                models.MetadefNamespaceResourceType.created_at,
+                models.MetadefNamespaceResourceType.updated_at))
+    associations = [
+        metadef_api.resource_type_association._set_model_dict(*db_rec)
+        for db_rec in db_recs]
+
+    return {'namespace': namespace_rec.as_dict(),
+            'objects': [obj.as_dict() for obj in objects],
+            'properties': [prop.as_dict() for prop in properties],
+            'resource_type_associations': associations}
+
+
 def create(context, values, session):
     """Create a namespace, raise if namespace already exists."""
 
@@ -0,0 +1,53 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy.schema import (Column, ForeignKey, Index, MetaData, Table)
+
+from glance.db.sqlalchemy.migrate_repo.schema import (
+    String, create_tables, drop_tables)  # noqa
+
+
+def define_image_visibility_table(meta):
+    # Load the images table for the ForeignKey below
+    Table('images', meta, autoload=True)
+
+    image_visibility = Table('image_visibility',
+                             meta,
+                             Column('tenant', String(255), primary_key=True,
+                                    nullable=False),
+                             Column('image_id', String(36),
+                                    ForeignKey('images.id'),
+                                    primary_key=True, nullable=False),
+                             Column('status', String(20)),
+                             mysql_engine='InnoDB',
+                             extend_existing=True)
+
+    Index('ix_image_visibility_image_id', image_visibility.c.image_id)
+
+    return image_visibility
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    tables = [define_image_visibility_table(meta)]
+    create_tables(tables)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    tables = [define_image_visibility_table(meta)]
+    drop_tables(tables)
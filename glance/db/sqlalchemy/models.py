@@ -42,6 +42,9 @@ from glance.openstack.common import timeutils
 
 BASE = declarative_base()
 
+# Tenant recorded in image_visibility for images visible to every tenant
+PUBLIC_TENANT = '*'
+
 
 @compiles(BigInteger, 'sqlite')
 def compile_big_int_sqlite(type_, compiler, **kw):
@@ -246,6 +249,23 @@ class TaskInfo(BASE, models.ModelBase):
     message = Column(Text)
 
 
+class ImageVisibility(BASE, models.ModelBase):
+    """
+    Represents the tenants to which an image is visible in the datastore.
+
+    A public image has a single row for PUBLIC_TENANT. Other images have
+    a row for their owner and one for each member, which records the
+    status of the membership.
+    """
+    __tablename__ = 'image_visibility'
+    __table_args__ = (Index('ix_image_visibility_image_id', 'image_id'),)
+
+    tenant = Column(String(255), primary_key=True, nullable=False)
+    image_id = Column(String(36), ForeignKey('images.id'),
+                      primary_key=True, nullable=False)
+    status = Column(String(20))
+
+
 def register_models(engine):
     """Create database tables for all models with the given engine."""
     models = (Image, ImageProperty, ImageMember)
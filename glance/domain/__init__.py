@@ -95,6 +95,14 @@ class ImageFactory(object):
 
 class Image(object):
 
+    # NOTE: Images are built in bulk for listings, so their attributes are
+    # kept in slots rather than in a per-instance dict.
+    __slots__ = ('image_id', '_status', 'created_at', 'updated_at', 'name',
+                 '_visibility', '_min_disk', '_min_ram', 'protected',
+                 'locations', 'checksum', 'owner', '_disk_format',
+                 '_container_format', 'size', 'virtual_size',
+                 'extra_properties', '_tags')
+
     valid_state_targets = {
         # Each key denotes a "current" state for the image. Corresponding
         # values list the valid states to which we can jump from that "current"
@@ -262,22 +270,28 @@ class ExtraProperties(collections.MutableMapping, dict):
         return dict.__delitem__(self, key)
 
     def __eq__(self, other):
-        if isinstance(other, ExtraProperties):
-            return dict(self).__eq__(dict(other))
-        elif isinstance(other, dict):
-            return dict(self).__eq__(other)
+        # NOTE: ExtraProperties is a dict itself, so compare in place
+        # rather than through copies.
+        if isinstance(other, dict):
+            return dict.__eq__(self, other)
         else:
             return False
 
+    def __iter__(self):
+        return dict.__iter__(self)
+
     def __len__(self):
-        return dict(self).__len__()
+        return dict.__len__(self)
 
     def keys(self):
-        return dict(self).keys()
+        return dict.keys(self)
 
 
 class ImageMembership(object):
 
+    __slots__ = ('id', 'image_id', 'member_id', 'created_at', 'updated_at',
+                 '_status')
+
     def __init__(self, image_id, member_id, created_at, updated_at,
                  id=None, status=None):
         self.id = id
@@ -311,6 +325,12 @@ class ImageMemberFactory(object):
 
 
 class Task(object):
+
+    # NOTE: deleted_at is only set once TaskRepo has removed the task.
+    __slots__ = ('task_id', '_status', 'type', 'owner', 'expires_at',
+                 '_time_to_live', 'created_at', 'updated_at', 'deleted_at',
+                 'task_input', 'result', '_message')
+
     _supported_task_type = ('import',)
 
     _supported_task_status = ('pending', 'processing', 'success', 'failure')
@@ -409,6 +429,9 @@ class Task(object):
 
 class TaskStub(object):
 
+    __slots__ = ('task_id', '_status', 'type', 'owner', 'expires_at',
+                 'created_at', 'updated_at')
+
     def __init__(self, task_id, task_type, status, owner,
                  expires_at, created_at, updated_at):
         self.task_id = task_id
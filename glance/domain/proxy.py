@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import operator
+
 
 def _proxy(target, attr):
     def get_attr(self):
@@ -25,9 +27,77 @@ def _proxy(target, attr):
     def del_attr(self):
         return delattr(getattr(self, target), attr)
 
+    # NOTE: Marks reads as plain pass-through, which lets flatten() skip
+    # this layer when reading the attribute.
+    get_attr.proxy_target = target
     return property(get_attr, set_attr, del_attr)
 
 
+# Flattened proxy classes, keyed by the classes of a chain of proxies
+_FLAT_CLASSES = {}
+
+
+def _get_pass_through_target(cls, attr):
+    descriptor = getattr(cls, attr, None)
+    if isinstance(descriptor, property):
+        return getattr(descriptor.fget, 'proxy_target', None)
+    return None
+
+
+def _build_flat_class(chain):
+    """
+    Build a subclass of the outermost proxy class of a chain in which
+    every attribute only passed through by the outer layers is read
+    straight from the first layer that does something with it.
+
+    Writes and deletes still go through the outermost layer.
+    """
+    outer = chain[0]
+    attrs = {}
+    for attr in dir(outer):
+        path = []
+        for cls in chain:
+            if _get_pass_through_target(cls, attr) != 'base':
+                break
+            path.append('base')
+        if len(path) < 2:
+            continue
+        descriptor = getattr(outer, attr)
+        getter = operator.attrgetter('.'.join(path + [attr]))
+        attrs[attr] = property(getter, descriptor.fset, descriptor.fdel)
+    if not attrs:
+        return outer
+    attrs['__module__'] = outer.__module__
+    attrs['__slots__'] = ()
+    return type(outer.__name__, (outer,), attrs)
+
+
+def flatten(proxy):
+    """
+    Speed up attribute reads on a chain of proxies.
+
+    The classes generated for each distinct chain, that is for each
+    combination of enabled layers, are cached, so flattening a proxy
+    only costs a walk down its chain.
+    """
+    if proxy is None:
+        return proxy
+    chain = []
+    obj = proxy
+    while obj is not None:
+        chain.append(type(obj))
+        obj = getattr(obj, 'base', None)
+    chain = tuple(chain)
+    try:
+        flat_class = _FLAT_CLASSES[chain]
+    except KeyError:
+        flat_class = _FLAT_CLASSES.setdefault(chain,
+                                              _build_flat_class(chain))
+    if flat_class is not chain[0]:
+        proxy.__class__ = flat_class
+    return proxy
+
+
 class Helper(object):
     def __init__(self, proxy_class=None, proxy_kwargs=None):
         self.proxy_class = proxy_class
@@ -105,6 +175,39 @@ class Repo(object):
         return self.helper.proxy(result)
 
 
+class FlatteningRepo(Repo):
+    """
+    Repo flattening the proxies it returns, see flatten().
+
+    All the items of a repo are wrapped by the same layers, so only the
+    outermost proxy class can differ between them and the chain is only
+    walked once per outermost class.
+    """
+
+    def __init__(self, base):
+        super(FlatteningRepo, self).__init__(base)
+        self._flat_classes = {}
+
+    def _flatten(self, item):
+        if item is None:
+            return item
+        outer = type(item)
+        flat_class = self._flat_classes.get(outer)
+        if flat_class is None:
+            flat_class = type(flatten(item))
+            self._flat_classes[outer] = flat_class
+        elif flat_class is not outer:
+            item.__class__ = flat_class
+        return item
+
+    def get(self, item_id):
+        return self._flatten(self.base.get(item_id))
+
+    def list(self, *args, **kwargs):
+        return [self._flatten(item)
+                for item in self.base.list(*args, **kwargs)]
+
+
 class ImageFactory(object):
     def __init__(self, base, proxy_class=None, proxy_kwargs=None):
         self.helper = Helper(proxy_class, proxy_kwargs)
@@ -128,6 +231,9 @@ class ImageMembershipFactory(object):
 
 
 class Image(object):
+
+    __slots__ = ('base', 'helper')
+
     def __init__(self, base, member_repo_proxy_class=None,
                  member_repo_proxy_kwargs=None):
         self.base = base
@@ -233,6 +339,12 @@ class MetadefNamespaceRepo(object):
         namespace_obj = self.base.get(namespace)
         return self.namespace_proxy_helper.proxy(namespace_obj)
 
+    def get_detail(self, namespace):
+        namespace_obj, objects, resource_types, properties = (
+            self.base.get_detail(namespace))
+        return (self.namespace_proxy_helper.proxy(namespace_obj),
+                objects, resource_types, properties)
+
     def add(self, namespace):
         self.base.add(self.namespace_proxy_helper.unproxy(namespace))
 
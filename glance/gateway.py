@@ -21,6 +21,7 @@ from glance.common import property_utils
 from glance.common import store_utils
 import glance.db
 import glance.domain
+import glance.domain.proxy
 import glance.location
 import glance.notifier
 import glance.quota
@@ -89,7 +90,7 @@ class Gateway(object):
             authorized_image_repo = authorization.ImageRepoProxy(
                 notifier_image_repo, context)
 
-        return authorized_image_repo
+        return glance.domain.proxy.FlatteningRepo(authorized_image_repo)
 
     def get_task_factory(self, context):
         task_factory = glance.domain.TaskFactory()
@@ -17,12 +17,15 @@
 LRU Cache for Image Data
 """
 
-import hashlib
+import contextlib
 
 from oslo.config import cfg
 
 from glance.common import exception
+from glance.common import hashing
 from glance.common import utils
+from glance.image_cache.drivers import base as driver_base
+from glance.image_cache import memory
 from glance.openstack.common import excutils
 from glance.openstack.common import gettextutils
 from glance.openstack.common import importutils
@@ -44,6 +47,42 @@ image_cache_opts = [
                       'cache without being accessed.')),
     cfg.StrOpt('image_cache_dir',
                help=_('Base directory that the Image Cache uses.')),
+    cfg.BoolOpt('image_cache_dedup', default=False,
+                help=_('Whether cached images with identical data share one '
+                       'copy of it on disk. Data is shared by the sha256 '
+                       'digest computed while it is written to the cache, '
+                       'and only once it has been verified against the '
+                       'checksum of the image.')),
+    cfg.IntOpt('image_cache_memory_size', default=0,
+               help=_('The maximum size in bytes of the image data each API '
+                      'worker keeps in memory, in addition to the image '
+                      'cache on disk, so that small images are served '
+                      'without touching the disk. 0 disables the memory '
+                      'tier.')),
+    cfg.IntOpt('image_cache_memory_max_image_size', default=32 * units.Mi,
+               help=_('The size in bytes of the largest image kept in the '
+                      'memory tier of the image cache.')),
+    cfg.IntOpt('image_cache_memory_hits_interval', default=60,
+               help=_('Number of seconds between writes of the hits served '
+                      'from the memory tier to the image cache on disk, '
+                      'which uses them to decide which images to prune.')),
+    cfg.BoolOpt('image_cache_preallocate', default=True,
+                help=_('Whether to reserve the disk space for an image '
+                       'file before writing it into the cache, when the '
+                       'size of the image is known, to avoid fragmenting '
+                       'the cache directory.')),
+    cfg.IntOpt('image_cache_write_dontneed_interval', default=0,
+               help=_('Number of bytes written into an image file of the '
+                      'cache after which they are flushed to disk and '
+                      'dropped from the page cache, so that caching large '
+                      'images does not evict other data from memory. 0 '
+                      'leaves the page cache to the kernel.')),
+    cfg.StrOpt('image_cache_read_advice', default='none',
+               choices=['none', 'sequential', 'willneed'],
+               help=_('Access pattern advised to the kernel when an image '
+                      'file is read from the cache. \'sequential\' '
+                      'enlarges read-ahead and \'willneed\' starts '
+                      'reading the requested range into memory at once.')),
 ]
 
 CONF = cfg.CONF
@@ -56,6 +95,10 @@ class ImageCache(object):
 
     def __init__(self):
         self.init_driver()
+        self.memory = memory.MemoryCache(
+            CONF.image_cache_memory_size,
+            CONF.image_cache_memory_max_image_size,
+            CONF.image_cache_memory_hits_interval)
 
     def init_driver(self):
         """
@@ -107,7 +150,7 @@ class ImageCache(object):
 
         :param image_id: Image ID
         """
-        return self.driver.is_cached(image_id)
+        return image_id in self.memory or self.driver.is_cached(image_id)
 
     def is_queued(self, image_id):
         """
@@ -142,7 +185,10 @@ class ImageCache(object):
         Removes all cached image files and any attributes about the images
         and returns the number of cached image files that were deleted.
         """
-        return self.driver.delete_all_cached_images()
+        self.memory.clear()
+        deleted = self.driver.delete_all_cached_images()
+        self.driver.delete_unreferenced_content()
+        return deleted
 
     def delete_cached_image(self, image_id):
         """
@@ -150,7 +196,9 @@ class ImageCache(object):
 
         :param image_id: Image ID
         """
+        self.memory.delete(image_id)
         self.driver.delete_cached_image(image_id)
+        self.driver.delete_unreferenced_content()
 
     def delete_all_queued_images(self):
         """
@@ -191,11 +239,18 @@ class ImageCache(object):
             image_id, size = entry
             LOG.debug("Pruning '%(image_id)s' to free %(size)d bytes",
                       {'image_id': image_id, 'size': size})
+            if CONF.image_cache_dedup:
+                # NOTE: data shared with other cached images is only freed
+                # with its last image, that is once just the link from
+                # the content store to it is left.
+                if self.driver.get_link_count(image_id) > 2:
+                    size = 0
             self.driver.delete_cached_image(image_id)
             total_bytes_pruned = total_bytes_pruned + size
             total_files_pruned = total_files_pruned + 1
             current_size = current_size - size
             entry = self.driver.get_least_recently_accessed()
+        self.driver.delete_unreferenced_content()
 
         LOG.debug("Pruning finished pruning. "
                   "Pruned %(total_files_pruned)d and "
@@ -210,6 +265,7 @@ class ImageCache(object):
         decides what that means...
         """
         self.driver.clean(stall_time)
+        self.driver.delete_unreferenced_content()
 
     def queue_image(self, image_id):
         """
@@ -222,7 +278,8 @@ class ImageCache(object):
         """
         return self.driver.queue_image(image_id)
 
-    def get_caching_iter(self, image_id, image_checksum, image_iter):
+    def get_caching_iter(self, image_id, image_checksum, image_iter,
+                         image_size=None):
         """
         Returns an iterator that caches the contents of an image
         while the image contents are read through the supplied
@@ -232,25 +289,34 @@ class ImageCache(object):
         :param image_checksum: checksum expected to be generated while
                                iterating over image data
         :param image_iter: Iterator that will read image contents
+        :param image_size: Size of the image data, if known
         """
         if not self.driver.is_cacheable(image_id):
             return image_iter
 
         LOG.debug("Tee'ing image '%s' into cache", image_id)
 
-        return self.cache_tee_iter(image_id, image_iter, image_checksum)
+        return self.cache_tee_iter(image_id, image_iter, image_checksum,
+                                   image_size)
 
-    def cache_tee_iter(self, image_id, image_iter, image_checksum):
+    def cache_tee_iter(self, image_id, image_iter, image_checksum,
+                       image_size=None):
         try:
-            current_checksum = hashlib.md5()
-
-            with self.driver.open_for_write(image_id) as cache_file:
+            algorithms = ['md5']
+            if CONF.image_cache_dedup and image_checksum:
+                algorithms.append(driver_base.CONTENT_DIGEST)
+            current_checksum = hashing.MultiHasher(algorithms)
+            yielder = utils.CooperativeYielder()
+
+            with self.driver.open_for_write(image_id,
+                                            image_size) as cache_file:
                 for chunk in image_iter:
                     try:
                         cache_file.write(chunk)
                     finally:
                         current_checksum.update(chunk)
                         yield chunk
+                        yielder.consumed(len(chunk))
                 cache_file.flush()
 
                 if (image_checksum and
@@ -259,6 +325,12 @@ class ImageCache(object):
                             "caching of image '%s'.") % image_id
                     raise exception.GlanceException(msg)
 
+            # NOTE: only data verified against the checksum of the image
+            # is shared, and it is shared by the digest computed here.
+            if driver_base.CONTENT_DIGEST in current_checksum.hashers:
+                digest = current_checksum.hexdigest(driver_base.CONTENT_DIGEST)
+                self.driver.link_content(image_id, digest)
+
         except exception.GlanceException as e:
             with excutils.save_and_reraise_exception():
                 # image_iter has given us bad, (size_checked_iter has found a
@@ -308,7 +380,7 @@ class ImageCache(object):
         return self.cache_image_iter(image_id,
                                      utils.chunkiter(image_file, CHUNKSIZE))
 
-    def open_for_read(self, image_id):
+    def open_for_read(self, image_id, offset=0, length=None):
         """
         Open and yield file for reading the image file for an image
         with supplied identifier.
@@ -317,8 +389,36 @@ class ImageCache(object):
               hit count will be incremented.
 
         :param image_id: Image ID
-        """
-        return self.driver.open_for_read(image_id)
+        :param offset: Byte offset in the image file to start reading at
+        :param length: Number of bytes to read, or None to read to the end
+                       of the image file
+        """
+        reader = self.memory.open_for_read(image_id, offset, length)
+        if reader is not None:
+            self._write_memory_hits()
+            return contextlib.closing(reader)
+        if (self.memory.enabled and
+                self.memory.accepts(self.driver.get_image_size(image_id))):
+            return self._open_for_read_into_memory(image_id, offset, length)
+        return self.driver.open_for_read(image_id, offset, length)
+
+    @contextlib.contextmanager
+    def _open_for_read_into_memory(self, image_id, offset, length):
+        with self.driver.open_for_read(image_id) as cache_file:
+            data = cache_file.read()
+        self.memory.add(image_id, data)
+        yield memory.MemoryReader(data, offset, length)
+
+    def _write_memory_hits(self, force=False):
+        """Record the hits served from memory in the disk tier."""
+        for image_id, hits, last_accessed in self.memory.pop_hits(force):
+            try:
+                self.driver.add_hits(image_id, hits, last_accessed)
+            except Exception as e:
+                LOG.warn(_LW("Failed to record hits of image "
+                             "'%(image_id)s': %(error)s") %
+                         {'image_id': image_id,
+                          'error': utils.exception_to_str(e)})
 
     def get_image_size(self, image_id):
         """
@@ -327,6 +427,8 @@ class ImageCache(object):
 
         :param image_id: Image ID
         """
+        if image_id in self.memory:
+            return self.memory.get_image_size(image_id)
         return self.driver.get_image_size(image_id)
 
     def get_queued_images(self):
@@ -17,8 +17,15 @@
 Base attribute driver class
 """
 
+from contextlib import contextmanager
+import ctypes
+import ctypes.util
+import errno
+import os
 import os.path
+import re
 
+from eventlet import tpool
 from oslo.config import cfg
 
 from glance.common import exception
@@ -29,6 +36,79 @@ LOG = logging.getLogger(__name__)
 
 CONF = cfg.CONF
 
+FALLOC_FL_KEEP_SIZE = 0x01
+POSIX_FADV_SEQUENTIAL = 2
+POSIX_FADV_WILLNEED = 3
+POSIX_FADV_DONTNEED = 4
+
+# Digest of the image data by which shared copies of cached image data
+# are stored
+CONTENT_DIGEST = 'sha256'
+CONTENT_DIGEST_RE = re.compile('^[0-9a-f]{64}$')
+
+READ_ADVICE = {
+    'sequential': POSIX_FADV_SEQUENTIAL,
+    'willneed': POSIX_FADV_WILLNEED,
+}
+
+_LIBC_FUNCTIONS = {}
+
+
+def _get_libc_function(name, argtypes):
+    """
+    Return the large file variant of a C library function, or None if the
+    C library does not provide it.
+
+    Python 2 has neither os.posix_fallocate nor os.posix_fadvise, so they
+    are called through ctypes.
+    """
+    if name not in _LIBC_FUNCTIONS:
+        func = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        except OSError:
+            libc = None
+        for symbol in (name + '64', name):
+            func = getattr(libc, symbol, None)
+            if func is not None:
+                func.argtypes = argtypes
+                break
+        _LIBC_FUNCTIONS[name] = func
+    return _LIBC_FUNCTIONS[name]
+
+
+def fallocate(fp, length):
+    """
+    Reserve disk space for `length` bytes of the file without changing its
+    size, so that writing it does not fragment it. Returns True if the
+    space was reserved, False if the platform or the filesystem does not
+    support it.
+    """
+    func = _get_libc_function('fallocate', [ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_int64, ctypes.c_int64])
+    if func is None or length <= 0:
+        return False
+    if func(fp.fileno(), FALLOC_FL_KEEP_SIZE, 0, length) != 0:
+        LOG.debug("Unable to preallocate %(length)d bytes for '%(name)s': "
+                  "%(error)s",
+                  {'length': length, 'name': fp.name,
+                   'error': os.strerror(ctypes.get_errno())})
+        return False
+    return True
+
+
+def fadvise(fp, offset, length, advice):
+    """
+    Tell the kernel how a range of the file is going to be accessed. A
+    length of 0 means up to the end of the file. This is only a hint, so
+    it is silently ignored where it is not supported.
+    """
+    func = _get_libc_function('posix_fadvise',
+                              [ctypes.c_int, ctypes.c_int64,
+                               ctypes.c_int64, ctypes.c_int])
+    if func is not None:
+        func(fp.fileno(), offset, length, advice)
+
 
 class Driver(object):
 
@@ -60,8 +140,10 @@ class Driver(object):
         self.incomplete_dir = os.path.join(self.base_dir, 'incomplete')
         self.invalid_dir = os.path.join(self.base_dir, 'invalid')
         self.queue_dir = os.path.join(self.base_dir, 'queue')
+        self.content_dir = os.path.join(self.base_dir, 'content')
 
-        dirs = [self.incomplete_dir, self.invalid_dir, self.queue_dir]
+        dirs = [self.incomplete_dir, self.invalid_dir, self.queue_dir,
+                self.content_dir]
 
         for path in dirs:
             utils.safe_mkdirs(path)
@@ -169,21 +251,70 @@ class Driver(object):
         """
         raise NotImplementedError
 
-    def open_for_write(self, image_id):
+    def open_for_write(self, image_id, image_size=None):
         """
         Open a file for writing the image file for an image
         with supplied identifier.
 
         :param image_id: Image ID
+        :param image_size: Expected size of the image file, if known
         """
         raise NotImplementedError
 
-    def open_for_read(self, image_id):
+    @contextmanager
+    def open_cache_file(self, path, image_size=None):
+        """
+        Open and yield a CacheFileWriter for writing a cached image file.
+
+        :param path: Path of the file to write
+        :param image_size: Expected size of the file, if known
+        """
+        with open(path, 'wb') as cache_file:
+            writer = CacheFileWriter(cache_file, image_size)
+            yield writer
+            writer.finish()
+
+    def open_for_read(self, image_id, offset=0, length=None):
         """
         Open and yield file for reading the image file for an image
         with supplied identifier.
 
         :param image_id: Image ID
+        :param offset: Byte offset in the image file to start reading at
+        :param length: Number of bytes to read, or None to read to the end
+                       of the image file
+        """
+        raise NotImplementedError
+
+    def open_image_file(self, image_id, offset=0, length=None):
+        """
+        Open the cached image file for an image with supplied identifier,
+        positioned at `offset` and returning at most `length` bytes.
+
+        :param image_id: Image ID
+        :param offset: Byte offset in the image file to start reading at
+        :param length: Number of bytes to read, or None to read to the end
+                       of the image file
+        """
+        path = self.get_image_filepath(image_id)
+        cache_file = open(path, 'rb')
+        advice = READ_ADVICE.get(CONF.image_cache_read_advice)
+        if advice is not None:
+            fadvise(cache_file, offset, length or 0, advice)
+        if offset:
+            cache_file.seek(offset)
+        if length is None:
+            return cache_file
+        return RangeReader(cache_file, length)
+
+    def add_hits(self, image_id, hits, last_accessed):
+        """
+        Record hits on an image which were served without reading its
+        image file, e.g. from the memory tier of the cache.
+
+        :param image_id: Image ID
+        :param hits: Number of hits
+        :param last_accessed: Time of the last hit
         """
         raise NotImplementedError
 
@@ -198,6 +329,96 @@ class Driver(object):
             return os.path.join(self.base_dir, str(image_id))
         return os.path.join(self.base_dir, cache_status, str(image_id))
 
+    def get_content_path(self, digest):
+        """
+        This crafts an absolute path to the shared copy of the cached
+        image data with a given digest
+
+        :param digest: CONTENT_DIGEST hex digest of the image data
+        :raises exception.Invalid if digest is not such a hex digest
+        """
+        if not CONTENT_DIGEST_RE.match(str(digest)):
+            msg = _("Invalid image cache content digest: %s") % digest
+            raise exception.Invalid(msg)
+        return os.path.join(self.content_dir, digest)
+
+    def link_content(self, image_id, digest):
+        """
+        Share the cached image file for an image with supplied identifier
+        with the other cached images whose data has the same digest.
+
+        If no data with that digest is cached yet, the image file becomes
+        the shared copy. Otherwise the image file is replaced by a hard
+        link to the shared copy. The cached image files of all the images
+        with the same data are then hard links to one file, so the number
+        of images referencing it is kept by the filesystem as the link
+        count.
+
+        The digest must have been computed from the data written to the
+        image file, never taken from image metadata.
+
+        :param image_id: Image ID
+        :param digest: CONTENT_DIGEST hex digest of the cached image data
+        """
+        content_path = self.get_content_path(digest)
+        image_path = self.get_image_filepath(image_id)
+        try:
+            os.link(image_path, content_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        incomplete_path = self.get_image_filepath(image_id, 'incomplete')
+        try:
+            os.link(content_path, incomplete_path)
+            os.rename(incomplete_path, image_path)
+        except OSError as e:
+            # NOTE: the shared copy may have just been deleted as
+            # unreferenced. The image file then keeps its own copy.
+            LOG.debug("Image '%(image_id)s' keeps its own copy of cached "
+                      "data with digest %(digest)s: %(error)s",
+                      {'image_id': image_id, 'digest': digest,
+                       'error': e})
+            if os.path.exists(incomplete_path):
+                os.unlink(incomplete_path)
+            return
+        LOG.debug("Image '%(image_id)s' shares cached data with digest "
+                  "%(digest)s", {'image_id': image_id, 'digest': digest})
+
+    def get_link_count(self, image_id):
+        """
+        Return the number of hard links to the image file for an image
+        with supplied identifier, 0 if it is not cached.
+
+        :param image_id: Image ID
+        """
+        try:
+            return os.stat(self.get_image_filepath(image_id)).st_nlink
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return 0
+
+    def delete_unreferenced_content(self):
+        """
+        Removes the shared copies of cached image data which no cached
+        image file links to any more, and returns the number removed.
+        """
+        deleted = 0
+        for fname in os.listdir(self.content_dir):
+            path = os.path.join(self.content_dir, fname)
+            try:
+                if os.stat(path).st_nlink <= 1:
+                    LOG.debug("Deleting unreferenced image cache data '%s'",
+                              path)
+                    os.unlink(path)
+                    deleted += 1
+            except OSError as e:
+                # Deleted concurrently, e.g. by another cache process
+                if e.errno != errno.ENOENT:
+                    raise
+        return deleted
+
     def get_image_size(self, image_id):
         """
         Return the size of the image file for an image with supplied
@@ -215,3 +436,82 @@ class Driver(object):
         into the queue.
         """
         raise NotImplementedError
+
+
+class RangeReader(object):
+    """
+    File-like wrapper which stops reading after a given number of bytes.
+    """
+
+    def __init__(self, fp, length):
+        """
+        :param fp: Underlying file object, positioned at the start of the
+                   range
+        :param length: Number of bytes in the range
+        """
+        self.fp = fp
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return ''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        result = self.fp.read(size)
+        self.remaining -= len(result)
+        return result
+
+    def close(self):
+        self.fp.close()
+
+
+class CacheFileWriter(object):
+    """
+    File-like wrapper for writing a cached image file.
+
+    The space for the file is reserved up front when its size is known,
+    and when `image_cache_write_dontneed_interval` is set the data written
+    is flushed to disk and dropped from the page cache every so often, so
+    that caching a large image does not evict the rest of the page cache.
+    """
+
+    def __init__(self, fp, image_size=None):
+        """
+        :param fp: Underlying file object, opened for writing
+        :param image_size: Expected size of the file, if known
+        """
+        self.fp = fp
+        self.written = 0
+        self.dropped = 0
+        self.interval = CONF.image_cache_write_dontneed_interval
+        self.preallocated = bool(image_size and
+                                 CONF.image_cache_preallocate and
+                                 fallocate(fp, image_size))
+
+    def write(self, data):
+        self.fp.write(data)
+        self.written += len(data)
+        if self.interval and self.written - self.dropped >= self.interval:
+            self._drop_written()
+
+    def flush(self):
+        self.fp.flush()
+
+    def _drop_written(self):
+        # Dirty pages are not dropped, so write them out first.
+        self.fp.flush()
+        tpool.execute(os.fdatasync, self.fp.fileno())
+        fadvise(self.fp, self.dropped, self.written - self.dropped,
+                POSIX_FADV_DONTNEED)
+        self.dropped = self.written
+
+    def finish(self):
+        """
+        Release any space reserved beyond the data written and drop the
+        rest of a large file from the page cache.
+        """
+        if self.preallocated:
+            self.fp.flush()
+            self.fp.truncate(self.written)
+        if self.dropped:
+            self._drop_written()
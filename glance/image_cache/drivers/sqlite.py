@@ -18,6 +18,7 @@ Cache driver that uses SQLite to store information about cached images
 """
 
 from __future__ import absolute_import
+from contextlib import closing
 from contextlib import contextmanager
 import os
 import stat
@@ -133,13 +134,16 @@ class Driver(base.Driver):
         """
         Returns the total size in bytes of the image cache.
         """
-        sizes = []
+        sizes = {}
         for path in self.get_cache_files(self.base_dir):
             if path == self.db_path:
                 continue
             file_info = os.stat(path)
-            sizes.append(file_info[stat.ST_SIZE])
-        return sum(sizes)
+            # NOTE: image files sharing deduplicated data are hard links to
+            # the same inode, which only takes up space once.
+            inode = (file_info[stat.ST_DEV], file_info[stat.ST_INO])
+            sizes[inode] = file_info[stat.ST_SIZE]
+        return sum(sizes.values())
 
     def get_hit_count(self, image_id):
         """
@@ -293,12 +297,13 @@ class Driver(base.Driver):
         return image_id, size
 
     @contextmanager
-    def open_for_write(self, image_id):
+    def open_for_write(self, image_id, image_size=None):
         """
         Open a file for writing the image file for an image
         with supplied identifier.
 
         :param image_id: Image ID
+        :param image_size: Expected size of the image file, if known
         """
         incomplete_path = self.get_image_filepath(image_id, 'incomplete')
 
@@ -342,7 +347,8 @@ class Driver(base.Driver):
                 db.commit()
 
         try:
-            with open(incomplete_path, 'wb') as cache_file:
+            with self.open_cache_file(incomplete_path,
+                                      image_size) as cache_file:
                 yield cache_file
         except Exception as e:
             with excutils.save_and_reraise_exception():
@@ -359,15 +365,18 @@ class Driver(base.Driver):
                 rollback('incomplete fetch')
 
     @contextmanager
-    def open_for_read(self, image_id):
+    def open_for_read(self, image_id, offset=0, length=None):
         """
         Open and yield file for reading the image file for an image
         with supplied identifier.
 
         :param image_id: Image ID
+        :param offset: Byte offset in the image file to start reading at
+        :param length: Number of bytes to read, or None to read to the end
+                       of the image file
         """
-        path = self.get_image_filepath(image_id)
-        with open(path, 'rb') as cache_file:
+        with closing(self.open_image_file(image_id, offset,
+                                          length)) as cache_file:
             yield cache_file
         now = time.time()
         with self.get_db() as db:
@@ -377,6 +386,22 @@ class Driver(base.Driver):
                        (now, image_id))
             db.commit()
 
+    def add_hits(self, image_id, hits, last_accessed):
+        """
+        Record hits on an image which were served without reading its
+        image file.
+
+        :param image_id: Image ID
+        :param hits: Number of hits
+        :param last_accessed: Time of the last hit
+        """
+        with self.get_db() as db:
+            db.execute("""UPDATE cached_images
+                       SET hits = hits + ?, last_accessed = ?
+                       WHERE image_id = ?""",
+                       (hits, last_accessed, image_id))
+            db.commit()
+
     @contextmanager
     def get_db(self):
         """
@@ -52,6 +52,7 @@ $image_cache_dir/
 """
 
 from __future__ import absolute_import
+from contextlib import closing
 from contextlib import contextmanager
 import errno
 import os
@@ -124,11 +125,14 @@ class Driver(base.Driver):
         """
         Returns the total size in bytes of the image cache.
         """
-        sizes = []
+        sizes = {}
         for path in get_all_regular_files(self.base_dir):
             file_info = os.stat(path)
-            sizes.append(file_info[stat.ST_SIZE])
-        return sum(sizes)
+            # NOTE: image files sharing deduplicated data are hard links to
+            # the same inode, which only takes up space once.
+            inode = (file_info[stat.ST_DEV], file_info[stat.ST_INO])
+            sizes[inode] = file_info[stat.ST_SIZE]
+        return sum(sizes.values())
 
     def get_hit_count(self, image_id):
         """
@@ -258,12 +262,13 @@ class Driver(base.Driver):
         return os.path.basename(stats[0][2]), stats[0][1]
 
     @contextmanager
-    def open_for_write(self, image_id):
+    def open_for_write(self, image_id, image_size=None):
         """
         Open a file for writing the image file for an image
         with supplied identifier.
 
         :param image_id: Image ID
+        :param image_size: Expected size of the image file, if known
         """
         incomplete_path = self.get_image_filepath(image_id, 'incomplete')
 
@@ -299,7 +304,8 @@ class Driver(base.Driver):
             os.rename(incomplete_path, invalid_path)
 
         try:
-            with open(incomplete_path, 'wb') as cache_file:
+            with self.open_cache_file(incomplete_path,
+                                      image_size) as cache_file:
                 yield cache_file
         except Exception as e:
             with excutils.save_and_reraise_exception():
@@ -316,19 +322,39 @@ class Driver(base.Driver):
                 rollback('incomplete fetch')
 
     @contextmanager
-    def open_for_read(self, image_id):
+    def open_for_read(self, image_id, offset=0, length=None):
         """
         Open and yield file for reading the image file for an image
         with supplied identifier.
 
         :param image_id: Image ID
+        :param offset: Byte offset in the image file to start reading at
+        :param length: Number of bytes to read, or None to read to the end
+                       of the image file
         """
-        path = self.get_image_filepath(image_id)
-        with open(path, 'rb') as cache_file:
+        with closing(self.open_image_file(image_id, offset,
+                                          length)) as cache_file:
             yield cache_file
         path = self.get_image_filepath(image_id)
         inc_xattr(path, 'hits', 1)
 
+    def add_hits(self, image_id, hits, last_accessed):
+        """
+        Record hits on an image which were served without reading its
+        image file.
+
+        :param image_id: Image ID
+        :param hits: Number of hits
+        :param last_accessed: Time of the last hit
+        """
+        path = self.get_image_filepath(image_id)
+        if not os.path.exists(path):
+            return
+        inc_xattr(path, 'hits', hits)
+        # NOTE: this driver finds the least recently accessed image by the
+        # access time of its image file.
+        os.utime(path, (last_accessed, os.stat(path).st_mtime))
+
     def queue_image(self, image_id):
         """
         This adds a image to be cache to the queue.
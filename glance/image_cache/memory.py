@@ -0,0 +1,130 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+In-memory LRU tier of the image cache for small images
+"""
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+import time
+
+
+class MemoryReader(object):
+    """File-like reader over image data held in memory."""
+
+    def __init__(self, data, offset=0, length=None):
+        self.data = data
+        self.pos = offset
+        self.end = len(data) if length is None else offset + length
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.end - self.pos
+        start = self.pos
+        self.pos = min(self.pos + size, self.end)
+        return self.data[start:self.pos]
+
+    def close(self):
+        pass
+
+
+class MemoryCache(object):
+    """
+    Bounded LRU of image data held in memory.
+
+    Hits are counted here and handed back in batches by pop_hits, so that
+    serving an image from memory doesn't touch the disk tier.
+    """
+
+    def __init__(self, max_size, max_image_size, hits_interval):
+        """
+        :param max_size: Maximum number of bytes of image data to hold
+        :param max_image_size: Size in bytes of the largest image to hold
+        :param hits_interval: Seconds between batches of hits handed back
+        """
+        self.max_size = max_size
+        self.max_image_size = min(max_image_size, max_size)
+        self.hits_interval = hits_interval
+        self.size = 0
+        self._images = OrderedDict()
+        self._hits = {}
+        self._hits_popped_at = time.time()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def accepts(self, size):
+        """Return True if an image of the given size can be held."""
+        return 0 < size <= self.max_image_size
+
+    def __contains__(self, image_id):
+        return image_id in self._images
+
+    def get_image_size(self, image_id):
+        return len(self._images[image_id])
+
+    def add(self, image_id, data):
+        """Hold the data of an image, evicting least recently used ones."""
+        if not self.accepts(len(data)):
+            return
+        self.delete(image_id)
+        while self.size + len(data) > self.max_size:
+            evicted_id, evicted = self._images.popitem(last=False)
+            self.size -= len(evicted)
+        self._images[image_id] = data
+        self.size += len(data)
+
+    def delete(self, image_id):
+        data = self._images.pop(image_id, None)
+        if data is not None:
+            self.size -= len(data)
+
+    def clear(self):
+        self._images.clear()
+        self.size = 0
+
+    def open_for_read(self, image_id, offset=0, length=None):
+        """
+        Return a reader over the data of an image, counting a hit, or None
+        if the image isn't held.
+        """
+        data = self._images.pop(image_id, None)
+        if data is None:
+            return None
+        # Re-insert to mark the image as most recently used
+        self._images[image_id] = data
+        now = time.time()
+        hits = self._hits.get(image_id, (0, now))[0]
+        self._hits[image_id] = (hits + 1, now)
+        return MemoryReader(data, offset, length)
+
+    def pop_hits(self, force=False):
+        """
+        Return the hits counted since the last call as a list of
+        (image_id, hits, last_accessed) tuples, or an empty list if
+        hits_interval hasn't passed yet and force isn't set.
+        """
+        now = time.time()
+        if not force and now - self._hits_popped_at < self.hits_interval:
+            return []
+        self._hits_popped_at = now
+        hits = [(image_id, count, last_accessed)
+                for image_id, (count, last_accessed) in self._hits.items()]
+        self._hits.clear()
+        return hits
@@ -17,13 +17,16 @@
 Prefetches images into the Image Cache
 """
 
-import eventlet
+import time
 
+import eventlet
 import glance_store
 
 from glance.common import exception
+from glance.common import location_strategy
 from glance import context
 from glance.image_cache import base
+from glance.openstack.common import excutils
 from glance.openstack.common import gettextutils
 import glance.openstack.common.log as logging
 import glance.registry.client.v1.api as registry
@@ -55,11 +58,19 @@ class Prefetcher(base.CacheApp):
             return False
 
         location = image_meta['location']
-        image_data, image_size = glance_store.get_from_backend(location,
-                                                               context=ctx)
+        started = time.time()
+        try:
+            image_data, image_size = glance_store.get_from_backend(
+                location, context=ctx)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                location_strategy.report_failure(location)
+        image_data = location_strategy.measure_transfer(location, image_data,
+                                                        started)
         LOG.debug("Caching image '%s'", image_id)
         cache_tee_iter = self.cache.cache_tee_iter(image_id, image_data,
-                                                   image_meta['checksum'])
+                                                   image_meta['checksum'],
+                                                   image_size)
         # Image is tee'd into cache and checksum verified
         # as we iterate
         list(cache_tee_iter)
@@ -0,0 +1,115 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Consistent hash ring spreading the image cache over several API nodes
+"""
+
+import bisect
+import hashlib
+
+from oslo.config import cfg
+
+ring_opts = [
+    cfg.ListOpt('image_cache_peers', default=[],
+                help=_('URLs of the private endpoints of all the API nodes '
+                       'whose image caches form a cluster, including this '
+                       'node. All nodes must list the same peers. Each image '
+                       'is cached only by the peer it hashes to, and the '
+                       'other peers fetch it from there. An empty list '
+                       'disables cache clustering.')),
+    cfg.StrOpt('image_cache_local_peer',
+               help=_('URL of this node in the image_cache_peers list.')),
+    cfg.IntOpt('image_cache_ring_vnodes', default=64,
+               help=_('Number of points each peer is given on the hash '
+                      'ring. More points spread the images more evenly.')),
+    cfg.IntOpt('image_cache_peer_timeout', default=10,
+               help=_('Timeout in seconds for requests to another peer of '
+                      'the image cache cluster.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(ring_opts)
+
+_RING = None
+
+
+def _hash(key):
+    return int(hashlib.md5(key).hexdigest()[:8], 16)
+
+
+def _normalize(peer):
+    return peer.strip().rstrip('/')
+
+
+class HashRing(object):
+    """Map keys onto a set of peers with consistent hashing."""
+
+    def __init__(self, peers, vnodes):
+        """
+        :param peers: List of peer URLs
+        :param vnodes: Number of points on the ring for each peer
+        """
+        self.peers = [_normalize(peer) for peer in peers if peer.strip()]
+        self.vnodes = vnodes
+        points = sorted((_hash('%s-%d' % (peer, i)), peer)
+                        for peer in self.peers
+                        for i in range(vnodes))
+        self._keys = [key for key, peer in points]
+        self._points = [peer for key, peer in points]
+
+    def get_peer(self, key):
+        """Return the peer owning a key, or None if the ring is empty."""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._points[index]
+
+
+def get_ring():
+    """Return the hash ring for the configured peers."""
+    global _RING
+    peers = [_normalize(peer) for peer in CONF.image_cache_peers
+             if peer.strip()]
+    vnodes = CONF.image_cache_ring_vnodes
+    if _RING is None or _RING.peers != peers or _RING.vnodes != vnodes:
+        _RING = HashRing(peers, vnodes)
+    return _RING
+
+
+def get_local_peer():
+    if CONF.image_cache_local_peer:
+        return _normalize(CONF.image_cache_local_peer)
+
+
+def get_peer(image_id):
+    """
+    Return the URL of the peer which caches an image, or None if it is
+    cached by this node.
+
+    :param image_id: Image ID
+    """
+    peer = get_ring().get_peer(image_id)
+    if peer is None or peer == get_local_peer():
+        return None
+    return peer
+
+
+def to_dict():
+    """Describe the ring for the cache management API."""
+    ring = get_ring()
+    return {'peers': ring.peers,
+            'local_peer': get_local_peer(),
+            'vnodes': ring.vnodes}
@@ -15,11 +15,16 @@
 
 import collections
 import copy
+import time
 
+import eventlet
 import glance_store as store
 from oslo.config import cfg
+import six.moves.urllib.parse as urlparse
 
 from glance.common import exception
+from glance.common import hashing
+from glance.common import location_strategy
 from glance.common import utils
 import glance.domain.proxy
 from glance.openstack.common import excutils
@@ -28,8 +33,35 @@ import glance.openstack.common.log as logging
 
 
 _LE = gettextutils._LE
+_LW = gettextutils._LW
+
+location_opts = [
+    cfg.IntOpt('download_resume_retries', default=0,
+               help=_('Number of times a download which fails part way '
+                      'through is resumed from the same or the next image '
+                      'location before the error is returned to the '
+                      'client. 0 disables resuming.')),
+    cfg.ListOpt('download_resume_offset_schemes', default=['file'],
+                help=_('Location URI schemes whose stores can start reading '
+                       'image data at an offset. Downloads from other '
+                       'stores are resumed by reading the image again from '
+                       'the start and skipping the data already sent, and '
+                       'are never striped.')),
+    cfg.IntOpt('download_stripe_size', default=0,
+               help=_('Size in bytes of the stripes an image download is '
+                      'split into. Stripes are read concurrently from the '
+                      'image locations whose stores can read at an offset '
+                      'and are sent to the client in order. 0 disables '
+                      'striped downloads.')),
+    cfg.IntOpt('download_stripe_workers', default=4,
+               help=_('Maximum number of stripes of a striped download '
+                      'which are read at the same time. Each stripe being '
+                      'read is buffered in memory, so a download buffers '
+                      'at most this many stripes.')),
+]
 
 CONF = cfg.CONF
+CONF.register_opts(location_opts)
 LOG = logging.getLogger(__name__)
 
 
@@ -327,6 +359,8 @@ def _locations_proxy(target, attr):
 
 class ImageProxy(glance.domain.proxy.Image):
 
+    __slots__ = ('image', 'context', 'store_api', 'store_utils')
+
     locations = _locations_proxy('image', 'locations')
 
     def __init__(self, image, context, store_api, store_utils):
@@ -355,42 +389,216 @@ class ImageProxy(glance.domain.proxy.Image):
     def set_data(self, data, size=None):
         if size is None:
             size = 0  # NOTE(markwash): zero -> unknown size
-        location, size, checksum, loc_meta = self.store_api.add_to_backend(
-            CONF,
-            self.image.image_id,
-            utils.LimitingReader(utils.CooperativeReader(data),
-                                 CONF.image_size_cap),
-            size,
-            context=self.context)
+        hasher = hashing.get_upload_hasher()
+        if hasher is not None:
+            data = hashing.HashingReader(data, hasher)
+        with utils.upload_reader(data) as reader:
+            location, size, checksum, loc_meta = (
+                self.store_api.add_to_backend(
+                    CONF,
+                    self.image.image_id,
+                    utils.LimitingReader(reader, CONF.image_size_cap),
+                    size,
+                    context=self.context))
         self.image.locations = [{'url': location, 'metadata': loc_meta,
                                  'status': 'active'}]
         self.image.size = size
         self.image.checksum = checksum
+        hash_properties = hashing.get_hash_properties(hasher)
+        if hash_properties:
+            self.image.extra_properties.update(hash_properties)
         self.image.status = 'active'
 
-    def get_data(self, offset=0, chunk_size=None):
-        if not self.image.locations:
-            raise store.NotFound(_("No image data could be found"))
+    def _open_location(self, location, offset, chunk_size):
+        started = time.time()
+        try:
+            data, size = self.store_api.get_from_backend(
+                location['url'],
+                offset=offset,
+                chunk_size=chunk_size,
+                context=self.context)
+            return location_strategy.measure_transfer(location['url'], data,
+                                                      started)
+        except Exception as e:
+            with excutils.save_and_reraise_exception():
+                location_strategy.report_failure(location['url'])
+                LOG.warn(_('Get image %(id)s data failed: '
+                           '%(err)s.') % {'id': self.image.image_id,
+                                          'err': utils.exception_to_str(e)})
+
+    def _get_location_data(self, offset, chunk_size):
+        """Return the first location which can be read and its data."""
         err = None
         for loc in self.image.locations:
             try:
-                data, size = self.store_api.get_from_backend(
-                    loc['url'],
-                    offset=offset,
-                    chunk_size=chunk_size,
-                    context=self.context)
-
-                return data
+                return loc, self._open_location(loc, offset, chunk_size)
             except Exception as e:
-                LOG.warn(_('Get image %(id)s data failed: '
-                           '%(err)s.') % {'id': self.image.image_id,
-                                          'err': utils.exception_to_str(e)})
                 err = e
         # tried all locations
         LOG.error(_LE('Glance tried all active locations to get data for '
                       'image %s but all have failed.') % self.image.image_id)
         raise err
 
+    def _resume_location_data(self, location, offset, chunk_size, sent):
+        """
+        Reopen image data after reading it failed part way through.
+
+        The failed location is retried first, followed by the remaining
+        locations in order. Stores which cannot read from an offset are
+        read from the original offset with the data already sent skipped.
+
+        :param location: the location whose data could not be read
+        :param offset: the offset the download started from
+        :param chunk_size: the amount of data requested, or None
+        :param sent: the number of bytes already sent to the client
+        """
+        locations = [location] + [loc for loc in self.image.locations
+                                  if loc is not location]
+        err = None
+        for loc in locations:
+            try:
+                if _is_seekable(loc):
+                    remaining = chunk_size - sent if chunk_size else None
+                    data = self._open_location(loc, offset + sent,
+                                               remaining)
+                else:
+                    data = _skip_bytes(
+                        self._open_location(loc, offset, chunk_size), sent)
+                return loc, data
+            except Exception as e:
+                err = e
+        raise err
+
+    def _resuming_iter(self, location, data, offset, chunk_size):
+        """Yield image data, resuming from another read if one fails."""
+        retries = CONF.download_resume_retries
+        sent = 0
+        while True:
+            try:
+                for chunk in data:
+                    sent += len(chunk)
+                    yield chunk
+                return
+            except Exception as e:
+                if chunk_size and sent >= chunk_size:
+                    return
+                if retries <= 0:
+                    raise
+                retries -= 1
+                LOG.warn(_LW('Reading data for image %(id)s failed after '
+                             '%(sent)d bytes, resuming: %(err)s') %
+                         {'id': self.image.image_id, 'sent': sent,
+                          'err': utils.exception_to_str(e)})
+                location, data = self._resume_location_data(
+                    location, offset, chunk_size, sent)
+
+    def _get_striped_data(self, offset, chunk_size):
+        """
+        Return an iterator reading the requested image data in stripes, or
+        None if the download can not be striped.
+        """
+        stripe_size = CONF.download_stripe_size
+        if stripe_size <= 0 or not self.image.size:
+            return None
+        end = self.image.size
+        if chunk_size is not None:
+            end = min(offset + chunk_size, end)
+        if end - offset <= stripe_size:
+            return None
+        locations = [loc for loc in self.image.locations
+                     if _is_seekable(loc)]
+        if not locations:
+            return None
+        stripes = [(start, min(stripe_size, end - start))
+                   for start in xrange(offset, end, stripe_size)]
+        return self._striped_iter(locations, stripes)
+
+    def _read_stripe(self, locations, index, offset, length):
+        """
+        Read one stripe of image data into memory.
+
+        The stripe is read from locations[index], falling back to the other
+        locations in turn if that fails.
+        """
+        err = None
+        for loc in locations[index:] + locations[:index]:
+            try:
+                chunks = []
+                remaining = length
+                for chunk in self._open_location(loc, offset, length):
+                    chunks.append(chunk[:remaining])
+                    remaining -= len(chunks[-1])
+                    if remaining <= 0:
+                        return chunks
+                raise exception.GlanceException(
+                    _('Stripe at offset %(offset)d of image %(id)s is '
+                      '%(missing)d bytes short') %
+                    {'offset': offset, 'id': self.image.image_id,
+                     'missing': remaining})
+            except Exception as e:
+                LOG.warn(_LW('Reading stripe at offset %(offset)d of image '
+                             '%(id)s failed: %(err)s') %
+                         {'offset': offset, 'id': self.image.image_id,
+                          'err': utils.exception_to_str(e)})
+                err = e
+        raise err
+
+    def _striped_iter(self, locations, stripes):
+        """
+        Yield image data read concurrently in stripes.
+
+        Stripes are assigned to the locations in turn and at most
+        download_stripe_workers of them are in flight or buffered at once.
+        """
+        pending = collections.deque()
+        stripes = iter(enumerate(stripes))
+
+        def read_next_stripe():
+            for i, (offset, length) in stripes:
+                pending.append(eventlet.spawn(self._read_stripe, locations,
+                                              i % len(locations), offset,
+                                              length))
+                return
+
+        for i in xrange(max(CONF.download_stripe_workers, 1)):
+            read_next_stripe()
+        try:
+            while pending:
+                chunks = pending.popleft().wait()
+                read_next_stripe()
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            for reader in pending:
+                reader.kill()
+
+    def get_data(self, offset=0, chunk_size=None):
+        if not self.image.locations:
+            raise store.NotFound(_("No image data could be found"))
+        data = self._get_striped_data(offset, chunk_size)
+        if data is not None:
+            return data
+        location, data = self._get_location_data(offset, chunk_size)
+        if CONF.download_resume_retries <= 0:
+            return data
+        return self._resuming_iter(location, data, offset, chunk_size)
+
+
+def _is_seekable(location):
+    """Return True if the store of a location can read at an offset."""
+    scheme = urlparse.urlparse(location['url']).scheme
+    return scheme in CONF.download_resume_offset_schemes
+
+
+def _skip_bytes(data, count):
+    """Yield image data, dropping the first count bytes."""
+    for chunk in data:
+        if count >= len(chunk):
+            count -= len(chunk)
+            continue
+        yield chunk[count:]
+        count = 0
+
 
 class ImageMemberRepoProxy(glance.domain.proxy.Repo):
     def __init__(self, repo, image, context, store_api):
@@ -14,6 +14,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import atexit
+import errno
+import os
+
+import eventlet
+from eventlet import queue
 import glance_store
 from oslo.config import cfg
 from oslo import messaging
@@ -23,12 +29,37 @@ from glance.common import exception
 from glance.common import utils
 import glance.domain.proxy
 from glance.openstack.common import excutils
+from glance.openstack.common import gettextutils
+from glance.openstack.common import jsonutils
 import glance.openstack.common.log as logging
 from glance.openstack.common import timeutils
 
+_LE = gettextutils._LE
+_LW = gettextutils._LW
+
 notifier_opts = [
     cfg.StrOpt('default_publisher_id', default="image.localhost",
                help='Default publisher_id for outgoing notifications.'),
+    cfg.IntOpt('notification_queue_size', default=0,
+               help=_('Maximum number of notifications queued in memory '
+                      'for a background green thread to send, so that '
+                      'requests do not wait on the message bus. 0 sends '
+                      'notifications synchronously.')),
+    cfg.IntOpt('notification_batch_size', default=100,
+               help=_('Maximum number of queued notifications sent in one '
+                      'go by the background sender before it yields to '
+                      'other green threads.')),
+    cfg.StrOpt('notification_overflow_policy', default='drop',
+               choices=['drop', 'block', 'spill'],
+               help=_('What to do with a notification when the queue is '
+                      'full: \'drop\' it, \'block\' the request until the '
+                      'queue has room, or \'spill\' it to a file in '
+                      'notification_spill_dir from which it is sent once '
+                      'the queue has drained.')),
+    cfg.StrOpt('notification_spill_dir',
+               help=_('Directory holding the notifications spilled by the '
+                      '\'spill\' overflow policy. Notifications left there '
+                      'by a worker which exited are sent by the next one.')),
 ]
 
 CONF = cfg.CONF
@@ -43,27 +74,195 @@ _ALIASES = {
 }
 
 
+_TRANSPORT = None
+_NOTIFIER = None
+_SENDER = None
+
+SPILL_FILE_PREFIX = 'notifications.'
+
+
 def get_transport():
-    return messaging.get_transport(CONF, aliases=_ALIASES)
+    """Return the transport shared by everything in the process."""
+    global _TRANSPORT
+    if _TRANSPORT is None:
+        _TRANSPORT = messaging.get_transport(CONF, aliases=_ALIASES)
+    return _TRANSPORT
+
+
+def _get_messaging_notifier():
+    global _NOTIFIER
+    if _NOTIFIER is None:
+        _NOTIFIER = messaging.Notifier(
+            get_transport(), publisher_id=CONF.default_publisher_id)
+    return _NOTIFIER
+
+
+def get_sender():
+    """
+    Return the NotificationSender of the current process, creating it in
+    a worker forked after its parent created one.
+    """
+    global _SENDER
+    if _SENDER is None or _SENDER.pid != os.getpid():
+        _SENDER = NotificationSender(_get_messaging_notifier(),
+                                     CONF.notification_queue_size)
+    return _SENDER
 
 
 class Notifier(object):
     """Uses a notification strategy to send out messages about events."""
 
     def __init__(self):
-        publisher_id = CONF.default_publisher_id
         self._transport = get_transport()
-        self._notifier = messaging.Notifier(self._transport,
-                                            publisher_id=publisher_id)
+        self._notifier = _get_messaging_notifier()
+
+    def _notify(self, priority, event_type, payload):
+        if CONF.notification_queue_size:
+            get_sender().put(priority, event_type, payload)
+        else:
+            getattr(self._notifier, priority)({}, event_type, payload)
 
     def warn(self, event_type, payload):
-        self._notifier.warn({}, event_type, payload)
+        self._notify('warn', event_type, payload)
 
     def info(self, event_type, payload):
-        self._notifier.info({}, event_type, payload)
+        self._notify('info', event_type, payload)
 
     def error(self, event_type, payload):
-        self._notifier.error({}, event_type, payload)
+        self._notify('error', event_type, payload)
+
+
+class NotificationSender(object):
+    """
+    Sends notifications from a bounded in-memory queue in a background
+    green thread.
+
+    The sender drains up to notification_batch_size notifications at a
+    time. What happens to notifications which do not fit in the queue is
+    decided by notification_overflow_policy, and the counts of
+    notifications queued, sent, dropped, spilled and failed are kept in
+    `stats`.
+    """
+
+    def __init__(self, notifier, queue_size):
+        """
+        :param notifier: oslo.messaging Notifier to send notifications with
+        :param queue_size: maximum number of notifications queued
+        """
+        self.notifier = notifier
+        self.queue = queue.LightQueue(queue_size)
+        self.pid = os.getpid()
+        self.thread = None
+        self.overflowing = False
+        self.stats = {'queued': 0, 'sent': 0, 'dropped': 0, 'spilled': 0,
+                      'failed': 0}
+        atexit.register(self.flush)
+
+    def put(self, priority, event_type, payload):
+        notification = (priority, event_type, payload)
+        if self.thread is None:
+            self.thread = eventlet.spawn(self._run)
+        try:
+            self.queue.put_nowait(notification)
+        except queue.Full:
+            policy = CONF.notification_overflow_policy
+            if policy == 'block':
+                self.queue.put(notification)
+            elif policy == 'spill' and self._spill(notification):
+                self.stats['spilled'] += 1
+                return
+            else:
+                self.stats['dropped'] += 1
+                if not self.overflowing:
+                    self.overflowing = True
+                    LOG.warn(_LW("Notification queue is full, dropping "
+                                 "notifications. Counts so far: %s") %
+                             self.stats)
+                return
+        self.stats['queued'] += 1
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < CONF.notification_batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for notification in batch:
+                self._send(notification)
+            if self.queue.empty():
+                self.overflowing = False
+                self._send_spilled()
+
+    def _send(self, notification):
+        priority, event_type, payload = notification
+        try:
+            getattr(self.notifier, priority)({}, event_type, payload)
+            self.stats['sent'] += 1
+        except Exception:
+            self.stats['failed'] += 1
+            LOG.exception(_LE("Failed to send %s notification") % event_type)
+
+    def flush(self):
+        """Send the notifications still queued, e.g. at exit."""
+        if self.pid != os.getpid():
+            return
+        while True:
+            try:
+                self._send(self.queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _get_spill_path(self):
+        return os.path.join(CONF.notification_spill_dir,
+                            SPILL_FILE_PREFIX + str(self.pid))
+
+    def _spill(self, notification):
+        if not CONF.notification_spill_dir:
+            return False
+        try:
+            with open(self._get_spill_path(), 'a') as spill_file:
+                spill_file.write(jsonutils.dumps(notification) + '\n')
+        except (IOError, OSError) as e:
+            LOG.error(_LE("Unable to spill notification: %s") %
+                      utils.exception_to_str(e))
+            return False
+        return True
+
+    def _send_spilled(self):
+        """
+        Send the notifications spilled by this process, or left behind by
+        processes which have exited.
+        """
+        spill_dir = CONF.notification_spill_dir
+        if not spill_dir or not os.path.isdir(spill_dir):
+            return
+        for fname in sorted(os.listdir(spill_dir)):
+            if not fname.startswith(SPILL_FILE_PREFIX):
+                continue
+            pid = fname[len(SPILL_FILE_PREFIX):]
+            if pid.isdigit() and int(pid) != self.pid and _is_running(pid):
+                continue
+            # Renaming claims the file, so that nothing is sent twice.
+            sending_path = os.path.join(spill_dir,
+                                        'sending.%d.%s' % (self.pid, fname))
+            try:
+                os.rename(os.path.join(spill_dir, fname), sending_path)
+            except OSError:
+                continue
+            with open(sending_path) as spill_file:
+                for line in spill_file:
+                    self._send(tuple(jsonutils.loads(line)))
+            os.unlink(sending_path)
+
+
+def _is_running(pid):
+    try:
+        os.kill(int(pid), 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
 
 
 def format_image_notification(image):
@@ -150,6 +349,8 @@ class ImageFactoryProxy(glance.domain.proxy.ImageFactory):
 
 class ImageProxy(glance.domain.proxy.Image):
 
+    __slots__ = ('image', 'context', 'notifier')
+
     def __init__(self, image, context, notifier):
         self.image = image
         self.context = context
@@ -277,6 +277,8 @@ class QuotaImageLocationsProxy(object):
 
 class ImageProxy(glance.domain.proxy.Image):
 
+    __slots__ = ('image', 'context', 'db_api', 'store_utils', 'orig_props')
+
     def __init__(self, image, context, db_api, store_utils):
         self.image = image
         self.context = context
@@ -50,6 +50,6 @@ class Controller(rpc.Controller):
 
 def create_resource():
     """Images resource factory method."""
-    deserializer = rpc.RPCJSONDeserializer()
-    serializer = rpc.RPCJSONSerializer()
+    deserializer = rpc.RPCDeserializer()
+    serializer = rpc.RPCSerializer()
     return wsgi.Resource(Controller(), deserializer, serializer)
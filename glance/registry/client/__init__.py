@@ -36,6 +36,12 @@ registry_client_opts = [
                help=_('The period of time, in seconds, that the API server '
                       'will wait for a registry request to complete. A '
                       'value of 0 implies no timeout.')),
+    cfg.BoolOpt('registry_client_batch_requests', default=False,
+                help=_('Send the registry calls that make up a single image '
+                       'operation, such as fetching an image and its tags, '
+                       'in one RPC request. All registry servers must '
+                       'support dependent RPC commands before this is '
+                       'enabled.')),
 ]
 
 registry_client_ctx_opts = [
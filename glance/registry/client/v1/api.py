@@ -17,7 +17,9 @@
 Registry's Client API
 """
 
+import copy
 import os
+import time
 
 from oslo.config import cfg
 
@@ -41,8 +43,20 @@ registry_client_ctx_opts = [
                        "auth_token middleware.")),
 ]
 
+registry_client_cache_opts = [
+    cfg.IntOpt('image_metadata_cache_ttl', default=0,
+               help=_('Number of seconds for which image metadata fetched '
+                      'from the registry is reused by later requests of '
+                      'the same tenant to this API worker. Changes made '
+                      'through this worker are seen at once, changes made '
+                      'elsewhere after at most this long. 0 disables the '
+                      'cache; image metadata is then only reused within a '
+                      'request.')),
+]
+
 CONF = cfg.CONF
 CONF.register_opts(registry_client_ctx_opts)
+CONF.register_opts(registry_client_cache_opts)
 _registry_client = 'glance.registry.client'
 CONF.import_opt('registry_client_protocol', _registry_client)
 CONF.import_opt('registry_client_key_file', _registry_client)
@@ -66,6 +80,11 @@ _CLIENT_KWARGS = {}
 # AES key used to encrypt 'location' metadata
 _METADATA_ENCRYPTION_KEY = None
 
+# Image metadata shared by the requests of a worker for
+# image_metadata_cache_ttl seconds: {image_id: {identity: (expiry, meta)}}
+_METADATA_CACHE = {}
+_METADATA_CACHE_MAX_IMAGES = 10000
+
 
 def configure_registry_client():
     """
@@ -150,34 +169,119 @@ def get_images_detail(context, **kwargs):
     return c.get_images_detailed(**kwargs)
 
 
+def _get_request_cache(context):
+    """
+    Return the identity map of the registry lookups made while handling
+    the request of a context, or None if the context does not keep one.
+    """
+    return getattr(context, 'registry_cache', None)
+
+
+def _get_cache_identity(context):
+    # The metadata returned by the registry depends on what the
+    # requester may see.
+    return (context.owner, context.is_admin, context.show_deleted)
+
+
+def _get_shared_metadata(context, image_id):
+    entry = _METADATA_CACHE.get(image_id, {}).get(
+        _get_cache_identity(context))
+    if entry is not None and entry[0] > time.time():
+        return copy.deepcopy(entry[1])
+    return None
+
+
+def _set_shared_metadata(context, image_id, image_meta):
+    if len(_METADATA_CACHE) >= _METADATA_CACHE_MAX_IMAGES:
+        _METADATA_CACHE.clear()
+    expiry = time.time() + CONF.image_metadata_cache_ttl
+    _METADATA_CACHE.setdefault(image_id, {})[
+        _get_cache_identity(context)] = (expiry, copy.deepcopy(image_meta))
+
+
+def _cache_image(context, image_id, image_meta):
+    """
+    Record the current metadata of an image for the rest of the request
+    and, as it may have changed, forget it for other requests.
+    """
+    _METADATA_CACHE.pop(image_id, None)
+    request_cache = _get_request_cache(context)
+    if request_cache is not None:
+        request_cache.pop(('members', image_id), None)
+        if image_meta is None:
+            request_cache.pop(('image', image_id), None)
+        else:
+            request_cache[('image', image_id)] = copy.deepcopy(image_meta)
+
+
+def _forget_image(context, image_id):
+    _cache_image(context, image_id, None)
+
+
 def get_image_metadata(context, image_id):
-    c = get_registry_client(context)
-    return c.get_image(image_id)
+    request_cache = _get_request_cache(context)
+    if request_cache is not None:
+        image_meta = request_cache.get(('image', image_id))
+        if image_meta is not None:
+            return copy.deepcopy(image_meta)
+
+    image_meta = None
+    if request_cache is not None and CONF.image_metadata_cache_ttl:
+        image_meta = _get_shared_metadata(context, image_id)
+    if image_meta is None:
+        c = get_registry_client(context)
+        image_meta = c.get_image(image_id)
+        if request_cache is not None and CONF.image_metadata_cache_ttl:
+            _set_shared_metadata(context, image_id, image_meta)
+
+    if request_cache is not None:
+        request_cache[('image', image_id)] = copy.deepcopy(image_meta)
+    return image_meta
 
 
 def add_image_metadata(context, image_meta):
     LOG.debug("Adding image metadata...")
     c = get_registry_client(context)
-    return c.add_image(image_meta)
+    image_meta = c.add_image(image_meta)
+    _cache_image(context, image_meta['id'], image_meta)
+    return image_meta
 
 
 def update_image_metadata(context, image_id, image_meta,
                           purge_props=False, from_state=None):
     LOG.debug("Updating image metadata for image %s...", image_id)
     c = get_registry_client(context)
-    return c.update_image(image_id, image_meta, purge_props=purge_props,
-                          from_state=from_state)
+    try:
+        image_meta = c.update_image(image_id, image_meta,
+                                    purge_props=purge_props,
+                                    from_state=from_state)
+    except Exception:
+        _forget_image(context, image_id)
+        raise
+    _cache_image(context, image_id, image_meta)
+    return image_meta
 
 
 def delete_image_metadata(context, image_id):
     LOG.debug("Deleting image metadata for image %s...", image_id)
     c = get_registry_client(context)
-    return c.delete_image(image_id)
+    try:
+        return c.delete_image(image_id)
+    finally:
+        _forget_image(context, image_id)
 
 
 def get_image_members(context, image_id):
+    request_cache = _get_request_cache(context)
+    if request_cache is not None:
+        members = request_cache.get(('members', image_id))
+        if members is not None:
+            return copy.deepcopy(members)
     c = get_registry_client(context)
-    return c.get_image_members(image_id)
+    members = c.get_image_members(image_id)
+    if request_cache is not None:
+        request_cache[('members', image_id)] = copy.deepcopy(members)
+    return members
 
 
 def get_member_images(context, member_id):
@@ -187,14 +291,23 @@ def get_member_images(context, member_id):
 
 def replace_members(context, image_id, member_data):
     c = get_registry_client(context)
-    return c.replace_members(image_id, member_data)
+    try:
+        return c.replace_members(image_id, member_data)
+    finally:
+        _forget_image(context, image_id)
 
 
 def add_member(context, image_id, member_id, can_share=None):
     c = get_registry_client(context)
-    return c.add_member(image_id, member_id, can_share=can_share)
+    try:
+        return c.add_member(image_id, member_id, can_share=can_share)
+    finally:
+        _forget_image(context, image_id)
 
 
 def delete_member(context, image_id, member_id):
     c = get_registry_client(context)
-    return c.delete_member(image_id, member_id)
+    try:
+        return c.delete_member(image_id, member_id)
+    finally:
+        _forget_image(context, image_id)
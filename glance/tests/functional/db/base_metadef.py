@@ -117,6 +117,36 @@ class MetadefNamespaceTests(object):
             self.context, created['namespace'])
         self.assertIsNotNone(found, "Namespace not found.")
 
+    def test_namespace_get_detail(self):
+        ns_fixture = build_namespace_fixture()
+        ns_created = self.db_api.metadef_namespace_create(
+            self.context, ns_fixture)
+        ns_name = ns_created['namespace']
+        obj_created = self.db_api.metadef_object_create(
+            self.context, ns_name, build_object_fixture())
+        prop_created = self.db_api.metadef_property_create(
+            self.context, ns_name,
+            build_property_fixture(namespace_id=ns_created['id']))
+        assn_fixture = build_association_fixture()
+        self.db_api.metadef_resource_type_association_create(
+            self.context, ns_name, assn_fixture)
+
+        detail = self.db_api.metadef_namespace_get_detail(self.context,
+                                                          ns_name)
+        self._assert_saved_fields(ns_fixture, detail['namespace'])
+        self.assertEqual([obj_created['id']],
+                         [obj['id'] for obj in detail['objects']])
+        self.assertEqual([prop_created['id']],
+                         [prop['id'] for prop in detail['properties']])
+        self.assertEqual(1, len(detail['resource_type_associations']))
+        self._assert_saved_fields(assn_fixture,
+                                  detail['resource_type_associations'][0])
+
+    def test_namespace_get_detail_not_found(self):
+        self.assertRaises(exception.NotFound,
+                          self.db_api.metadef_namespace_get_detail,
+                          self.context, u'MissingNamespace')
+
     def test_namespace_get_all_with_resource_types_filter(self):
         ns_fixture = build_namespace_fixture()
         ns_created = self.db_api.metadef_namespace_create(
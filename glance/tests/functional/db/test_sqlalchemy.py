@@ -14,13 +14,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import json
+import os
+
+import fixtures
 from oslo.config import cfg
 from oslo.db import options
 
 from glance.common import exception
 import glance.db.sqlalchemy.api
+from glance.db.sqlalchemy import metadata
 from glance.db.sqlalchemy import models as db_models
 from glance.db.sqlalchemy import models_metadef as metadef_models
+from glance.openstack.common import timeutils
 import glance.tests.functional.db as db_tests
 from glance.tests.functional.db import base
 from glance.tests.functional.db import base_metadef
@@ -91,6 +98,88 @@ class TestSqlAlchemyMembershipVisibility(base.TestMembershipVisibility,
         self.addCleanup(db_tests.reset)
 
 
+class TestSqlAlchemyVisibilityIndexDriver(base.TestDriver, base.DriverTests):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db)
+        super(TestSqlAlchemyVisibilityIndexDriver, self).setUp()
+        self.addCleanup(db_tests.reset)
+        self.config(use_image_visibility_index=True)
+
+
+class TestSqlAlchemyVisibilityIndex(base.TestVisibility,
+                                    base.VisibilityTests):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db)
+        super(TestSqlAlchemyVisibilityIndex, self).setUp()
+        self.addCleanup(db_tests.reset)
+        self.config(use_image_visibility_index=True)
+
+
+class TestSqlAlchemyMembershipVisibilityIndex(
+        base.TestMembershipVisibility, base.MembershipVisibilityTests):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db)
+        super(TestSqlAlchemyMembershipVisibilityIndex, self).setUp()
+        self.addCleanup(db_tests.reset)
+        self.config(use_image_visibility_index=True)
+
+
+class TestSqlAlchemyImageVisibility(base.TestDriver):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db)
+        super(TestSqlAlchemyImageVisibility, self).setUp()
+        self.addCleanup(db_tests.reset)
+
+    def _get_rows(self):
+        session = self.db_api.get_session()
+        return sorted((row.tenant, row.image_id, row.status) for row in
+                      session.query(db_models.ImageVisibility))
+
+    def test_rows_follow_image_and_member_changes(self):
+        self.db_api.image_update(self.adm_context, base.UUID1,
+                                 {'is_public': False, 'owner': 'tenant1'})
+        self.assertIn(('tenant1', base.UUID1, None), self._get_rows())
+
+        member = self.db_api.image_member_create(
+            self.adm_context, {'image_id': base.UUID1, 'member': 'tenant2'})
+        self.assertIn(('tenant2', base.UUID1, 'pending'), self._get_rows())
+
+        self.db_api.image_member_update(self.adm_context, member['id'],
+                                        {'status': 'accepted'})
+        self.assertIn(('tenant2', base.UUID1, 'accepted'), self._get_rows())
+
+        self.db_api.image_update(self.adm_context, base.UUID1,
+                                 {'is_public': True})
+        rows = [row for row in self._get_rows() if row[1] == base.UUID1]
+        self.assertEqual([(db_models.PUBLIC_TENANT, base.UUID1, None)], rows)
+
+        self.db_api.image_update(self.adm_context, base.UUID1,
+                                 {'is_public': False})
+        self.db_api.image_member_delete(self.adm_context, member['id'])
+        rows = [row for row in self._get_rows() if row[1] == base.UUID1]
+        self.assertEqual([('tenant1', base.UUID1, None)], rows)
+
+    def test_rebuild(self):
+        self.db_api.image_update(self.adm_context, base.UUID1,
+                                 {'is_public': False, 'owner': 'tenant1'})
+        self.db_api.image_update(self.adm_context, base.UUID2,
+                                 {'is_public': False})
+        self.db_api.image_member_create(
+            self.adm_context, {'image_id': base.UUID1, 'member': 'tenant2'})
+        expected = self._get_rows()
+
+        session = self.db_api.get_session()
+        with session.begin():
+            session.query(db_models.ImageVisibility).delete()
+        rows = self.db_api.image_visibility_rebuild(self.adm_context)
+        self.assertEqual(len(expected), rows)
+        self.assertEqual(expected, self._get_rows())
+
+
 class TestSqlAlchemyDBDataIntegrity(base.TestDriver):
     """Test class for checking the data integrity in the database.
 
@@ -145,6 +234,90 @@ class TestSqlAlchemyQuota(base.DriverQuotaTests):
         self.addCleanup(db_tests.reset)
 
 
+class TestSqlAlchemyPurge(base.TestDriver):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db)
+        super(TestSqlAlchemyPurge, self).setUp()
+        self.addCleanup(db_tests.reset)
+
+    def _age(self, model, days=40):
+        session = self.db_api.get_session()
+        deleted_at = timeutils.utcnow() - datetime.timedelta(days=days)
+        with session.begin():
+            session.query(model).filter_by(deleted=True).update(
+                {'deleted_at': deleted_at})
+
+    def _age_images(self, days=40):
+        for model in (db_models.Image, db_models.ImageProperty,
+                      db_models.ImageTag, db_models.ImageMember,
+                      db_models.ImageLocation):
+            self._age(model, days)
+
+    def _count(self, model):
+        return self.db_api.get_session().query(model).count()
+
+    def _purge(self, **kwargs):
+        return dict(self.db_api.purge_deleted_rows(self.adm_context, 30,
+                                                   **kwargs))
+
+    def test_purge_deleted_images(self):
+        self.db_api.image_destroy(self.adm_context, base.UUID1)
+        self._age_images()
+        results = self._purge()
+        self.assertEqual(1, results['images'])
+        self.assertEqual(2, results['image_properties'])
+        self.assertEqual(1, results['image_visibility'])
+        self.assertEqual(2, self._count(db_models.Image))
+        self.assertEqual(0, self._count(db_models.ImageProperty))
+
+    def test_purge_keeps_recently_deleted_images(self):
+        self.db_api.image_destroy(self.adm_context, base.UUID1)
+        self._age_images(days=10)
+        results = self._purge()
+        self.assertEqual(0, results['images'])
+        self.assertEqual(0, results['image_properties'])
+        self.assertEqual(3, self._count(db_models.Image))
+
+    def test_purge_keeps_images_pending_delete(self):
+        self.db_api.image_update(self.adm_context, base.UUID1,
+                                 {'status': 'pending_delete'})
+        self.db_api.image_destroy(self.adm_context, base.UUID1)
+        self._age_images()
+        results = self._purge()
+        self.assertEqual(0, results['images'])
+        self.assertEqual(0, results['image_properties'])
+        self.assertEqual(3, self._count(db_models.Image))
+        self.assertEqual(2, self._count(db_models.ImageProperty))
+
+    def test_purge_in_batches_up_to_max_rows(self):
+        for image_id in (base.UUID1, base.UUID2, base.UUID3):
+            self.db_api.image_destroy(self.adm_context, image_id)
+        self._age_images()
+        results = self._purge(max_rows=2, batch_size=1)
+        self.assertEqual(2, results['image_properties'])
+        self.assertEqual(2, results['images'])
+        results = self._purge(batch_size=1)
+        self.assertEqual(1, results['images'])
+        self.assertEqual(0, self._count(db_models.Image))
+
+    def test_purge_expired_and_deleted_tasks(self):
+        old = timeutils.utcnow() - datetime.timedelta(days=40)
+        expired = self.db_api.task_create(
+            self.adm_context, base.build_task_fixture(expires_at=old))
+        deleted = self.db_api.task_create(
+            self.adm_context, base.build_task_fixture())
+        self.db_api.task_create(self.adm_context, base.build_task_fixture())
+        self.db_api.task_delete(self.adm_context, deleted['id'])
+        self._age(db_models.Task)
+        results = self._purge()
+        self.assertEqual(2, results['tasks'])
+        self.assertEqual(2, results['task_info'])
+        self.assertEqual(1, self._count(db_models.Task))
+        self.assertRaises(exception.TaskNotFound, self.db_api.task_get,
+                          self.adm_context, expired['id'])
+
+
 class TestMetadefSqlAlchemyDriver(base_metadef.TestMetadefDriver,
                                   base_metadef.MetadefDriverTests):
 
@@ -152,3 +325,116 @@ class TestMetadefSqlAlchemyDriver(base_metadef.TestMetadefDriver,
         db_tests.load(get_db, reset_db_metadef)
         super(TestMetadefSqlAlchemyDriver, self).setUp()
         self.addCleanup(db_tests.reset)
+
+
+class TestMetadefSqlAlchemyLoad(base_metadef.TestMetadefDriver):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db_metadef)
+        super(TestMetadefSqlAlchemyLoad, self).setUp()
+        self.addCleanup(db_tests.reset)
+        self.path = self.useFixture(fixtures.TempDir()).path + '/'
+        self.engine = self.db_api.get_engine()
+        self.namespace = {
+            'namespace': 'OS::Test',
+            'display_name': 'Test',
+            'description': 'Test namespace',
+            'visibility': 'public',
+            'protected': True,
+            'resource_type_associations': [
+                {'name': 'OS::Glance::Image', 'prefix': 'test_'},
+                {'name': 'OS::Cinder::Volume', 'prefix': 'test_',
+                 'properties_target': 'image'}],
+            'properties': {
+                'prop1': {'type': 'string', 'title': 'Prop 1'},
+                'prop2': {'type': 'integer', 'title': 'Prop 2'}},
+            'objects': [
+                {'name': 'Object1', 'description': 'desc1',
+                 'properties': {'prop3': {'type': 'boolean'}}}],
+        }
+
+    def _write(self, namespace, file_name='test.json'):
+        with open(os.path.join(self.path, file_name), 'w') as f:
+            json.dump(namespace, f)
+
+    def _get_detail(self):
+        return self.db_api.metadef_namespace_get_detail(
+            self.adm_context, 'OS::Test')
+
+    def test_load(self):
+        self._write(self.namespace)
+        other = dict(self.namespace, namespace='OS::Other')
+        self._write(other, 'other.json')
+        metadata.db_load_metadefs(self.engine, self.path)
+
+        detail = self._get_detail()
+        self.assertEqual('admin', detail['namespace']['owner'])
+        self.assertEqual(set(['prop1', 'prop2']),
+                         set([p['name'] for p in detail['properties']]))
+        self.assertEqual(['Object1'],
+                         [o['name'] for o in detail['objects']])
+        self.assertEqual(
+            set(['OS::Glance::Image', 'OS::Cinder::Volume']),
+            set([a['name'] for a in detail['resource_type_associations']]))
+        # Resource types are shared by both namespaces
+        self.assertEqual(
+            2, len(self.db_api.metadef_resource_type_get_all(
+                self.adm_context)))
+
+    def test_load_existing_namespace_skipped(self):
+        self._write(self.namespace)
+        metadata.db_load_metadefs(self.engine, self.path)
+        self.namespace['properties']['prop3'] = {'type': 'string'}
+        self._write(self.namespace)
+        metadata.db_load_metadefs(self.engine, self.path)
+
+        detail = self._get_detail()
+        self.assertEqual(2, len(detail['properties']))
+
+    def test_load_merge(self):
+        self._write(self.namespace)
+        metadata.db_load_metadefs(self.engine, self.path)
+
+        self.namespace['description'] = 'New description'
+        self.namespace['properties']['prop1']['title'] = 'New title'
+        self.namespace['objects'].append({'name': 'Object2'})
+        self.namespace['resource_type_associations'][0]['prefix'] = 'new_'
+        self._write(self.namespace)
+        metadata.db_load_metadefs(self.engine, self.path, merge=True)
+
+        detail = self._get_detail()
+        self.assertEqual('New description',
+                         detail['namespace']['description'])
+        self.assertNotEqual(detail['namespace']['created_at'],
+                            detail['namespace']['updated_at'])
+        properties = dict((p['name'], p) for p in detail['properties'])
+        self.assertEqual('New title',
+                         json.loads(properties['prop1']['schema'])['title'])
+        self.assertNotEqual(properties['prop1']['created_at'],
+                            properties['prop1']['updated_at'])
+        self.assertEqual(properties['prop2']['created_at'],
+                         properties['prop2']['updated_at'])
+        objects = dict((o['name'], o) for o in detail['objects'])
+        self.assertEqual(set(['Object1', 'Object2']), set(objects))
+        self.assertEqual(objects['Object1']['created_at'],
+                         objects['Object1']['updated_at'])
+        associations = dict((a['name'], a['prefix'])
+                            for a in detail['resource_type_associations'])
+        self.assertEqual({'OS::Glance::Image': 'new_',
+                          'OS::Cinder::Volume': 'test_'}, associations)
+
+    def test_export(self):
+        self._write(self.namespace)
+        metadata.db_load_metadefs(self.engine, self.path)
+        os.remove(os.path.join(self.path, 'test.json'))
+        metadata.db_export_metadefs(self.engine, self.path)
+
+        with open(os.path.join(self.path, 'Test.json')) as f:
+            exported = json.load(f)
+        self.assertEqual('OS::Test', exported['namespace'])
+        self.assertEqual(self.namespace['properties'],
+                         exported['properties'])
+        self.assertEqual(self.namespace['objects'], exported['objects'])
+        self.assertEqual(
+            set(['OS::Glance::Image', 'OS::Cinder::Volume']),
+            set([a['name'] for a in exported['resource_type_associations']]))
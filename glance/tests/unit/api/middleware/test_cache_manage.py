@@ -162,3 +162,18 @@ class TestCacheManageFilter(test_utils.BaseTestCase):
         # check
         mock_delete_queued_images.assert_called_with(request)
         self.assertEqual('"' + self.stub_value + '"', resource.body)
+
+    @mock.patch.object(cached_images.Controller, "get_cache_ring")
+    def test_get_cache_ring(self, mock_get_cache_ring):
+        # setup
+        mock_get_cache_ring.return_value = self.stub_value
+
+        # prepare
+        request = webob.Request.blank("/v1/cache_ring")
+
+        # call
+        resource = self.cache_manage_filter.process_request(request)
+
+        # check
+        mock_get_cache_ring.assert_called_with(request)
+        self.assertEqual('"' + self.stub_value + '"', resource.body)
@@ -0,0 +1,93 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import io
+
+import webob
+
+from glance.api.middleware import gzip as gzip_middleware
+from glance.tests import utils as test_utils
+
+
+class TestGzipMiddleware(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestGzipMiddleware, self).setUp()
+        self.middleware = gzip_middleware.GzipMiddleware(None)
+
+    def _response(self, body, content_type='application/json',
+                  headers=None, accept_encoding='gzip'):
+        request = webob.Request.blank('/')
+        request.headers['Accept-Encoding'] = accept_encoding
+        response = webob.Response(body=body, content_type=content_type,
+                                  request=request, charset=None)
+        response.headers.update(headers or {})
+        return self.middleware.process_response(response)
+
+    def _decompress(self, response):
+        return gzip.GzipFile(fileobj=io.BytesIO(response.body)).read()
+
+    def test_json_compressed(self):
+        body = '{"images": []}' * 10
+        response = self._response(body)
+        self.assertEqual('gzip', response.content_encoding)
+        self.assertEqual(len(response.body), response.content_length)
+        self.assertEqual(body, self._decompress(response))
+
+    def test_identity_not_compressed(self):
+        response = self._response('{}', accept_encoding='identity')
+        self.assertIsNone(response.content_encoding)
+
+    def test_other_content_type_not_compressed(self):
+        response = self._response('error', content_type='text/plain')
+        self.assertIsNone(response.content_encoding)
+
+    def test_small_response_not_compressed(self):
+        self.config(gzip_min_size=100)
+        response = self._response('{}')
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(2, response.content_length)
+
+    def test_image_data_not_compressed_by_default(self):
+        headers = {'x-image-meta-disk_format': 'raw',
+                   'Content-MD5': 'abc'}
+        response = self._response('data' * 10, 'application/octet-stream',
+                                  headers)
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(40, response.content_length)
+
+    def test_image_data_compressed_for_disk_format(self):
+        self.config(gzip_image_disk_formats=['raw', 'iso'])
+        headers = {'x-image-meta-disk_format': 'raw',
+                   'Content-MD5': 'abc'}
+        response = self._response('data' * 10, 'application/octet-stream',
+                                  headers)
+        self.assertEqual('gzip', response.content_encoding)
+        self.assertIsNone(response.content_length)
+        self.assertEqual('abc', response.headers['Content-MD5'])
+        self.assertEqual('data' * 10, self._decompress(response))
+
+    def test_image_data_of_other_disk_format_not_compressed(self):
+        self.config(gzip_image_disk_formats=['raw'])
+        headers = {'x-image-meta-disk_format': 'qcow2'}
+        response = self._response('data', 'application/octet-stream',
+                                  headers)
+        self.assertIsNone(response.content_encoding)
+
+    def test_partial_content_not_compressed(self):
+        request = webob.Request.blank('/')
+        request.headers['Accept-Encoding'] = 'gzip'
+        response = webob.Response(body='{}', status=206, request=request,
+                                  content_type='application/json')
+        response = self.middleware.process_response(response)
+        self.assertIsNone(response.content_encoding)
@@ -19,11 +19,13 @@ import six
 
 import glance.cmd.api
 import glance.cmd.cache_cleaner
+import glance.cmd.cache_prefetcher
 import glance.cmd.cache_pruner
 import glance.common.config
 from glance.common import exception as exc
 import glance.common.wsgi
 import glance.image_cache.cleaner
+import glance.image_cache.prefetcher
 import glance.image_cache.pruner
 from glance.tests import utils as test_utils
 
@@ -137,3 +139,10 @@ class TestGlanceApiCmd(test_utils.BaseTestCase):
                        self._raise(RuntimeError))
         exit = self.assertRaises(SystemExit, glance.cmd.cache_pruner.main)
         self.assertEqual('ERROR: ', exit.code)
+
+    def test_cache_apps_use_cache_app_base(self):
+        for app in (glance.image_cache.cleaner.Cleaner,
+                    glance.image_cache.prefetcher.Prefetcher,
+                    glance.image_cache.pruner.Pruner):
+            self.assertTrue(issubclass(app, glance.image_cache.base.CacheApp))
+        self.assertTrue(callable(glance.cmd.cache_prefetcher.main))
@@ -0,0 +1,97 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+
+import mock
+import six
+
+from glance.common import hashing
+from glance.tests import utils as test_utils
+
+
+class TestMultiHasher(test_utils.BaseTestCase):
+
+    def test_digests_match_hashlib(self):
+        hasher = hashing.MultiHasher(['md5', 'sha256', 'sha512'])
+        for chunk in ['abc', 'def', '']:
+            hasher.update(chunk)
+
+        self.assertEqual(hashlib.md5('abcdef').hexdigest(),
+                         hasher.hexdigest())
+        self.assertEqual({'md5': hashlib.md5('abcdef').hexdigest(),
+                          'sha256': hashlib.sha256('abcdef').hexdigest(),
+                          'sha512': hashlib.sha512('abcdef').hexdigest()},
+                         hasher.hexdigests())
+
+    def test_unknown_algorithm(self):
+        self.assertRaises(ValueError, hashing.MultiHasher, ['nosuchhash'])
+
+    def test_large_chunks_offloaded(self):
+        self.config(hash_offload_threshold=4)
+        hasher = hashing.MultiHasher()
+        with mock.patch.object(hashing.tpool, 'execute') as mock_execute:
+            mock_execute.side_effect = lambda f, *args: f(*args)
+            hasher.update('abc')
+            self.assertFalse(mock_execute.called)
+            hasher.update('abcd')
+            mock_execute.assert_called_once_with(hasher._update, 'abcd')
+        self.assertEqual(hashlib.md5('abcabcd').hexdigest(),
+                         hasher.hexdigest())
+
+    def test_offload_disabled(self):
+        self.config(hash_offload_threshold=0)
+        hasher = hashing.MultiHasher()
+        with mock.patch.object(hashing.tpool, 'execute') as mock_execute:
+            hasher.update('x' * 1024)
+            self.assertFalse(mock_execute.called)
+
+
+class TestHashingReader(test_utils.BaseTestCase):
+
+    def test_read(self):
+        hasher = hashing.MultiHasher(['sha256'])
+        reader = hashing.HashingReader(six.StringIO('abcdef'), hasher)
+        self.assertEqual('abcd', reader.read(4))
+        self.assertEqual('ef', reader.read(4))
+        self.assertEqual('', reader.read(4))
+        self.assertEqual(hashlib.sha256('abcdef').hexdigest(),
+                         hasher.hexdigest('sha256'))
+
+    def test_iter(self):
+        hasher = hashing.MultiHasher(['sha256'])
+        reader = hashing.HashingReader(iter(['abc', 'def']), hasher)
+        self.assertEqual(['abc', 'def'], list(reader))
+        self.assertEqual(hashlib.sha256('abcdef').hexdigest(),
+                         hasher.hexdigest('sha256'))
+
+
+class TestUploadHasher(test_utils.BaseTestCase):
+
+    def test_no_algorithms(self):
+        self.assertIsNone(hashing.get_upload_hasher())
+        self.assertEqual({}, hashing.get_hash_properties(None))
+
+    def test_md5_left_to_store(self):
+        self.config(image_hash_algorithms=['md5'])
+        self.assertIsNone(hashing.get_upload_hasher())
+
+    def test_hash_properties(self):
+        self.config(image_hash_algorithms=['md5', 'sha256'])
+        hasher = hashing.get_upload_hasher()
+        hasher.update('abc')
+        self.assertEqual(
+            {'checksum_sha256': hashlib.sha256('abc').hexdigest()},
+            hashing.get_hash_properties(hasher))
@@ -14,10 +14,12 @@
 #    under the License.
 
 import copy
+import time
 
 import stevedore
 
 from glance.common import location_strategy
+from glance.common.location_strategy import latency
 from glance.common.location_strategy import location_order
 from glance.common.location_strategy import store_type
 from glance.tests.unit import base
@@ -33,15 +35,15 @@ class TestLocationStrategy(base.IsolatedUnitTest):
 
     def setUp(self):
         super(TestLocationStrategy, self).setUp()
-        original_strategies = ['location_order', 'store_type']
+        original_strategies = ['location_order', 'store_type', 'latency']
         self.addCleanup(self._set_original_strategies, original_strategies)
 
     def test_load_strategy_modules(self):
         modules = location_strategy._load_strategies()
-        # By default we have two built-in strategy modules.
-        self.assertEqual(len(modules), 2)
+        # By default we have three built-in strategy modules.
+        self.assertEqual(len(modules), 3)
         self.assertEqual(set(modules.keys()),
-                         set(['location_order', 'store_type']))
+                         set(['location_order', 'store_type', 'latency']))
         self.assertEqual(location_strategy._available_strategies, modules)
 
     def test_load_strategy_module_with_deduplicating(self):
@@ -103,7 +105,7 @@ class TestLocationStrategy(base.IsolatedUnitTest):
         self.assertEqual(loaded_modules['module_good'].__name__, 'module_good')
 
     def test_verify_valid_location_strategy(self):
-        for strategy_name in ['location_order', 'store_type']:
+        for strategy_name in ['location_order', 'store_type', 'latency']:
             self.config(location_strategy=strategy_name)
             location_strategy.verify_location_strategy()
 
@@ -142,6 +144,87 @@ class TestLocationStrategy(base.IsolatedUnitTest):
         self.assertNotEqual(id(original_locs), id(best_loc))
         self.assertEqual(original_locs[0], best_loc)
 
+    def test_measure_transfer_not_measured(self):
+        self.config(location_strategy='location_order')
+        data = iter(['abc'])
+        self.assertIs(data, location_strategy.measure_transfer('loc1', data,
+                                                               0))
+
+    def test_measure_transfer(self):
+        self.config(location_strategy='latency')
+        transfers = []
+        self.stubs.Set(latency, 'record_transfer',
+                       lambda *args: transfers.append(args))
+        data = location_strategy.measure_transfer('rbd://a/image', ['ab', 'c'],
+                                                  0)
+        self.assertEqual('abc', ''.join(data))
+        self.assertEqual(2, len(transfers))
+        self.assertEqual(('rbd://a/image', 0), transfers[0][::2])
+        self.assertEqual(('rbd://a/image', None, 3), transfers[1][:3])
+
+    def test_measure_transfer_closed_early(self):
+        self.config(location_strategy='latency')
+        transfers = []
+        self.stubs.Set(latency, 'record_transfer',
+                       lambda *args: transfers.append(args))
+        data = location_strategy.measure_transfer('rbd://a/image',
+                                                  iter(['ab', 'c', 'd']), 0)
+        self.assertEqual('ab', next(data))
+        self.assertEqual(1, len(transfers))
+        self.assertEqual(('rbd://a/image', 0, 0),
+                         (transfers[0][0], transfers[0][2], transfers[0][3]))
+
+        data.close()
+        self.assertEqual(1, len(transfers))
+
+    def test_measure_transfer_fails_mid_stream(self):
+        self.config(location_strategy='latency')
+        self.config(failure_threshold=2, group='latency_location_strategy')
+        uri = 'rbd://midstream/image'
+        self.addCleanup(latency._BACKEND_STATS.pop, 'rbd://midstream', None)
+
+        def broken_read():
+            yield 'ab'
+            raise IOError('connection reset')
+
+        for i in range(3):
+            data = location_strategy.measure_transfer(uri, broken_read(), 0)
+            self.assertRaises(IOError, list, data)
+        stats = latency._BACKEND_STATS['rbd://midstream']
+        self.assertEqual(3, stats.failures)
+        self.assertIsNotNone(stats.ttfb)
+        self.assertFalse(stats.is_available(time.time()))
+
+    def test_measure_transfer_failure_not_recorded_as_transfer(self):
+        self.config(location_strategy='latency')
+        transfers = []
+        self.stubs.Set(latency, 'record_transfer',
+                       lambda *args: transfers.append(args))
+        self.stubs.Set(latency, 'record_failure', lambda uri: None)
+
+        def broken_read():
+            yield 'ab'
+            raise IOError('connection reset')
+
+        data = location_strategy.measure_transfer('rbd://a/image',
+                                                  broken_read(), 0)
+        self.assertRaises(IOError, list, data)
+        self.assertEqual(1, len(transfers))
+
+    def test_measure_transfer_failure(self):
+        self.config(location_strategy='latency')
+        failures = []
+        self.stubs.Set(latency, 'record_failure', failures.append)
+
+        def broken_read():
+            yield 'ab'
+            raise IOError('connection reset')
+
+        data = location_strategy.measure_transfer('rbd://a/image',
+                                                  broken_read(), 0)
+        self.assertRaises(IOError, list, data)
+        self.assertEqual(['rbd://a/image'], failures)
+
 
 class TestLocationOrderStrategyModule(base.IsolatedUnitTest):
     """Test routines in glance.common.location_strategy.location_order"""
@@ -191,3 +274,69 @@ class TestStoreTypeStrategyModule(base.IsolatedUnitTest):
         locs.sort(key=lambda loc: loc['metadata']['idx'])
         # The result will ordered by preferred store type order.
         self.assertEqual(ordered_locs, locs)
+
+
+class TestLatencyStrategyModule(base.IsolatedUnitTest):
+    """Test routines in glance.common.location_strategy.latency"""
+
+    def setUp(self):
+        super(TestLatencyStrategyModule, self).setUp()
+        latency.init()
+        self.addCleanup(latency.init)
+        self.locs = [{'url': 'swift://slow/image'},
+                     {'url': 'rbd://fast/pool/image'},
+                     {'url': 'http://unknown/image'}]
+
+    def test_get_ordered_locations_by_speed(self):
+        latency.record_transfer('swift://slow/other', 0.5, 100, 10.0)
+        latency.record_transfer('rbd://fast/pool/other', 0.1, 100, 1.0)
+        ordered_locs = latency.get_ordered_locations(self.locs)
+        # Unmeasured hosts are tried first so that they get measured.
+        self.assertEqual(['http://unknown/image', 'rbd://fast/pool/image',
+                          'swift://slow/image'],
+                         [loc['url'] for loc in ordered_locs])
+
+    def test_record_transfer_moving_average(self):
+        self.config(ewma_weight=0.5, group='latency_location_strategy')
+        latency.record_transfer('rbd://fast/pool/image', 1.0, 100, 1.0)
+        latency.record_transfer('rbd://fast/pool/image', 3.0, 300, 1.0)
+        stats = latency._BACKEND_STATS['rbd://fast']
+        self.assertEqual(2.0, stats.ttfb)
+        self.assertEqual(200.0, stats.throughput)
+
+    def test_record_transfer_parts(self):
+        latency.record_transfer('rbd://fast/pool/image', 1.0, 0, 0)
+        stats = latency._BACKEND_STATS['rbd://fast']
+        self.assertEqual(1.0, stats.ttfb)
+        self.assertIsNone(stats.throughput)
+
+        latency.record_transfer('rbd://fast/pool/image', None, 100, 1.0)
+        self.assertEqual(1.0, stats.ttfb)
+        self.assertEqual(100.0, stats.throughput)
+
+    def test_failing_host_demoted(self):
+        self.config(failure_threshold=2, group='latency_location_strategy')
+        latency.record_transfer('rbd://fast/pool/image', 0.1, 100, 1.0)
+        latency.record_transfer('swift://slow/image', 0.5, 100, 10.0)
+        latency.record_failure('rbd://fast/pool/image')
+        ordered_locs = latency.get_ordered_locations(self.locs[:2])
+        self.assertEqual('rbd://fast/pool/image', ordered_locs[0]['url'])
+
+        latency.record_failure('rbd://fast/pool/image')
+        ordered_locs = latency.get_ordered_locations(self.locs[:2])
+        self.assertEqual('swift://slow/image', ordered_locs[0]['url'])
+
+    def test_failure_backoff(self):
+        self.config(failure_threshold=1, failure_backoff=10.0,
+                    max_failure_backoff=30.0,
+                    group='latency_location_strategy')
+        stats = latency.BackendStats()
+        stats.record_failure(100)
+        self.assertFalse(stats.is_available(109))
+        self.assertTrue(stats.is_available(110))
+        stats.record_failure(110)
+        self.assertEqual(130, stats.retry_at)
+        stats.record_failure(130)
+        self.assertEqual(160, stats.retry_at)
+        stats.record_transfer(0.1, 100, 1.0)
+        self.assertTrue(stats.is_available(130))
@@ -16,8 +16,10 @@
 #    under the License.
 import datetime
 
+import mock
 from oslo.config import cfg
 import routes
+import testtools
 import webob
 
 from glance.common import exception
@@ -55,8 +57,8 @@ class FakeResource(object):
 
 
 def create_api():
-    deserializer = rpc.RPCJSONDeserializer()
-    serializer = rpc.RPCJSONSerializer()
+    deserializer = rpc.RPCDeserializer()
+    serializer = rpc.RPCSerializer()
     controller = rpc.Controller()
     controller.register(FakeResource())
     res = wsgi.Resource(controller, deserializer, serializer)
@@ -208,9 +210,10 @@ class TestRPCClient(base.IsolatedUnitTest):
         self.client._do_request = self.fake_request
 
     def fake_request(self, method, url, body, headers):
-        req = webob.Request.blank(url.path)
+        req = webob.Request.blank(url.path, headers=headers)
         req.body = body
         req.method = method
+        self.last_request = req
 
         webob_res = req.get_response(self.api)
         return test_utils.FakeHTTPResponse(status=webob_res.status_int,
@@ -230,6 +233,59 @@ class TestRPCClient(base.IsolatedUnitTest):
         self.assertTrue(res[0])
         self.assertFalse(res[1])
 
+    def test_bulk_request_requires_previous(self):
+        commands = [{"command": "raise_value_error"},
+                    {"command": "get_images", "requires_previous": True},
+                    {"command": "get_all_images"}]
+
+        res = self.client.bulk_request(commands)
+        self.assertEqual(res[0], res[1])
+        self.assertIn('_error', res[1])
+        self.assertFalse(res[2])
+
+    def test_batch_request(self):
+        res = self.client.batch_request([('get_images', {'keyword': 'x'}),
+                                         ('count_images', {'images': [1]})])
+        self.assertEqual(['x', 1], res)
+
+    def test_batch_request_exception_raise(self):
+        self.assertRaises(ValueError, self.client.batch_request,
+                          [('get_all_images', {}),
+                           ('raise_value_error', {}),
+                           ('get_images', {})])
+
+    @testtools.skipIf(rpc.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_negotiation(self):
+        self.config(rpc_serialization_format='msgpack')
+        self.client = rpc.RPCClient(host="http://127.0.0.1:9191")
+        responses = []
+
+        def fake_request(*args, **kwargs):
+            response = self.fake_request(*args, **kwargs)
+            responses.append(response.getheader('content-type').split(';')[0])
+            return response
+
+        self.client._do_request = fake_request
+
+        self.assertEqual(u'x', self.client.get_images(keyword='x'))
+        self.assertEqual(2, self.client.count_images(images=[1, 2]))
+        self.assertEqual('application/json',
+                         self.last_request.content_type)
+        self.assertEqual([rpc.MSGPACK_CONTENT_TYPE] * 2, responses)
+
+    @testtools.skipIf(rpc.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_server_without_msgpack(self):
+        self.config(rpc_serialization_format='msgpack')
+        self.client = rpc.RPCClient(host="http://127.0.0.1:9191")
+        self.client._do_request = self.fake_request
+        self.assertEqual(u'x', self.client.get_images(keyword='x'))
+        # A server behind the same address which only speaks JSON, e.g.
+        # an older registry, still understands the next request.
+        with mock.patch.object(rpc, 'msgpack', None):
+            self.assertEqual(u'y', self.client.get_images(keyword='y'))
+        self.assertEqual('application/json',
+                         self.last_request.content_type)
+
     def test_exception_raise(self):
         try:
             self.client.raise_value_error()
@@ -288,6 +344,39 @@ class TestRPCJSONSerializer(test_utils.BaseTestCase):
         self.assertEqual(response.body, '{"key": "value"}')
 
 
+@testtools.skipIf(rpc.msgpack is None, 'msgpack is not installed')
+class TestRPCMsgpackSerializer(test_utils.BaseTestCase):
+
+    def test_round_trip(self):
+        fixture = {"key": "value", "list": [1, None, True],
+                   "date": datetime.datetime(1900, 3, 8, 2, 0, 0, 13),
+                   "set": set([u'a'])}
+        data = rpc.RPCMsgpackSerializer().to_msgpack(fixture)
+        actual = rpc.RPCMsgpackDeserializer().from_msgpack(data)
+        fixture['set'] = [u'a']
+        self.assertEqual(fixture, actual)
+        self.assertIsInstance(actual['key'], unicode)
+
+    def test_from_msgpack_malformed(self):
+        self.assertRaises(webob.exc.HTTPBadRequest,
+                          rpc.RPCMsgpackDeserializer().from_msgpack, '\xc1')
+
+    def test_serializer_negotiation(self):
+        request = wsgi.Request.blank('/')
+        response = webob.Response(request=request)
+        rpc.RPCSerializer().default(response, {"key": "value"})
+        self.assertEqual('application/json', response.content_type)
+
+        request.headers['Accept'] = ('application/x-msgpack, '
+                                     'application/json;q=0.5')
+        response = webob.Response(request=request)
+        rpc.RPCSerializer().default(response, {"key": "value"})
+        self.assertEqual(rpc.MSGPACK_CONTENT_TYPE, response.content_type)
+        self.assertEqual({"key": "value"},
+                         rpc.RPCMsgpackDeserializer().from_msgpack(
+                             response.body))
+
+
 class TestRPCJSONDeserializer(test_utils.BaseTestCase):
 
     def test_has_body_no_content_length(self):
@@ -17,6 +17,8 @@ import os
 import tempfile
 import uuid
 
+import eventlet
+import mock
 import six
 import webob
 
@@ -74,6 +76,54 @@ class TestUtils(test_utils.BaseTestCase):
         meat = ''.join(chunks)
         self.assertEqual(meat, '')
 
+    def test_cooperative_yielder_byte_budget(self):
+        self.config(cooperative_yield_interval=60000,
+                    cooperative_yield_bytes=10)
+        self.stubs.Set(utils, '_greenthreads_runnable', lambda: False)
+        yielder = utils.CooperativeYielder()
+        with mock.patch.object(utils, 'sleep') as mock_sleep:
+            yielder.consumed(6)
+            self.assertFalse(mock_sleep.called)
+            yielder.consumed(6)
+            mock_sleep.assert_called_once_with(0)
+            yielder.consumed(6)
+            self.assertEqual(1, mock_sleep.call_count)
+
+    def test_cooperative_yielder_time_budget(self):
+        self.config(cooperative_yield_interval=10,
+                    cooperative_yield_bytes=1000)
+        self.stubs.Set(utils, '_greenthreads_runnable', lambda: False)
+        with mock.patch.object(utils.time, 'time') as mock_time:
+            mock_time.return_value = 100.0
+            yielder = utils.CooperativeYielder()
+            with mock.patch.object(utils, 'sleep') as mock_sleep:
+                mock_time.return_value = 100.005
+                yielder.consumed(1)
+                self.assertFalse(mock_sleep.called)
+                mock_time.return_value = 100.011
+                yielder.consumed(1)
+                mock_sleep.assert_called_once_with(0)
+
+    def test_cooperative_yielder_waiting_greenthreads(self):
+        self.config(cooperative_yield_interval=60000,
+                    cooperative_yield_bytes=1000)
+        yielder = utils.CooperativeYielder()
+        with mock.patch.object(utils, 'sleep') as mock_sleep:
+            yielder.consumed(1)
+            self.assertFalse(mock_sleep.called)
+            eventlet.spawn_n(lambda: None)
+            yielder.consumed(1)
+            mock_sleep.assert_called_once_with(0)
+        eventlet.sleep(0)
+
+    def test_cooperative_iter_yields_every_chunk_without_budget(self):
+        self.config(cooperative_yield_interval=0,
+                    cooperative_yield_bytes=0)
+        with mock.patch.object(utils, 'sleep') as mock_sleep:
+            self.assertEqual(['a', 'b', 'c'],
+                             list(utils.cooperative_iter(['a', 'b', 'c'])))
+            self.assertEqual(3, mock_sleep.call_count)
+
     def test_limiting_reader(self):
         """Ensure limiting reader class accesses all bytes of file"""
         BYTES = 1024
@@ -117,6 +167,64 @@ class TestUtils(test_utils.BaseTestCase):
 
         self.assertRaises(exception.ImageSizeLimitExceeded, _consume_all_read)
 
+    def test_read_ahead_reader_read(self):
+        """Ensure read ahead reader returns all bytes in order"""
+        data = six.StringIO(''.join(l * 5 for l in 'abcdefgh'))
+        reader = utils.ReadAheadReader(data, 2, 4)
+        chunks = []
+        while True:
+            chunks.append(reader.read(3))
+            if chunks[-1] == '':
+                break
+        reader.close()
+        self.assertEqual(''.join(l * 5 for l in 'abcdefgh'), ''.join(chunks))
+        self.assertTrue(all(len(c) == 3 for c in chunks[:-2]))
+
+    def test_read_ahead_reader_of_iterator(self):
+        """Ensure read ahead reader supports iterator backends too"""
+        reader = utils.ReadAheadReader([l * 3 for l in 'abcd'], 2, 4)
+        self.assertEqual(['aaa', 'bbb', 'ccc', 'ddd'], list(reader))
+        self.assertEqual('', reader.read(3))
+        reader.close()
+
+    def test_read_ahead_reader_bounded(self):
+        """Ensure read ahead reader buffers no more than requested"""
+        consumed = []
+
+        def source():
+            for l in 'abcdefgh':
+                consumed.append(l)
+                yield l
+
+        reader = utils.ReadAheadReader(source(), 2, 1)
+        self.assertEqual('a', reader.read(1))
+        eventlet.sleep(0)
+        # one chunk handed out, two buffered and one held by the producer
+        self.assertEqual(['a', 'b', 'c', 'd'], consumed)
+        reader.close()
+
+    def test_read_ahead_reader_error(self):
+        """Ensure errors reading the source reach the consumer"""
+        def source():
+            yield 'aaa'
+            raise IOError('client went away')
+
+        reader = utils.ReadAheadReader(source(), 2, 3)
+        self.assertEqual('aaa', reader.read(3))
+        self.assertRaises(IOError, reader.read, 3)
+        self.assertEqual('', reader.read(3))
+        reader.close()
+
+    def test_upload_reader(self):
+        with utils.upload_reader(six.StringIO('abc')) as reader:
+            self.assertIsInstance(reader, utils.CooperativeReader)
+
+        self.config(upload_readahead_buffers=2)
+        with utils.upload_reader(six.StringIO('abc')) as reader:
+            self.assertIsInstance(reader, utils.ReadAheadReader)
+            self.assertEqual('abc', reader.read())
+        self.assertTrue(reader.producer.dead)
+
     def test_get_meta_from_headers(self):
         resp = webob.Response()
         resp.headers = {"x-image-meta-name": 'test'}
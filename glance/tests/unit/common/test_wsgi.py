@@ -15,9 +15,13 @@
 #    under the License.
 
 import datetime
+import errno
+import os
+import signal
 import socket
 
 from babel import localedata
+import eventlet
 import eventlet.patcher
 import fixtures
 import gettext
@@ -466,6 +470,179 @@ class ServerTest(test_utils.BaseTestCase):
         actual = wsgi.Server(threads=1).create_pool()
         self.assertIsInstance(actual, eventlet.greenpool.GreenPool)
 
+    def test_listen_reuse_port(self):
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            self.skipTest('SO_REUSEPORT is not supported')
+        first = wsgi.listen_reuse_port(('127.0.0.1', 0), socket.AF_INET)
+        self.addCleanup(first.close)
+        second = wsgi.listen_reuse_port(first.getsockname(), socket.AF_INET)
+        self.addCleanup(second.close)
+        self.assertEqual(first.getsockname(), second.getsockname())
+
+    @mock.patch('os.kill')
+    def test_rolling_reload_retires_one_child_at_a_time(self, mock_kill):
+        server = wsgi.Server()
+        server.sock = None
+        server.children = [1, 2]
+        started = iter([3, 4])
+
+        def run_child():
+            server.children.append(next(started))
+            return True
+
+        with mock.patch.object(server, 'run_child', side_effect=run_child):
+            with mock.patch.object(wsgi.CONF, 'reload_config_files'):
+                server.logger = mock.Mock()
+                server.start_rolling_reload()
+                self.assertEqual([1, 2, 3], server.children)
+                self.assertEqual(1, server.retiring_child)
+                mock_kill.assert_called_once_with(1, signal.SIGHUP)
+
+                server.children.remove(1)
+                server.retire_next_child()
+                self.assertEqual([2, 3, 4], server.children)
+                self.assertEqual(2, server.retiring_child)
+
+                server.children.remove(2)
+                server.retire_next_child()
+                self.assertIsNone(server.retiring_child)
+                self.assertEqual(2, mock_kill.call_count)
+
+    @mock.patch('os.kill')
+    def test_rolling_reload_aborts_if_replacement_fails(self, mock_kill):
+        server = wsgi.Server()
+        server.sock = None
+        server.logger = mock.Mock()
+        server.children = [1, 2]
+        server.stale_children = [1, 2]
+
+        with mock.patch.object(server, 'listen_in_child',
+                               side_effect=socket.error(errno.EADDRINUSE,
+                                                        'in use')):
+            server.retire_next_child()
+        failed_pid = server.children[-1]
+        self.addCleanup(os.waitpid, failed_pid, 0)
+
+        self.assertFalse(mock_kill.called)
+        self.assertEqual([1, 2, failed_pid], server.children)
+        self.assertEqual([], server.stale_children)
+        self.assertIsNone(server.retiring_child)
+        self.assertTrue(server.logger.error.called)
+
+    @mock.patch('os.waitpid')
+    def test_wait_on_children_does_not_respawn_retired_child(self,
+                                                             mock_waitpid):
+        server = wsgi.Server()
+        server.sock = None
+        server.logger = mock.Mock()
+        server.children = [1, 2]
+        server.retiring_child = 1
+
+        def waitpid(pid, options):
+            server.running = False
+            return 1, 0
+
+        mock_waitpid.side_effect = waitpid
+        with mock.patch.object(server, 'run_child') as mock_run_child:
+            server.wait_on_children()
+        self.assertEqual([2], server.children)
+        self.assertFalse(mock_run_child.called)
+
+
+class HttpProtocolTest(test_utils.BaseTestCase):
+
+    def _start(self):
+        self.requests = 0
+
+        def application(environ, start_response):
+            self.requests += 1
+            start_response('200 OK', [('Content-Length', '2')])
+            return ['ok']
+
+        listener = eventlet.listen(('127.0.0.1', 0))
+        self.addCleanup(listener.close)
+        server = wsgi.Server(threads=1)
+        server.pool = server.create_pool()
+        server.logger = mock.Mock()
+        self.server = eventlet.spawn(server._single_run, application,
+                                     listener)
+        self.addCleanup(self.server.kill)
+        self.client = eventlet.connect(listener.getsockname())
+        self.addCleanup(self.client.close)
+        self.client.settimeout(5)
+        self.rfile = self.client.makefile('rb')
+
+    def _request(self, body='', headers=''):
+        self.client.sendall('PUT / HTTP/1.1\r\nHost: localhost\r\n'
+                            'Content-Length: %d\r\n%s\r\n%s' %
+                            (len(body), headers, body))
+
+    def _read_response(self):
+        status = self.rfile.readline()
+        headers = []
+        line = self.rfile.readline()
+        while line not in ('\r\n', ''):
+            headers.append(line.strip().lower())
+            line = self.rfile.readline()
+        body = self.rfile.read(2)
+        return status, headers, body
+
+    def _assert_closed(self):
+        self.assertEqual('', self.rfile.read())
+
+    def test_keepalive(self):
+        self._start()
+        for i in range(3):
+            self._request()
+            status, headers, body = self._read_response()
+            self.assertIn('200 OK', status)
+            self.assertNotIn('connection: close', headers)
+            self.assertEqual('ok', body)
+        self.assertEqual(3, self.requests)
+
+    def test_keepalive_disabled(self):
+        self.config(http_keepalive=False)
+        self._start()
+        self._request()
+        status, headers, body = self._read_response()
+        self.assertIn('connection: close', headers)
+        self._assert_closed()
+
+    def test_max_requests(self):
+        self.config(http_keepalive_max_requests=2)
+        self._start()
+        self._request()
+        status, headers, body = self._read_response()
+        self.assertNotIn('connection: close', headers)
+        self._request()
+        status, headers, body = self._read_response()
+        self.assertIn('connection: close', headers)
+        self._assert_closed()
+
+    def test_idle_timeout(self):
+        self.config(http_keepalive_idle_timeout=1)
+        self._start()
+        self._request()
+        self._read_response()
+        self._assert_closed()
+
+    def test_unread_body_drained(self):
+        self._start()
+        self._request(body='x' * 10)
+        self._read_response()
+        self._request()
+        status, headers, body = self._read_response()
+        self.assertIn('200 OK', status)
+        self.assertEqual(2, self.requests)
+
+    def test_large_unread_body_closes_connection(self):
+        self.config(http_keepalive_max_drain_size=4)
+        self._start()
+        self._request(body='x' * 10)
+        status, headers, body = self._read_response()
+        self.assertIn('connection: close', headers)
+        self._assert_closed()
+
 
 class TestHelpers(test_utils.BaseTestCase):
 
@@ -761,6 +761,27 @@ class TestImmutableImage(utils.BaseTestCase):
         self.assertRaises(exception.Forbidden,
                           self.image.extra_properties.update, {})
 
+    def test_read_only_views(self):
+        self.assertEqual({'foo': 'bar'}, dict(self.image.extra_properties))
+        self.assertEqual('bar', self.image.extra_properties['foo'])
+        self.assertIn('foo', self.image.extra_properties)
+        self.assertEqual(set(['ping', 'pong']), set(self.image.tags))
+        self.assertIn('ping', self.image.tags)
+        self.assertEqual(set(['ping']),
+                         self.image.tags - set(['pong']))
+        self.assertEqual([], list(self.image.locations))
+        self.assertEqual(0, len(self.image.locations))
+
+    def test_views_read_through(self):
+        self.image.base.extra_properties['foo'] = 'baz'
+        self.image.base.tags.add('king')
+        location = {'url': 'http://a/b/c', 'metadata': {}}
+        self.image.base.locations.append(location)
+        self.assertEqual('baz', self.image.extra_properties['foo'])
+        self.assertIn('king', self.image.tags)
+        self.assertEqual([location], self.image.locations)
+        self.assertIs(location, self.image.locations[0])
+
     def test_delete(self):
         self.assertRaises(exception.Forbidden, self.image.delete)
 
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 import testtools
 import webob
 
@@ -96,7 +97,8 @@ class TestCacheMiddlewareRequestStashCacheInfo(testtools.TestCase):
 class ChecksumTestCacheFilter(glance.api.middleware.cache.CacheFilter):
     def __init__(self):
         class DummyCache(object):
-            def get_caching_iter(self, image_id, image_checksum, app_iter):
+            def get_caching_iter(self, image_id, image_checksum, app_iter,
+                                 image_size=None):
                 self.image_checksum = image_checksum
 
         self.cache = DummyCache()
@@ -153,7 +155,8 @@ class ProcessRequestTestCacheFilter(glance.api.middleware.cache.CacheFilter):
             def is_cached(self, image_id):
                 return True
 
-            def get_caching_iter(self, image_id, image_checksum, app_iter):
+            def get_caching_iter(self, image_id, image_checksum, app_iter,
+                                 image_size=None):
                 pass
 
             def delete_cached_image(self, image_id):
@@ -565,6 +568,184 @@ class TestCacheMiddlewareProcessRequest(base.IsolatedUnitTest):
         actual = cache_filter.process_request(request)
         self.assertTrue(actual)
 
+    def _range_cache_filter(self, image_size=100):
+        cache_filter = ProcessRequestTestCacheFilter()
+        self.stubs.Set(cache_filter.cache, 'get_image_size',
+                       lambda image_id: image_size)
+        return cache_filter
+
+    def test_get_image_range_whole_image(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        cache_filter = self._range_cache_filter()
+        self.assertIsNone(
+            cache_filter._get_image_range(request, 'v2', 'test1'))
+
+    def test_get_image_range_header(self):
+        request = webob.Request.blank('/v1/images/test1')
+        request.headers['Range'] = 'bytes=10-'
+        cache_filter = self._range_cache_filter()
+        self.assertEqual((10, 90, 100),
+                         cache_filter._get_image_range(request, 'v1',
+                                                       'test1'))
+
+    def test_get_image_range_content_range_header(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.headers['Content-Range'] = 'bytes 10-19/*'
+        cache_filter = self._range_cache_filter()
+        self.assertEqual((10, 10, 100),
+                         cache_filter._get_image_range(request, 'v2',
+                                                       'test1'))
+
+    def test_get_image_range_content_range_ignored_for_v1(self):
+        request = webob.Request.blank('/v1/images/test1')
+        request.headers['Content-Range'] = 'bytes 10-19/*'
+        cache_filter = self._range_cache_filter()
+        self.assertIsNone(
+            cache_filter._get_image_range(request, 'v1', 'test1'))
+
+    def test_get_image_range_not_satisfiable(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.headers['Range'] = 'bytes=200-'
+        cache_filter = self._range_cache_filter()
+        self.assertRaises(webob.exc.HTTPRequestRangeNotSatisfiable,
+                          cache_filter._get_image_range, request, 'v2',
+                          'test1')
+
+    def test_get_image_range_malformed_content_range(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.headers['Content-Range'] = 'bytes garbage'
+        cache_filter = self._range_cache_filter()
+        self.assertRaises(webob.exc.HTTPBadRequest,
+                          cache_filter._get_image_range, request, 'v2',
+                          'test1')
+
+    def test_v2_process_request_range_response_headers(self):
+        image_id = 'test1'
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.context = context.RequestContext()
+        request.environ['api.cache.image'] = ImageStub(image_id)
+        request.environ['api.cache.range'] = (10, 20, 123456789)
+        image_meta = {'id': image_id, 'size': 123456789, 'status': 'active',
+                      'deleted': False, 'owner': ''}
+
+        cache_filter = ProcessRequestTestCacheFilter()
+        response = cache_filter._process_v2_request(
+            request, image_id, iter(['x' * 20]), image_meta)
+        self.assertEqual(206, response.status_int)
+        self.assertEqual('bytes 10-29/123456789',
+                         response.headers['Content-Range'])
+        self.assertEqual('20', response.headers['Content-Length'])
+        self.assertEqual(['x' * 20], list(response.app_iter))
+
+    def test_v1_process_request_range_response_headers(self):
+        image_id = 'test1'
+        request = webob.Request.blank('/v1/images/test1')
+        request.context = context.RequestContext()
+        request.environ['api.cache.range'] = (0, 5, 10)
+        image_meta = {'id': image_id, 'size': 10, 'status': 'active',
+                      'deleted': False, 'owner': '', 'checksum': 'c1234',
+                      'properties': {}}
+
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter.serializer = glance.api.v1.images.ImageSerializer()
+        response = cache_filter._process_v1_request(
+            request, image_id, iter(['x' * 5]), image_meta)
+        self.assertEqual(206, response.status_int)
+        self.assertEqual('bytes 0-4/10', response.headers['Content-Range'])
+        self.assertEqual('5', response.headers['Content-Length'])
+        self.assertEqual(['x' * 5], list(response.app_iter))
+
+    def test_process_request_range_reads_from_cache(self):
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.context = context.RequestContext()
+        request.headers['Range'] = 'bytes=3-'
+        cache_filter = self._range_cache_filter(image_size=10)
+        cache_filter._get_v2_image_metadata = lambda req, image_id: {}
+        reads = []
+
+        def fake_get_from_cache(image_id, offset=0, length=None):
+            reads.append((offset, length))
+            return iter([])
+
+        def fake_process_v2_request(request, image_id, image_iterator,
+                                    image_meta):
+            return request.environ['api.cache.range']
+
+        cache_filter.get_from_cache = fake_get_from_cache
+        cache_filter._process_v2_request = fake_process_v2_request
+        self.assertEqual((3, 7, 10), cache_filter.process_request(request))
+        self.assertEqual([(3, 7)], reads)
+
+    def _peer_cache_filter(self, peer_resp=None, error=None):
+        self.config(image_cache_peers=['http://peer1', 'http://peer2'],
+                    image_cache_local_peer='http://peer1')
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter.cache.is_cached = lambda image_id: False
+        self.peer_requests = []
+
+        class FakeConnection(object):
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        self.conn = FakeConnection()
+
+        def fake_open_peer_request(peer, request):
+            self.peer_requests.append(peer)
+            if error is not None:
+                raise error
+            return self.conn, peer_resp
+
+        cache_filter._open_peer_request = fake_open_peer_request
+        return cache_filter
+
+    def _remote_image_id(self):
+        for i in range(100):
+            image_id = 'image%d' % i
+            if glance.image_cache.ring.get_peer(image_id) is not None:
+                return image_id
+
+    def test_process_request_fetches_from_peer(self):
+        peer_resp = mock.Mock(status=200, reason='OK')
+        peer_resp.getheaders.return_value = [
+            ('content-length', '3'), ('connection', 'close')]
+        peer_resp.read.side_effect = ['abc', '']
+        cache_filter = self._peer_cache_filter(peer_resp)
+        image_id = self._remote_image_id()
+        request = webob.Request.blank('/v2/images/%s/file' % image_id)
+
+        response = cache_filter.process_request(request)
+        self.assertEqual(['http://peer2'], self.peer_requests)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual('3', response.headers['Content-Length'])
+        self.assertNotIn('Connection', response.headers)
+        self.assertEqual('abc', ''.join(response.app_iter))
+        self.assertTrue(self.conn.closed)
+
+    def test_process_request_peer_unavailable(self):
+        cache_filter = self._peer_cache_filter(error=IOError('refused'))
+        image_id = self._remote_image_id()
+        request = webob.Request.blank('/v2/images/%s/file' % image_id)
+        self.assertIsNone(cache_filter.process_request(request))
+        self.assertEqual(['http://peer2'], self.peer_requests)
+
+    def test_process_request_peer_server_error(self):
+        peer_resp = mock.Mock(status=503, reason='Service Unavailable')
+        cache_filter = self._peer_cache_filter(peer_resp)
+        image_id = self._remote_image_id()
+        request = webob.Request.blank('/v2/images/%s/file' % image_id)
+        self.assertIsNone(cache_filter.process_request(request))
+        self.assertTrue(self.conn.closed)
+
+    def test_process_request_not_forwarded_twice(self):
+        cache_filter = self._peer_cache_filter()
+        image_id = self._remote_image_id()
+        request = webob.Request.blank('/v2/images/%s/file' % image_id)
+        request.headers['X-Image-Cache-Peer-Fill'] = 'http://peer2'
+        self.assertIsNone(cache_filter.process_request(request))
+        self.assertEqual([], self.peer_requests)
+
 
 class TestCacheMiddlewareProcessResponse(base.IsolatedUnitTest):
     def test_process_v1_DELETE_response(self):
@@ -602,6 +783,39 @@ class TestCacheMiddlewareProcessResponse(base.IsolatedUnitTest):
         actual = cache_filter.process_response(resp)
         self.assertEqual(actual, resp)
 
+    def test_process_v2_partial_GET_response_not_cached(self):
+        image_id = 'test1'
+        request = webob.Request.blank('/v2/images/test1/file')
+        request.headers['Content-Range'] = 'bytes 0-9/*'
+        request.environ['api.cache.image_id'] = image_id
+        request.environ['api.cache.method'] = 'GET'
+        request.environ['api.cache.version'] = 'v2'
+        resp = webob.Response(request=request)
+        app_iter = iter(['x' * 10])
+        resp.app_iter = app_iter
+
+        cache_filter = ProcessRequestTestCacheFilter()
+        actual = cache_filter.process_response(resp)
+        self.assertIs(app_iter, actual.app_iter)
+
+    def test_process_GET_response_not_cached_by_other_peer(self):
+        self.config(image_cache_peers=['http://peer1', 'http://peer2'],
+                    image_cache_local_peer='http://peer1')
+        image_id = 'image0'
+        while glance.image_cache.ring.get_peer(image_id) is None:
+            image_id += '0'
+        request = webob.Request.blank('/v2/images/%s/file' % image_id)
+        request.context = context.RequestContext()
+        resp = webob.Response(request=request)
+        app_iter = iter(['x'])
+        resp.app_iter = app_iter
+
+        cache_filter = ProcessRequestTestCacheFilter()
+        cache_filter._get_v2_image_metadata = lambda req, image_id: {}
+        actual = cache_filter._process_GET_response(resp, image_id,
+                                                    version='v2')
+        self.assertIs(app_iter, actual.app_iter)
+
     def test_process_response_without_download_image_policy(self):
         """
         Test for cache middleware raise webob.exc.HTTPForbidden directly
@@ -143,3 +143,16 @@ class TestCachedImages(testtools.TestCase):
                          self.controller.delete_queued_images(req))
         self.assertEqual(['deleted_img'],
                          self.controller.cache.deleted_images)
+
+    def test_get_cache_ring(self):
+        req = webob.Request.blank('')
+        req.context = 'test'
+        self.assertEqual({'cache_ring': {'peers': [], 'local_peer': None,
+                                         'vnodes': 64}},
+                         self.controller.get_cache_ring(req))
+
+    def test_get_cache_peer(self):
+        req = webob.Request.blank('')
+        req.context = 'test'
+        self.assertEqual({'image_id': 'test1', 'peer': None},
+                         self.controller.get_cache_peer(req, 'test1'))
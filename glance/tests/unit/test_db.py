@@ -189,6 +189,16 @@ class TestImageRepo(test_utils.BaseTestCase):
         image = self.image_repo.get(UUID2)
         self.assertEqual(image.locations, [])
 
+    def test_get_with_tags_in_one_call(self):
+        db_api = mock.Mock(spec=['image_get_with_tags'])
+        db_api.image_get_with_tags.return_value = (
+            self.db.image_get(self.context, UUID1), ['ping'])
+        image_repo = glance.db.ImageRepo(self.context, db_api)
+        image = image_repo.get(UUID1)
+        self.assertEqual(set(['ping']), image.tags)
+        db_api.image_get_with_tags.assert_called_once_with(self.context,
+                                                           UUID1)
+
     def test_get_not_found(self):
         fake_uuid = str(uuid.uuid4())
         exc = self.assertRaises(exception.NotFound, self.image_repo.get,
@@ -262,6 +262,60 @@ class TestMetadefRepo(test_utils.BaseTestCase):
                                 namespace)
         self.assertIn(fake_name, utils.exception_to_str(exc))
 
+    def test_get_namespace_detail(self):
+        namespace, objects, resource_types, properties = (
+            self.namespace_repo.get_detail(NAMESPACE1))
+        self.assertEqual(NAMESPACE1, namespace.namespace)
+        self.assertEqual(set([OBJECT1, OBJECT2, OBJECT3]),
+                         set([o.name for o in objects]))
+        self.assertEqual([], resource_types)
+        self.assertEqual(set([PROPERTY1, PROPERTY2, PROPERTY3]),
+                         set([p.name for p in properties]))
+        self.assertEqual([NAMESPACE1] * 6,
+                         [item.namespace.namespace
+                          for item in objects + properties])
+
+    def test_get_namespace_detail_forbidden(self):
+        self.assertRaises(exception.NotFound,
+                          self.namespace_repo.get_detail,
+                          NAMESPACE3)
+
+    def test_get_namespace_detail_not_cached_by_default(self):
+        self.namespace_repo.get_detail(NAMESPACE1)
+        self.db.metadef_object_delete(self.context, NAMESPACE1, OBJECT1)
+        objects = self.namespace_repo.get_detail(NAMESPACE1)[1]
+        self.assertEqual(set([OBJECT2, OBJECT3]),
+                         set([o.name for o in objects]))
+
+    def test_get_namespace_detail_cached(self):
+        self.config(metadef_cache_ttl=60)
+        self.addCleanup(glance.db._METADEF_CACHE.clear)
+        self.namespace_repo.get_detail(NAMESPACE1)
+
+        # Changes made behind the repo's back are not seen until expiry
+        self.db.metadef_object_delete(self.context, NAMESPACE1, OBJECT1)
+        objects = self.namespace_repo.get_detail(NAMESPACE1)[1]
+        self.assertEqual(3, len(objects))
+
+        # Any metadef write made through a repo invalidates the cache
+        self.property_repo.remove(
+            self.property_repo.get(NAMESPACE1, PROPERTY1))
+        namespace, objects, resource_types, properties = (
+            self.namespace_repo.get_detail(NAMESPACE1))
+        self.assertEqual(set([OBJECT2, OBJECT3]),
+                         set([o.name for o in objects]))
+        self.assertEqual(set([PROPERTY2, PROPERTY3]),
+                         set([p.name for p in properties]))
+
+    def test_get_namespace_detail_cached_per_tenant(self):
+        self.config(metadef_cache_ttl=60)
+        self.addCleanup(glance.db._METADEF_CACHE.clear)
+        self.namespace_repo.get_detail(NAMESPACE1)
+        context = glance.context.RequestContext(user=USER1, tenant=TENANT2)
+        namespace_repo = glance.db.MetadefNamespaceRepo(context, self.db)
+        self.assertRaises(exception.NotFound,
+                          namespace_repo.get_detail, NAMESPACE1)
+
     def test_get_property(self):
         property = self.property_repo.get(NAMESPACE1, PROPERTY1)
         namespace = self.namespace_repo.get(NAMESPACE1)
@@ -150,6 +150,11 @@ class TestImage(test_utils.BaseTestCase):
         self.image.tags = ['a', 'b', 'c']
         self.assertEqual(self.image.tags, set(['a', 'b', 'c']))
 
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.image, '__dict__'))
+        self.assertRaises(AttributeError, setattr,
+                          self.image, 'not_an_attribute', 'foo')
+
     def test_delete_protected_image(self):
         self.image.protected = True
         self.assertRaises(exception.ProtectedImageDelete, self.image.delete)
@@ -297,6 +302,11 @@ class TestExtraProperties(test_utils.BaseTestCase):
         random_list = ['foo', 'bar']
         self.assertFalse(extra_properties.__eq__(random_list))
 
+    def test_iter(self):
+        a_dict = {'foo': 'bar', 'snitch': 'golden'}
+        extra_properties = domain.ExtraProperties(a_dict)
+        self.assertEqual(set(['foo', 'snitch']), set(extra_properties))
+
 
 class TestTaskFactory(test_utils.BaseTestCase):
 
@@ -324,3 +324,60 @@ class TestTaskFactory(test_utils.BaseTestCase):
         )
         self.assertIsInstance(task, FakeProxy)
         self.assertEqual(task.base, 'fake_task')
+
+
+class PlainImage(object):
+    def __init__(self):
+        self.name = 'base'
+        self.status = 'queued'
+
+
+class UpperNameImage(proxy.Image):
+    @property
+    def name(self):
+        return self.base.name.upper()
+
+    @name.setter
+    def name(self, value):
+        self.base.name = value
+
+
+class ReadOnlyStatusImage(proxy.Image):
+    @property
+    def status(self):
+        return self.base.status
+
+
+class TestFlatten(test_utils.BaseTestCase):
+
+    def _make_image(self):
+        return proxy.Image(ReadOnlyStatusImage(UpperNameImage(
+            proxy.Image(PlainImage()))))
+
+    def test_reads(self):
+        image = proxy.flatten(self._make_image())
+        self.assertIsInstance(image, proxy.Image)
+        self.assertIsNot(proxy.Image, type(image))
+        self.assertEqual('BASE', image.name)
+        self.assertEqual('queued', image.status)
+
+    def test_writes_go_through_outer_layers(self):
+        image = proxy.flatten(self._make_image())
+        image.name = 'new'
+        self.assertEqual('NEW', image.name)
+        self.assertRaises(AttributeError, setattr, image, 'status', 'active')
+
+    def test_flat_class_cached_per_chain(self):
+        image1 = proxy.flatten(self._make_image())
+        image2 = proxy.flatten(self._make_image())
+        self.assertIs(type(image1), type(image2))
+        image3 = proxy.flatten(proxy.Image(PlainImage()))
+        self.assertIs(proxy.Image, type(image3))
+
+    def test_flattening_repo(self):
+        repo = proxy.FlatteningRepo(
+            FakeRepo([self._make_image(), self._make_image()]))
+        images = repo.list()
+        self.assertEqual(['BASE', 'BASE'], [i.name for i in images])
+        self.assertIsNot(proxy.Image, type(images[0]))
+        self.assertIs(type(images[0]), type(images[1]))
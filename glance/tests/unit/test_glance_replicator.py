@@ -155,6 +155,24 @@ class ImageServiceTestCase(test_utils.BaseTestCase):
         self.assertEqual(len(imgs), 2)
         self.assertEqual(c.conn.count, 2)
 
+    def test_rest_get_images_with_limit(self):
+        c = glance_replicator.ImageService(FakeHTTPConnection(), 'noauth')
+
+        resp = {'images': [IMG_RESPONSE_ACTIVE, IMG_RESPONSE_QUEUED]}
+        c.conn.prime_request('GET',
+                             'v1/images/detail?is_public=None&limit=500',
+                             '', {'x-auth-token': 'noauth'},
+                             200, jsonutils.dumps(resp), {})
+        c.conn.prime_request('GET',
+                             ('v1/images/detail?marker=%s&is_public=None'
+                              '&limit=500' % IMG_RESPONSE_QUEUED['id']),
+                             '', {'x-auth-token': 'noauth'},
+                             200, jsonutils.dumps({'images': []}), {})
+
+        imgs = list(c.get_images(limit=500))
+        self.assertEqual(len(imgs), 2)
+        self.assertEqual(c.conn.count, 2)
+
     def test_rest_get_image(self):
         c = glance_replicator.ImageService(FakeHTTPConnection(), 'noauth')
 
@@ -272,18 +290,21 @@ FAKEIMAGES_LIVEMASTER = [{'status': 'active', 'size': 100,
 
 
 class FakeImageService(object):
+    meta_requests = []
+
     def __init__(self, http_conn, authtoken):
         self.authtoken = authtoken
 
-    def get_images(self):
+    def get_images(self, limit=None):
         if self.authtoken == 'livemastertoken':
-            return FAKEIMAGES_LIVEMASTER
-        return FAKEIMAGES
+            return copy.deepcopy(FAKEIMAGES_LIVEMASTER)
+        return copy.deepcopy(FAKEIMAGES)
 
     def get_image(self, id):
         return FakeHttpResponse({}, 'data')
 
     def get_image_meta(self, id):
+        self.meta_requests.append(id)
         for img in FAKEIMAGES:
             if img['id'] == id:
                 return img
@@ -531,6 +552,54 @@ class ReplicationCommandsTestCase(test_utils.BaseTestCase):
         self.assertEqual(differences['37ff82db-afca-48c7-ae0b-ddc7cf83e3db'],
                          'diff')
 
+    def test_replication_compare_digests(self):
+        options = UserDict.UserDict()
+        options.chunksize = 4096
+        options.dontreplicate = 'dontrepl dontreplabsent'
+        options.mastertoken = 'livemastertoken'
+        options.slavetoken = 'liveslavetoken'
+        options.metaonly = False
+        options.digests = True
+        options.pagesize = 1000
+        args = ['localhost:9292', 'localhost:9393']
+
+        orig_img_service = glance_replicator.get_image_service
+        self.addCleanup(setattr, glance_replicator,
+                        'get_image_service', orig_img_service)
+        glance_replicator.get_image_service = get_image_service
+        self.stubs.Set(FakeImageService, 'meta_requests', [])
+        differences = glance_replicator.replication_compare(options, args)
+
+        self.assertEqual({'15648dd7-8dd0-401c-bd51-550e1ba9a088': 'missing',
+                          '37ff82db-afca-48c7-ae0b-ddc7cf83e3db': 'diff'},
+                         differences)
+        # Only the image whose digest differs needs its metadata fetched
+        self.assertEqual(['37ff82db-afca-48c7-ae0b-ddc7cf83e3db'],
+                         FakeImageService.meta_requests)
+
+    def test_replication_livecopy_digests(self):
+        options = UserDict.UserDict()
+        options.chunksize = 4096
+        options.dontreplicate = 'dontrepl dontreplabsent'
+        options.mastertoken = 'livemastertoken'
+        options.slavetoken = 'liveslavetoken'
+        options.metaonly = False
+        options.digests = True
+        options.pagesize = 1000
+        args = ['localhost:9292', 'localhost:9393']
+
+        orig_img_service = glance_replicator.get_image_service
+        self.addCleanup(setattr, glance_replicator,
+                        'get_image_service', orig_img_service)
+        glance_replicator.get_image_service = get_image_service
+        self.stubs.Set(FakeImageService, 'meta_requests', [])
+        updated = glance_replicator.replication_livecopy(options, args)
+
+        self.assertEqual(['37ff82db-afca-48c7-ae0b-ddc7cf83e3db',
+                          '15648dd7-8dd0-401c-bd51-550e1ba9a088'], updated)
+        self.assertEqual(['37ff82db-afca-48c7-ae0b-ddc7cf83e3db'],
+                         FakeImageService.meta_requests)
+
     def test_replication_compare_with_no_args(self):
         args = []
         command = glance_replicator.replication_compare
@@ -562,6 +631,36 @@ class ReplicationUtilitiesTestCase(test_utils.BaseTestCase):
         self.assertFalse(glance_replicator._image_present(
             client, uuid.uuid4()))
 
+    def test_image_digest(self):
+        a = {'id': 'abc', 'size': 1, 'updated_at': '2014-01-01',
+             'properties': {'foo': 'bar', 'kernel_id': None}}
+        b = copy.deepcopy(a)
+        b['updated_at'] = '2014-02-02'
+        b['size'] = '1'
+        b['properties']['kernel_id'] = ''
+        c = copy.deepcopy(a)
+        c['properties']['foo'] = 'baz'
+
+        dontreplicate = ['updated_at']
+        digest = glance_replicator._image_digest(a, dontreplicate)
+        self.assertEqual(digest,
+                         glance_replicator._image_digest(b, dontreplicate))
+        self.assertNotEqual(digest,
+                            glance_replicator._image_digest(c, dontreplicate))
+        self.assertNotEqual(digest, glance_replicator._image_digest(b, []))
+
+    def test_image_digest_non_ascii(self):
+        a = {'id': 'abc', 'name': u'caf\xe9',
+             'properties': {u'd\xe9tail': u'\u65e5\u672c'}}
+        b = copy.deepcopy(a)
+        b['name'] = u'cafe'
+
+        digest = glance_replicator._image_digest(a, [])
+        self.assertEqual(digest,
+                         glance_replicator._image_digest(copy.deepcopy(a),
+                                                         []))
+        self.assertNotEqual(digest, glance_replicator._image_digest(b, []))
+
     def test_dict_diff(self):
         a = {'a': 1, 'b': 2, 'c': 3}
         b = {'a': 1, 'b': 2}
@@ -15,17 +15,22 @@
 
 from contextlib import contextmanager
 import datetime
+import errno
 import hashlib
 import os
 import time
 
 import fixtures
+import mock
 import six
 from six.moves import xrange
 import stubout
 
 from glance.common import exception
+from glance.common import utils
 from glance import image_cache
+from glance.image_cache.drivers import base
+from glance.image_cache import memory
 from glance.openstack.common import units
 #NOTE(bcwaldon): This is imported to load the registry config options
 import glance.registry  # noqa
@@ -84,6 +89,121 @@ class ImageCacheTestCase(object):
 
         self.assertEqual(FIXTURE_DATA, buff.getvalue())
 
+    @skip_if_disabled
+    def test_open_for_read_range(self):
+        """Test reading part of a cache file via its image identifier."""
+        self._setup_fixture_file()
+
+        buff = six.StringIO()
+        with self.cache.open_for_read(1, offset=2, length=5) as cache_file:
+            for chunk in utils.chunkiter(cache_file, 2):
+                buff.write(chunk)
+
+        self.assertEqual(FIXTURE_DATA[2:7], buff.getvalue())
+        self.assertEqual(1, self.cache.get_hit_count(1))
+
+    @skip_if_disabled
+    def test_open_for_read_range_to_end(self):
+        """Test reading a cache file from an offset to its end."""
+        self._setup_fixture_file()
+
+        with self.cache.open_for_read(1, offset=3) as cache_file:
+            data = cache_file.read()
+
+        self.assertEqual(FIXTURE_DATA[3:], data)
+
+    def _cache_deduplicated(self, image_id, data=FIXTURE_DATA):
+        self.config(image_cache_dedup=True)
+        checksum = hashlib.md5(data).hexdigest()
+        self.assertTrue(self.cache.cache_image_iter(image_id, iter([data]),
+                                                    checksum))
+        return hashlib.sha256(data).hexdigest()
+
+    def _get_inode(self, image_id):
+        return os.stat(self.cache.driver.get_image_filepath(image_id)).st_ino
+
+    @skip_if_disabled
+    def test_dedup_shares_verified_data(self):
+        digest = self._cache_deduplicated(1)
+        self.assertEqual(digest, self._cache_deduplicated(2))
+        content_dir = os.path.join(self.cache_dir, 'content')
+
+        self.assertEqual([digest], os.listdir(content_dir))
+        self.assertEqual(self._get_inode(1), self._get_inode(2))
+        with self.cache.open_for_read(2) as cache_file:
+            self.assertEqual(FIXTURE_DATA, cache_file.read())
+        self.assertEqual(FIXTURE_LENGTH, self.cache.get_cache_size())
+
+    @skip_if_disabled
+    def test_dedup_unverified_data_not_shared(self):
+        self.config(image_cache_dedup=True)
+        self.assertTrue(self.cache.cache_image_iter(1, iter([FIXTURE_DATA])))
+        self.assertEqual([], os.listdir(os.path.join(self.cache_dir,
+                                                     'content')))
+
+    @skip_if_disabled
+    def test_dedup_disabled(self):
+        self._cache_deduplicated(1)
+        self.config(image_cache_dedup=False)
+        checksum = hashlib.md5(FIXTURE_DATA).hexdigest()
+        self.assertTrue(self.cache.cache_image_iter(2, iter([FIXTURE_DATA]),
+                                                    checksum))
+        self.assertNotEqual(self._get_inode(1), self._get_inode(2))
+
+    def test_dedup_content_path_requires_digest(self):
+        for digest in ('../1', '/etc/passwd', hashlib.md5('x').hexdigest(),
+                       hashlib.sha256('x').hexdigest().upper()):
+            self.assertRaises(exception.Invalid,
+                              self.cache.driver.get_content_path, digest)
+
+    @skip_if_disabled
+    def test_dedup_delete_keeps_shared_content(self):
+        digest = self._cache_deduplicated(1)
+        self._cache_deduplicated(2)
+        content_dir = os.path.join(self.cache_dir, 'content')
+
+        self.cache.delete_cached_image(1)
+        self.assertFalse(self.cache.is_cached(1))
+        with self.cache.open_for_read(2) as cache_file:
+            self.assertEqual(FIXTURE_DATA, cache_file.read())
+        self.assertEqual([digest], os.listdir(content_dir))
+
+        self.cache.delete_cached_image(2)
+        self.assertEqual([], os.listdir(content_dir))
+
+    @skip_if_disabled
+    def test_dedup_prune_counts_freed_bytes(self):
+        self._cache_deduplicated('a')
+        self._cache_deduplicated('b')
+        self._cache_deduplicated('c', 'x' * FIXTURE_LENGTH)
+        self.assertEqual(2 * FIXTURE_LENGTH, self.cache.get_cache_size())
+        for image_id in ('a', 'b', 'c'):
+            with self.cache.open_for_read(image_id) as cache_file:
+                cache_file.read()
+
+        self.config(image_cache_max_size=1500)
+        self.assertEqual((2, FIXTURE_LENGTH), self.cache.prune())
+
+        self.assertEqual(FIXTURE_LENGTH, self.cache.get_cache_size())
+        self.assertFalse(self.cache.is_cached('a'))
+        self.assertFalse(self.cache.is_cached('b'))
+        self.assertTrue(self.cache.is_cached('c'))
+
+    @skip_if_disabled
+    def test_dedup_link_race_keeps_own_copy(self):
+        digest = self._cache_deduplicated('a')
+        self.assertTrue(self.cache.cache_image_iter('b', [FIXTURE_DATA]))
+        # The shared data is deleted as unreferenced while linking to it
+        errors = [OSError(errno.EEXIST, 'exists'),
+                  OSError(errno.ENOENT, 'gone')]
+        with mock.patch('os.link', side_effect=errors):
+            self.cache.driver.link_content('b', digest)
+
+        self.assertFalse(os.path.exists(
+            self.cache.driver.get_image_filepath('b', 'incomplete')))
+        with self.cache.open_for_read('b') as cache_file:
+            self.assertEqual(FIXTURE_DATA, cache_file.read())
+
     @skip_if_disabled
     def test_get_image_size(self):
         """Test convenience wrapper for querying cache file size via
@@ -289,6 +409,22 @@ class ImageCacheTestCase(object):
         self.assertFalse(os.path.exists(incomplete_file_path))
         self.assertFalse(os.path.exists(invalid_file_path))
 
+    def test_open_for_write_preallocated(self):
+        """
+        Test that an image file written with an overstated size is
+        truncated to the data written, with page cache advice enabled.
+        """
+        self.config(image_cache_write_dontneed_interval=2)
+        image_id = '1'
+        with self.cache.driver.open_for_write(image_id, 100) as cache_file:
+            for chunk in ('ab', 'cd', 'e'):
+                cache_file.write(chunk)
+        self.assertTrue(self.cache.is_cached(image_id))
+        self.assertEqual(5, self.cache.get_image_size(image_id))
+        self.config(image_cache_read_advice='sequential')
+        with self.cache.open_for_read(image_id, offset=1) as cache_file:
+            self.assertEqual('bcde', cache_file.read())
+
     def test_open_for_write_with_exception(self):
         """
         Test to see if open_for_write works in a failure case for each driver
@@ -496,6 +632,94 @@ class TestImageCacheSqlite(test_utils.BaseTestCase,
         self.cache = image_cache.ImageCache()
 
 
+class TestMemoryCache(test_utils.BaseTestCase):
+
+    def test_lru_eviction(self):
+        cache = memory.MemoryCache(10, 10, 60)
+        cache.add('a', 'aaaa')
+        cache.add('b', 'bbbb')
+        cache.open_for_read('a')
+        cache.add('c', 'cccc')
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(8, cache.size)
+
+    def test_image_too_large(self):
+        cache = memory.MemoryCache(10, 4, 60)
+        cache.add('a', 'aaaaa')
+        self.assertNotIn('a', cache)
+        self.assertEqual(0, cache.size)
+
+    def test_disabled(self):
+        cache = memory.MemoryCache(0, 4, 60)
+        self.assertFalse(cache.enabled)
+        cache.add('a', 'a')
+        self.assertNotIn('a', cache)
+
+    def test_open_for_read_range(self):
+        cache = memory.MemoryCache(10, 10, 60)
+        cache.add('a', 'abcdefgh')
+        reader = cache.open_for_read('a', 2, 4)
+        self.assertEqual('cd', reader.read(2))
+        self.assertEqual('ef', reader.read())
+        self.assertEqual('', reader.read())
+        self.assertIsNone(cache.open_for_read('b'))
+
+    def test_pop_hits(self):
+        cache = memory.MemoryCache(10, 10, 60)
+        cache.add('a', 'a')
+        cache.open_for_read('a')
+        cache.open_for_read('a')
+        self.assertEqual([], cache.pop_hits())
+        hits = cache.pop_hits(force=True)
+        self.assertEqual([('a', 2)], [hit[:2] for hit in hits])
+        self.assertEqual([], cache.pop_hits(force=True))
+
+
+class TestCacheFileWriter(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestCacheFileWriter, self).setUp()
+        self.advice = []
+
+        def fake_fadvise(fp, offset, length, advice):
+            self.advice.append((offset, length, advice))
+
+        self.stubs = stubout.StubOutForTesting()
+        self.stubs.Set(base, 'fadvise', fake_fadvise)
+        self.stubs.Set(base, 'fallocate', lambda fp, length: True)
+        self.addCleanup(self.stubs.UnsetAll)
+        self.path = os.path.join(self.test_dir, 'image')
+
+    def test_drops_written_data(self):
+        self.config(image_cache_write_dontneed_interval=4)
+        with open(self.path, 'wb') as fp:
+            writer = base.CacheFileWriter(fp, 100)
+            for chunk in ('abc', 'def', 'gh', 'i'):
+                writer.write(chunk)
+            writer.finish()
+
+        self.assertEqual('abcdefghi', open(self.path).read())
+        dontneed = base.POSIX_FADV_DONTNEED
+        self.assertEqual([(0, 6, dontneed), (6, 3, dontneed)], self.advice)
+
+    def test_small_file_not_dropped(self):
+        self.config(image_cache_write_dontneed_interval=4)
+        with open(self.path, 'wb') as fp:
+            writer = base.CacheFileWriter(fp, 3)
+            writer.write('abc')
+            writer.finish()
+
+        self.assertEqual([], self.advice)
+
+    def test_preallocate_disabled(self):
+        self.config(image_cache_preallocate=False)
+        with open(self.path, 'wb') as fp:
+            writer = base.CacheFileWriter(fp, 100)
+        self.assertFalse(writer.preallocated)
+
+
 class TestImageCacheNoDep(test_utils.BaseTestCase):
 
     def setUp(self):
@@ -0,0 +1,81 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+from glance.image_cache import ring
+from glance.tests import utils as test_utils
+
+PEERS = ['http://node1:9292', 'http://node2:9292', 'http://node3:9292']
+
+
+class TestHashRing(test_utils.BaseTestCase):
+
+    def test_empty_ring(self):
+        self.assertIsNone(ring.HashRing([], 8).get_peer('image'))
+
+    def test_get_peer_is_stable(self):
+        hash_ring = ring.HashRing(PEERS, 64)
+        peer = hash_ring.get_peer('image')
+        self.assertIn(peer, PEERS)
+        self.assertEqual(peer, ring.HashRing(PEERS, 64).get_peer('image'))
+
+    def test_images_spread_over_peers(self):
+        hash_ring = ring.HashRing(PEERS, 64)
+        counts = {}
+        for i in range(3000):
+            peer = hash_ring.get_peer(str(uuid.uuid4()))
+            counts[peer] = counts.get(peer, 0) + 1
+        self.assertEqual(set(PEERS), set(counts))
+        for count in counts.values():
+            self.assertTrue(count > 500)
+
+    def test_removing_peer_only_moves_its_images(self):
+        before = ring.HashRing(PEERS, 64)
+        after = ring.HashRing(PEERS[:2], 64)
+        for i in range(500):
+            image_id = str(uuid.uuid4())
+            peer = before.get_peer(image_id)
+            if peer != PEERS[2]:
+                self.assertEqual(peer, after.get_peer(image_id))
+
+
+class TestCacheRing(test_utils.BaseTestCase):
+
+    def test_get_peer_clustering_disabled(self):
+        self.assertIsNone(ring.get_peer('image'))
+
+    def test_get_peer(self):
+        self.config(image_cache_peers=PEERS,
+                    image_cache_local_peer='http://node1:9292/')
+        owners = set()
+        for i in range(100):
+            image_id = str(uuid.uuid4())
+            owner = ring.get_ring().get_peer(image_id)
+            owners.add(owner)
+            if owner == PEERS[0]:
+                self.assertIsNone(ring.get_peer(image_id))
+            else:
+                self.assertEqual(owner, ring.get_peer(image_id))
+        self.assertEqual(set(PEERS), owners)
+
+    def test_to_dict(self):
+        self.config(image_cache_peers=[' http://node1:9292/ '],
+                    image_cache_local_peer='http://node1:9292',
+                    image_cache_ring_vnodes=8)
+        self.assertEqual({'peers': ['http://node1:9292'],
+                          'local_peer': 'http://node1:9292',
+                          'vnodes': 8},
+                         ring.to_dict())
@@ -128,36 +128,36 @@ class TestLegacyManage(TestManageBase):
                                db_migration.MIGRATE_REPO_PATH, '20',
                                sanity_check=False)
 
-    def test_db_metadefs_unload(self):
-        db_metadata.db_unload_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_unload_metadefs')
+    def test_db_metadefs_unload(self, db_unload_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db_unload_metadefs'],
                                db_metadata.db_unload_metadefs,
                                db_api.get_engine())
 
-    def test_db_metadefs_load(self):
-        db_metadata.db_load_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_load_metadefs')
+    def test_db_metadefs_load(self, db_load_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db_load_metadefs'],
                                db_metadata.db_load_metadefs,
                                db_api.get_engine(),
-                               None)
+                               None, False)
 
-    def test_db_metadefs_load_with_specified_path(self):
-        db_metadata.db_load_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_load_metadefs')
+    def test_db_metadefs_load_with_specified_path(self, db_load_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db_load_metadefs',
                                 '/mock/'],
                                db_metadata.db_load_metadefs,
                                db_api.get_engine(),
-                               '/mock/')
+                               '/mock/', False)
 
-    def test_db_metadefs_export(self):
-        db_metadata.db_export_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_export_metadefs')
+    def test_db_metadefs_export(self, db_export_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db_export_metadefs'],
                                db_metadata.db_export_metadefs,
                                db_api.get_engine(),
                                None)
 
-    def test_db_metadefs_export_with_specified_path(self):
-        db_metadata.db_export_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_export_metadefs')
+    def test_db_metadefs_export_with_specified_path(self, db_export_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db_export_metadefs',
                                '/mock/'],
                                db_metadata.db_export_metadefs,
@@ -248,38 +248,75 @@ class TestManage(TestManageBase):
                                db_migration.MIGRATE_REPO_PATH, '20',
                                sanity_check=False)
 
-    def test_db_metadefs_unload(self):
-        db_metadata.db_unload_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_unload_metadefs')
+    def test_db_metadefs_unload(self, db_unload_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db', 'unload_metadefs'],
                                db_metadata.db_unload_metadefs,
                                db_api.get_engine())
 
-    def test_db_metadefs_load(self):
-        db_metadata.db_load_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_load_metadefs')
+    def test_db_metadefs_load(self, db_load_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db', 'load_metadefs'],
                                db_metadata.db_load_metadefs,
                                db_api.get_engine(),
-                               None)
+                               None, False)
 
-    def test_db_metadefs_load_with_specified_path(self):
-        db_metadata.db_load_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_load_metadefs')
+    def test_db_metadefs_load_with_specified_path(self, db_load_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db', 'load_metadefs',
                                 '--path', '/mock/'],
                                db_metadata.db_load_metadefs,
                                db_api.get_engine(),
-                               '/mock/')
+                               '/mock/', False)
 
-    def test_db_metadefs_export(self):
-        db_metadata.db_export_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_load_metadefs')
+    def test_db_metadefs_load_merge(self, db_load_metadefs):
+        self._main_test_helper(['glance.cmd.manage', 'db', 'load_metadefs',
+                                '--merge'],
+                               db_metadata.db_load_metadefs,
+                               db_api.get_engine(),
+                               None, True)
+
+    @mock.patch.object(db_metadata, 'db_export_metadefs')
+    def test_db_metadefs_export(self, db_export_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db', 'export_metadefs'],
                                db_metadata.db_export_metadefs,
                                db_api.get_engine(),
                                None)
 
-    def test_db_metadefs_export_with_specified_path(self):
-        db_metadata.db_export_metadefs = mock.Mock()
+    @mock.patch.object(db_metadata, 'db_export_metadefs')
+    def test_db_metadefs_export_with_specified_path(self, db_export_metadefs):
         self._main_test_helper(['glance.cmd.manage', 'db', 'export_metadefs',
                                 '--path', '/mock/'],
                                db_metadata.db_export_metadefs,
                                db_api.get_engine(),
                                '/mock/')
+
+    @mock.patch.object(db_api, 'purge_deleted_rows', return_value=[])
+    def test_db_purge(self, purge_deleted_rows):
+        self._main_test_helper(['glance.cmd.manage', 'db', 'purge'],
+                               db_api.purge_deleted_rows,
+                               mock.ANY, 30, None, 100, 0)
+
+    @mock.patch.object(db_api, 'purge_deleted_rows', return_value=[])
+    def test_db_purge_with_limits(self, purge_deleted_rows):
+        self._main_test_helper(['glance.cmd.manage', 'db', 'purge',
+                                '--age_in_days', '7', '--max_rows', '500',
+                                '--batch_size', '50', '--sleep', '0.5'],
+                               db_api.purge_deleted_rows,
+                               mock.ANY, 7, 500, 50, 0.5)
+
+    @mock.patch.object(db_api, 'purge_deleted_rows')
+    def test_db_purge_invalid_max_rows(self, purge_deleted_rows):
+        self.useFixture(fixtures.MonkeyPatch(
+            'sys.argv', ['glance.cmd.manage', 'db', 'purge',
+                         '--max_rows', '0']))
+        self.assertRaises(SystemExit, manage.main)
+        self.assertFalse(purge_deleted_rows.called)
+
+    @mock.patch.object(db_api, 'image_visibility_rebuild', return_value=0)
+    def test_db_rebuild_image_visibility(self, image_visibility_rebuild):
+        self._main_test_helper(['glance.cmd.manage', 'db',
+                                'rebuild_image_visibility'],
+                               db_api.image_visibility_rebuild,
+                               mock.ANY)
@@ -1460,3 +1460,24 @@ class TestMigrations(test_utils.BaseTestCase):
         self.assertRaises(sqlalchemy.exc.NoSuchTableError,
                           get_table, engine,
                           'metadef_namespace_resource_types')
+
+    def _pre_upgrade_036(self, engine):
+        self.assertRaises(sqlalchemy.exc.NoSuchTableError,
+                          get_table, engine, 'image_visibility')
+
+    def _check_036(self, engine, data):
+        table = get_table(engine, 'image_visibility')
+        index_image_id = ('ix_image_visibility_image_id', ['image_id'])
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in table.indexes]
+        self.assertIn(index_image_id, index_data)
+
+        expected_cols = [u'tenant', u'image_id', u'status']
+        col_data = [col.name for col in table.columns]
+        self.assertEqual(expected_cols, col_data)
+        self.assertEqual([u'tenant', u'image_id'],
+                         [col.name for col in table.primary_key.columns])
+
+    def _post_downgrade_036(self, engine):
+        self.assertRaises(sqlalchemy.exc.NoSuchTableError,
+                          get_table, engine, 'image_visibility')
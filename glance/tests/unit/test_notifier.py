@@ -15,7 +15,9 @@
 #    under the License.
 
 import datetime
+import os
 
+import eventlet
 import glance_store
 import mock
 from oslo.config import cfg
@@ -98,6 +100,8 @@ class TaskRepoStub(object):
 
 class TestNotifier(utils.BaseTestCase):
 
+    @mock.patch.object(notifier, '_NOTIFIER', None)
+    @mock.patch.object(notifier, '_TRANSPORT', None)
     @mock.patch.object(messaging, 'Notifier')
     @mock.patch.object(messaging, 'get_transport')
     def _test_load_strategy(self,
@@ -111,10 +115,64 @@ class TestNotifier(utils.BaseTestCase):
                                          publisher_id='image.localhost')
         self.assertIsNotNone(nfier._notifier)
 
+        # The transport and the oslo.messaging notifier are shared.
+        other = notifier.Notifier()
+        self.assertEqual(1, mock_get_transport.call_count)
+        self.assertEqual(1, mock_notifier.call_count)
+        self.assertIs(nfier._notifier, other._notifier)
+
     def test_notifier_load(self):
         self._test_load_strategy(url=None, driver=None)
 
 
+class TestNotificationSender(utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestNotificationSender, self).setUp()
+        self.messaging_notifier = mock.Mock()
+        self.sender = notifier.NotificationSender(self.messaging_notifier, 2)
+
+    def test_sent_in_background(self):
+        self.sender.put('info', 'image.update', {'id': 1})
+        self.assertFalse(self.messaging_notifier.info.called)
+        eventlet.sleep(0)
+        self.messaging_notifier.info.assert_called_once_with(
+            {}, 'image.update', {'id': 1})
+        self.assertEqual(1, self.sender.stats['sent'])
+
+    def test_notifier_uses_queue(self):
+        self.config(notification_queue_size=2)
+        with mock.patch.object(notifier, 'get_sender',
+                               return_value=self.sender):
+            notifier.Notifier().error('image.upload', {'id': 1})
+        self.assertEqual(1, self.sender.stats['queued'])
+
+    def test_overflow_drop(self):
+        for i in range(3):
+            self.sender.put('info', 'image.update', {'id': i})
+        self.assertEqual(2, self.sender.stats['queued'])
+        self.assertEqual(1, self.sender.stats['dropped'])
+        eventlet.sleep(0)
+        self.assertEqual(2, self.messaging_notifier.info.call_count)
+
+    def test_overflow_spill(self):
+        self.config(notification_overflow_policy='spill',
+                    notification_spill_dir=self.test_dir)
+        for i in range(3):
+            self.sender.put('info', 'image.update', {'id': i})
+        self.assertEqual(1, self.sender.stats['spilled'])
+        eventlet.sleep(0)
+        payloads = [c[0][2] for c in
+                    self.messaging_notifier.info.call_args_list]
+        self.assertEqual([{'id': 0}, {'id': 1}, {'id': 2}], payloads)
+        self.assertEqual([], os.listdir(self.test_dir))
+
+    def test_flush(self):
+        self.sender.queue.put(('warn', 'image.update', {}))
+        self.sender.flush()
+        self.assertEqual(1, self.messaging_notifier.warn.call_count)
+
+
 class TestImageNotifications(utils.BaseTestCase):
     """Test Image Notifications work"""
 
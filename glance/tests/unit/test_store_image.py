@@ -12,9 +12,12 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import hashlib
+
 import mox
 
 import glance_store
+import six
 
 from glance.common import exception
 import glance.location
@@ -134,6 +137,139 @@ class TestStoreImage(utils.BaseTestCase):
         self.assertEqual(len(image1.locations), 1)
         image2.delete()
 
+    def _resume_image(self, urls, reads):
+        calls = []
+
+        def fake_get_from_backend(location, offset=0, chunk_size=None,
+                                  context=None):
+            calls.append((location, offset, chunk_size))
+            return reads.pop(0)(location, offset), None
+
+        self.stubs.Set(self.store_api, 'get_from_backend',
+                       fake_get_from_backend)
+        locations = [{'url': url, 'metadata': {}, 'status': 'active'}
+                     for url in urls]
+        image_stub = ImageStub(UUID1, 'active', locations)
+        image = glance.location.ImageProxy(image_stub, {},
+                                           self.store_api, self.store_utils)
+        return image, calls
+
+    @staticmethod
+    def _broken_read(location, offset):
+        yield 'AAA'
+        raise IOError('connection reset')
+
+    @staticmethod
+    def _full_read(location, offset):
+        return iter(['AAABBB'[offset:]])
+
+    def test_image_get_data_resumes_at_offset(self):
+        self.config(download_resume_retries=1)
+        image, calls = self._resume_image(['file:///a', 'file:///b'],
+                                          [self._broken_read,
+                                           self._full_read])
+        self.assertEqual('AAABBB', ''.join(image.get_data()))
+        self.assertEqual([('file:///a', 0, None), ('file:///a', 3, None)],
+                         calls)
+
+    def test_image_get_data_resumes_from_next_location(self):
+        self.config(download_resume_retries=1)
+
+        def unavailable(location, offset):
+            raise IOError('store unavailable')
+
+        image, calls = self._resume_image(['file:///a', 'file:///b'],
+                                          [self._broken_read, unavailable,
+                                           self._full_read])
+        self.assertEqual('AAABBB', ''.join(image.get_data()))
+        self.assertEqual([('file:///a', 0, None), ('file:///a', 3, None),
+                          ('file:///b', 3, None)], calls)
+
+    def test_image_get_data_resumes_without_offset_support(self):
+        self.config(download_resume_retries=1)
+        image, calls = self._resume_image(['http://a'],
+                                          [self._broken_read,
+                                           self._full_read])
+        self.assertEqual('AAABBB', ''.join(image.get_data()))
+        self.assertEqual([('http://a', 0, None), ('http://a', 0, None)],
+                         calls)
+
+    def test_image_get_data_resume_retries_exhausted(self):
+        self.config(download_resume_retries=1)
+        image, calls = self._resume_image(['file:///a'],
+                                          [self._broken_read,
+                                           self._broken_read])
+        self.assertRaises(IOError, ''.join, image.get_data())
+        self.assertEqual(2, len(calls))
+
+    def test_image_get_data_no_resume_by_default(self):
+        image, calls = self._resume_image(['file:///a'],
+                                          [self._broken_read,
+                                           self._full_read])
+        self.assertRaises(IOError, ''.join, image.get_data())
+        self.assertEqual(1, len(calls))
+
+    def _striped_image(self, urls, data, failing=()):
+        calls = []
+
+        def fake_get_from_backend(location, offset=0, chunk_size=None,
+                                  context=None):
+            calls.append((location, offset, chunk_size))
+            if location in failing:
+                raise IOError('store unavailable')
+            end = offset + chunk_size if chunk_size else len(data)
+            return iter([data[offset:end]]), end - offset
+
+        self.stubs.Set(self.store_api, 'get_from_backend',
+                       fake_get_from_backend)
+        locations = [{'url': url, 'metadata': {}, 'status': 'active'}
+                     for url in urls]
+        image_stub = ImageStub(UUID1, 'active', locations)
+        image_stub.size = len(data)
+        image = glance.location.ImageProxy(image_stub, {},
+                                           self.store_api, self.store_utils)
+        return image, calls
+
+    def test_image_get_data_striped(self):
+        self.config(download_stripe_size=4, download_stripe_workers=2)
+        image, calls = self._striped_image(['file:///a', 'file:///b'],
+                                           'AAAABBBBCCCCDD')
+        self.assertEqual('AAAABBBBCCCCDD', ''.join(image.get_data()))
+        self.assertEqual([('file:///a', 0, 4), ('file:///b', 4, 4),
+                          ('file:///a', 8, 4), ('file:///b', 12, 2)],
+                         sorted(calls, key=lambda call: call[1]))
+
+    def test_image_get_data_striped_range(self):
+        self.config(download_stripe_size=4)
+        image, calls = self._striped_image(['file:///a'], 'AAAABBBBCCCCDD')
+        self.assertEqual('AABBBBCC',
+                         ''.join(image.get_data(offset=2, chunk_size=8)))
+        self.assertEqual([('file:///a', 2, 4), ('file:///a', 6, 4)],
+                         sorted(calls, key=lambda call: call[1]))
+
+    def test_image_get_data_striped_failover(self):
+        self.config(download_stripe_size=4)
+        image, calls = self._striped_image(['file:///a', 'file:///b'],
+                                           'AAAABBBBCC',
+                                           failing=['file:///b'])
+        self.assertEqual('AAAABBBBCC', ''.join(image.get_data()))
+        self.assertIn(('file:///b', 4, 4), calls)
+        self.assertIn(('file:///a', 4, 4), calls)
+
+    def test_image_get_data_striped_skips_unseekable_locations(self):
+        self.config(download_stripe_size=4)
+        image, calls = self._striped_image(['http://a', 'file:///b'],
+                                           'AAAABBBB')
+        self.assertEqual('AAAABBBB', ''.join(image.get_data()))
+        self.assertEqual(set(['file:///b']),
+                         set(call[0] for call in calls))
+
+    def test_image_get_data_small_image_not_striped(self):
+        self.config(download_stripe_size=4)
+        image, calls = self._striped_image(['file:///a'], 'AAAA')
+        self.assertEqual('AAAA', ''.join(image.get_data()))
+        self.assertEqual([('file:///a', 0, None)], calls)
+
     def test_image_set_data(self):
         context = glance.context.RequestContext(user=USER1)
         image_stub = ImageStub(UUID2, status='queued', locations=[])
@@ -146,6 +282,47 @@ class TestStoreImage(utils.BaseTestCase):
         self.assertEqual(image.checksum, 'Z')
         self.assertEqual(image.status, 'active')
 
+    def test_image_set_data_extra_checksums(self):
+        self.config(image_hash_algorithms=['sha256'])
+        context = glance.context.RequestContext(user=USER1)
+        image_stub = ImageStub(UUID2, status='queued', locations=[])
+        image_stub.extra_properties = {}
+        image = glance.location.ImageProxy(image_stub, context,
+                                           self.store_api, self.store_utils)
+
+        def fake_add_to_backend(conf, image_id, data, size, context=None):
+            size = len(''.join(data))
+            return (image_id, size, 'Z', {})
+
+        self.stubs.Set(self.store_api, 'add_to_backend',
+                       fake_add_to_backend)
+        image.set_data(six.StringIO('YYYY'), 4)
+        self.assertEqual(image.checksum, 'Z')
+        self.assertEqual(
+            {'checksum_sha256': hashlib.sha256('YYYY').hexdigest()},
+            image_stub.extra_properties)
+
+    def test_image_set_data_read_ahead(self):
+        self.config(upload_readahead_buffers=2,
+                    upload_readahead_buffer_size=2)
+        context = glance.context.RequestContext(user=USER1)
+        image_stub = ImageStub(UUID2, status='queued', locations=[])
+        image = glance.location.ImageProxy(image_stub, context,
+                                           self.store_api, self.store_utils)
+        stored = []
+
+        def fake_add_to_backend(conf, image_id, data, size, context=None):
+            stored.append(data.read(3))
+            stored.append(data.read(3))
+            return (image_id, size, 'Z', {})
+
+        self.stubs.Set(self.store_api, 'add_to_backend',
+                       fake_add_to_backend)
+        image.set_data(six.StringIO('YYYYY'), 5)
+        self.assertEqual(['YYY', 'YY'], stored)
+        self.assertEqual(image.size, 5)
+        self.assertEqual(image.status, 'active')
+
     def test_image_set_data_location_metadata(self):
         context = glance.context.RequestContext(user=USER1)
         image_stub = ImageStub(UUID2, status='queued', locations=[])
@@ -909,6 +909,76 @@ class TestRegistryV1ClientApi(base.IsolatedUnitTest):
         rapi.configure_registry_admin_creds()
         self.assertEqual(rapi._CLIENT_CREDS, expected)
 
+    def _mock_registry_client(self):
+        patcher = patch.object(rapi, 'get_registry_client')
+        client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        client.get_image.return_value = {'id': UUID1, 'name': 'fake'}
+        return client
+
+    def test_get_image_metadata_cached_per_request(self):
+        client = self._mock_registry_client()
+        image_meta = rapi.get_image_metadata(self.context, UUID1)
+        image_meta['name'] = 'changed by caller'
+        self.assertEqual('fake',
+                         rapi.get_image_metadata(self.context, UUID1)['name'])
+        client.get_image.assert_called_once_with(UUID1)
+
+        rapi.get_image_metadata(context.RequestContext(), UUID1)
+        self.assertEqual(2, client.get_image.call_count)
+
+    def test_update_image_metadata_refreshes_request_cache(self):
+        client = self._mock_registry_client()
+        client.update_image.return_value = {'id': UUID1, 'name': 'new'}
+        rapi.get_image_metadata(self.context, UUID1)
+        rapi.update_image_metadata(self.context, UUID1, {'name': 'new'})
+        self.assertEqual('new',
+                         rapi.get_image_metadata(self.context, UUID1)['name'])
+        client.get_image.assert_called_once_with(UUID1)
+
+    def test_delete_member_invalidates_request_cache(self):
+        client = self._mock_registry_client()
+        client.get_image_members.return_value = [{'member_id': 'a'}]
+        rapi.get_image_metadata(self.context, UUID1)
+        rapi.get_image_members(self.context, UUID1)
+        rapi.get_image_members(self.context, UUID1)
+        self.assertEqual(1, client.get_image_members.call_count)
+
+        rapi.delete_member(self.context, UUID1, 'a')
+        rapi.get_image_metadata(self.context, UUID1)
+        rapi.get_image_members(self.context, UUID1)
+        self.assertEqual(2, client.get_image.call_count)
+        self.assertEqual(2, client.get_image_members.call_count)
+
+    def test_get_image_metadata_shared_within_ttl(self):
+        self.config(image_metadata_cache_ttl=60)
+        client = self._mock_registry_client()
+        tenant_context = context.RequestContext(tenant='a', is_admin=False)
+        rapi.get_image_metadata(tenant_context, UUID1)
+        rapi.get_image_metadata(
+            context.RequestContext(tenant='a', is_admin=False), UUID1)
+        client.get_image.assert_called_once_with(UUID1)
+
+        rapi.get_image_metadata(
+            context.RequestContext(tenant='b', is_admin=False), UUID1)
+        self.assertEqual(2, client.get_image.call_count)
+
+        client.update_image.return_value = {'id': UUID1, 'name': 'new'}
+        rapi.update_image_metadata(tenant_context, UUID1, {'name': 'new'})
+        rapi.get_image_metadata(
+            context.RequestContext(tenant='a', is_admin=False), UUID1)
+        self.assertEqual(3, client.get_image.call_count)
+
+    def test_get_image_metadata_shared_cache_expires(self):
+        self.config(image_metadata_cache_ttl=60)
+        client = self._mock_registry_client()
+        now = 1000.0
+        with patch.object(rapi.time, 'time', return_value=now) as mock_time:
+            rapi.get_image_metadata(context.RequestContext(), UUID1)
+            mock_time.return_value = now + 61
+            rapi.get_image_metadata(context.RequestContext(), UUID1)
+        self.assertEqual(2, client.get_image.call_count)
+
 
 class FakeResponse():
     status = 202
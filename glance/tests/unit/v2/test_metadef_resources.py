@@ -22,6 +22,7 @@ from glance.api.v2 import metadef_objects as objects
 from glance.api.v2 import metadef_properties as properties
 from glance.api.v2 import metadef_resource_types as resource_types
 import glance.api.v2.model.metadef_namespace
+import glance.db
 from glance.tests.unit import base
 import glance.tests.unit.utils as unit_test_utils
 
@@ -298,6 +299,30 @@ class TestMetadefsControllers(base.IsolatedUnitTest):
         self.assertRaises(webob.exc.HTTPNotFound,
                           self.namespace_controller.show, request, NAMESPACE2)
 
+    def test_namespace_show_unauthorized_objects(self):
+        rules = {"get_metadef_objects": False}
+        self.policy.set_rules(rules)
+        request = unit_test_utils.get_fake_request()
+        self.assertRaises(webob.exc.HTTPForbidden,
+                          self.namespace_controller.show, request, NAMESPACE3)
+
+    def test_namespace_show_cached(self):
+        self.config(metadef_cache_ttl=60)
+        self.addCleanup(glance.db._METADEF_CACHE.clear)
+        request = unit_test_utils.get_fake_request()
+        output = self.namespace_controller.show(request, NAMESPACE3)
+        self.assertEqual(2, len(output.objects))
+
+        object = glance.api.v2.model.metadef_object.MetadefObject()
+        object.name = OBJECT3
+        object.required = []
+        object.properties = {}
+        self.object_controller.create(request, object, NAMESPACE3)
+
+        output = self.namespace_controller.show(request, NAMESPACE3)
+        actual = set([obj.name for obj in output.objects])
+        self.assertEqual(set([OBJECT1, OBJECT2, OBJECT3]), actual)
+
     def test_namespace_delete(self):
         request = unit_test_utils.get_fake_request(tenant=TENANT2)
         self.namespace_controller.delete(request, NAMESPACE2)
@@ -575,6 +575,21 @@ class TestRegistryV2Client(base.IsolatedUnitTest,
         memb_list = self.client.image_member_find(member='pattieblack')
         self.assertEqual(len(memb_list), 0)
 
+    def test_batch_request(self):
+        self.client.image_tag_set_all(image_id=UUID1, tags=['a', 'b'])
+        image, tags = self.client.batch_request([
+            ('image_get', {'image_id': UUID1}),
+            ('image_tag_get_all', {'image_id': UUID1})])
+        self.assertEqual(UUID1, image['id'])
+        self.assertEqual(['a', 'b'], tags)
+
+    def test_batch_request_stops_at_first_error(self):
+        fake_id = _gen_uuid()
+        self.assertRaises(exception.NotFound, self.client.batch_request, [
+            ('image_update', {'image_id': fake_id, 'values': {}}),
+            ('image_tag_set_all', {'image_id': fake_id, 'tags': ['a']})])
+        self.assertEqual([], db_api.image_tag_get_all(self.context, fake_id))
+
 
 class TestRegistryV2ClientApi(base.IsolatedUnitTest):
 